@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
@@ -8,10 +8,81 @@ load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./dr_detection.db")
 
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {}
-)
+# Async drivers for the sync URL's backend; override with ASYNC_DATABASE_URL.
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+}
+
+# SQLite: WAL lets readers run alongside the single writer, synchronous=NORMAL only
+# fsyncs at checkpoints in WAL mode, and busy_timeout makes a second writer wait
+# for the lock instead of failing with "database is locked".
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+
+def is_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+
+def _is_sqlite_memory(url: str) -> bool:
+    return is_sqlite(url) and (url.rstrip("/").endswith(":memory:") or url.rstrip("/") == "sqlite:")
+
+
+def engine_options(url: str) -> dict:
+    """
+    create_engine() keyword arguments for a database URL
+
+    Args:
+        url: SQLAlchemy database URL
+
+    Returns:
+        Connect args and pool settings suited to the backend
+    """
+    if is_sqlite(url):
+        options = {
+            "connect_args": {
+                "check_same_thread": False,
+                "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000,
+            },
+        }
+        if not _is_sqlite_memory(url):
+            # One file connection per thread is cheap; keep enough for the threadpool.
+            options["pool_size"] = int(os.getenv("DB_POOL_SIZE", "10"))
+            options["max_overflow"] = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+        return options
+
+    # Server databases: bounded pool, drop connections the server closed while idle.
+    return {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "10")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "20")),
+        "pool_timeout": int(os.getenv("DB_POOL_TIMEOUT", "30")),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+        "pool_pre_ping": True,
+    }
+
+
+def apply_sqlite_pragmas(dbapi_connection, url: str = DATABASE_URL):
+    """Set journal mode, synchronous level and busy timeout on a new SQLite connection"""
+    cursor = dbapi_connection.cursor()
+    try:
+        if not _is_sqlite_memory(url):
+            cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    finally:
+        cursor.close()
+
+
+engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL))
+
+if is_sqlite(DATABASE_URL):
+    @event.listens_for(engine, "connect")
+    def _on_sqlite_connect(dbapi_connection, connection_record):
+        apply_sqlite_pragmas(dbapi_connection)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -25,6 +96,55 @@ def get_db():
     finally:
         db.close()
 
+
+def async_url(url: str) -> str:
+    """Same database with an async driver (sqlite:/// -> sqlite+aiosqlite:///)"""
+    scheme, rest = url.split("://", 1)
+    backend = scheme.split("+", 1)[0]
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver known for {scheme}; set ASYNC_DATABASE_URL")
+    return f"{ASYNC_DRIVERS[backend]}://{rest}"
+
+
+# Created on first use so scripts that only need the sync engine do not import the async driver.
+async_engine = None
+AsyncSessionLocal = None
+
+
+def get_async_engine():
+    """Get or create the async engine (same database, pool settings and pragmas as engine)"""
+    global async_engine, AsyncSessionLocal
+    if async_engine is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+        from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+        url = os.getenv("ASYNC_DATABASE_URL") or async_url(DATABASE_URL)
+        options = engine_options(url)
+        if is_sqlite(url):
+            # aiosqlite runs each connection in its own thread already.
+            options["connect_args"].pop("check_same_thread", None)
+            if "pool_size" in options:
+                options["poolclass"] = AsyncAdaptedQueuePool
+        async_engine = create_async_engine(url, **options)
+        if is_sqlite(url):
+            @event.listens_for(async_engine.sync_engine, "connect")
+            def _on_async_sqlite_connect(dbapi_connection, connection_record):
+                apply_sqlite_pragmas(dbapi_connection, url)
+        AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    return async_engine
+
+
+async def get_async_db():
+    """Dependency for getting an async database session"""
+    get_async_engine()
+    async with AsyncSessionLocal() as db:
+        yield db
+
 def init_db():
-    """Initialize database tables"""
+    """Initialize database tables and apply pending migrations"""
+    from .migrations import run_migrations
+    from .services.stats import register_rollup_hook
+
+    register_rollup_hook()
     Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
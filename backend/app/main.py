@@ -1,12 +1,14 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 import os
 
+from . import database
 from .database import init_db, SessionLocal
 from .models.user import User
 from .services.auth import get_password_hash
-from .routes import auth, predictions
+from .services.prediction_writer import close_prediction_writer
+from .services.resumable import start_upload_sweeper, stop_upload_sweeper
+from .routes import auth, images, predictions, registry, uploads
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -35,22 +37,25 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Include routers
 app.include_router(auth.router)
 app.include_router(predictions.router)
+app.include_router(registry.router)
+app.include_router(images.router)
+app.include_router(uploads.router)
 
-# Mount uploads directory for serving images (optional)
-uploads_dir = os.getenv("UPLOAD_DIR", "./uploads")
-if os.path.exists(uploads_dir):
-    app.mount("/uploads", StaticFiles(directory=uploads_dir), name="uploads")
+# UPLOAD_DIR is deliberately not mounted: patient images are served only through
+# /api/images, which checks the caller may see them.
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize database on startup"""
     init_db()
     print("Database initialized")
+    start_upload_sweeper()
 
     # Ensure demo credentials are always available for local testing.
     db = SessionLocal()
@@ -86,6 +91,14 @@ async def startup_event():
     else:
         print("Skipping model preload on startup (LOAD_MODELS_ON_STARTUP=false)")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Commit predictions still held by the write-behind buffer and close pooled connections"""
+    stop_upload_sweeper()
+    close_prediction_writer()
+    if database.async_engine is not None:
+        await database.async_engine.dispose()
+
 @app.get("/")
 async def root():
     """Root endpoint"""
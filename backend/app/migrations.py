@@ -0,0 +1,70 @@
+"""
+Additive schema migrations
+create_all() only creates missing tables, so columns and indexes added to
+existing tables are applied here once and recorded in schema_migrations
+"""
+
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+
+
+def _add_column(conn, table: str, column: str, ddl: str):
+    """Add a column unless the table already has it (fresh databases get it from create_all)"""
+    existing = {c["name"] for c in inspect(conn).get_columns(table)}
+    if column not in existing:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+
+def _model_metrics_version_details(conn):
+    _add_column(conn, "model_metrics", "model_version", "VARCHAR")
+    _add_column(conn, "model_metrics", "details", "TEXT")
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_model_metrics_model_version ON model_metrics (model_version)"
+    ))
+
+
+def _predictions_model_version(conn):
+    _add_column(conn, "predictions", "model_version", "VARCHAR")
+
+
+def _predictions_user_created_at_index(conn):
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_predictions_user_id_created_at ON predictions (user_id, created_at)"
+    ))
+
+
+def _prediction_stats_backfill(conn):
+    # create_all made the empty table; fill it from the history recorded so far.
+    from .services.stats import backfill_prediction_stats
+    backfill_prediction_stats(conn)
+
+
+# (id, function) pairs, applied in order; never edit or reorder applied entries.
+MIGRATIONS = [
+    ("0001_model_metrics_version_details", _model_metrics_version_details),
+    ("0002_predictions_model_version", _predictions_model_version),
+    ("0003_predictions_user_created_at_index", _predictions_user_created_at_index),
+    ("0004_prediction_stats_backfill", _prediction_stats_backfill),
+]
+
+
+def run_migrations(engine):
+    """Apply every migration that has not been recorded yet"""
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations "
+            "(id VARCHAR PRIMARY KEY, applied_at TIMESTAMP NOT NULL)"
+        ))
+        applied = {row[0] for row in conn.execute(text("SELECT id FROM schema_migrations"))}
+
+    for migration_id, migrate in MIGRATIONS:
+        if migration_id in applied:
+            continue
+        with engine.begin() as conn:
+            migrate(conn)
+            conn.execute(
+                text("INSERT INTO schema_migrations (id, applied_at) VALUES (:id, :applied_at)"),
+                {"id": migration_id, "applied_at": datetime.utcnow()}
+            )
+        print(f"Applied migration {migration_id}")
@@ -1,5 +1,10 @@
 from .user import User
 from .prediction import Prediction
 from .metrics import ModelMetrics
+from .training_run import TrainingRun
+from .shadow_evaluation import ShadowEvaluation
+from .prediction_stat import PredictionStat
+from .stored_image import StoredImage
+from .upload_session import UploadSession
 
-__all__ = ["User", "Prediction", "ModelMetrics"]
+__all__ = ["User", "Prediction", "ModelMetrics", "TrainingRun", "ShadowEvaluation", "PredictionStat", "StoredImage", "UploadSession"]
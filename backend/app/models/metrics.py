@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Float, String, DateTime
+from sqlalchemy import Column, Integer, Float, String, Text, DateTime
 from datetime import datetime
 from ..database import Base
 
@@ -11,4 +11,6 @@ class ModelMetrics(Base):
     recall = Column(Float, nullable=False)
     f1_score = Column(Float, nullable=False)
     confusion_matrix = Column(String, nullable=True)  # JSON string
+    model_version = Column(String, nullable=True, index=True)
+    details = Column(Text, nullable=True)  # JSON: per-class stats, calibration, served decision
     created_at = Column(DateTime, default=datetime.utcnow)
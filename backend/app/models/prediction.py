@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from ..database import Base
@@ -11,7 +11,13 @@ class Prediction(Base):
     image_path = Column(String, nullable=False)
     predicted_class = Column(Integer, nullable=False)  # 0-4
     confidence = Column(Float, nullable=False)
+    model_version = Column(String, nullable=True)  # registry version that produced it
     created_at = Column(DateTime, default=datetime.utcnow)
     
+    __table_args__ = (
+        # History pages: WHERE user_id = ? ORDER BY created_at DESC, id DESC
+        Index("ix_predictions_user_id_created_at", "user_id", "created_at"),
+    )
+    
     # Relationship to user
     user = relationship("User", back_populates="predictions")
@@ -0,0 +1,18 @@
+from sqlalchemy import Column, Integer, Float, Date, UniqueConstraint
+from ..database import Base
+
+class PredictionStat(Base):
+    """Daily prediction counts per user and class, kept in step with predictions"""
+    __tablename__ = "prediction_stats"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, nullable=False)  # 0 = all users
+    day = Column(Date, nullable=False)
+    predicted_class = Column(Integer, nullable=False)  # -1 = uncertain
+    count = Column(Integer, nullable=False, default=0)
+    confidence_sum = Column(Float, nullable=False, default=0.0)
+    
+    __table_args__ = (
+        # One bucket per (user, day, class); /api/stats reads a user's range from this index.
+        UniqueConstraint("user_id", "day", "predicted_class", name="uq_prediction_stats_bucket"),
+    )
@@ -0,0 +1,19 @@
+from sqlalchemy import Column, Integer, Float, String, Boolean, DateTime
+from datetime import datetime
+from ..database import Base
+
+class ShadowEvaluation(Base):
+    __tablename__ = "shadow_evaluations"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    image_path = Column(String, nullable=False)
+    primary_version = Column(String, nullable=False)
+    shadow_version = Column(String, nullable=False, index=True)
+    primary_class = Column(Integer, nullable=False)  # -1 = uncertain
+    shadow_class = Column(Integer, nullable=False)
+    primary_confidence = Column(Float, nullable=False)
+    shadow_confidence = Column(Float, nullable=False)
+    agree = Column(Boolean, nullable=False)
+    shared_features = Column(Boolean, nullable=False)  # candidate reused the primary's CNN features
+    shadow_latency_ms = Column(Float, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
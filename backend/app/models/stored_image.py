@@ -0,0 +1,14 @@
+from sqlalchemy import Column, Integer, String, DateTime
+from datetime import datetime
+from ..database import Base
+
+class StoredImage(Base):
+    """One content-addressed upload file and how many uploads refer to it"""
+    __tablename__ = "stored_images"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    sha256 = Column(String(64), nullable=False, unique=True)
+    path = Column(String, nullable=False)  # UPLOAD_DIR/objects/ab/cd/<sha256><ext>
+    size_bytes = Column(Integer, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,20 @@
+from sqlalchemy import Column, Integer, Float, String, Text, DateTime
+from datetime import datetime
+from ..database import Base
+
+class TrainingRun(Base):
+    __tablename__ = "training_runs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    run_id = Column(String, unique=True, index=True, nullable=False)
+    script = Column(String, nullable=False)
+    status = Column(String, nullable=False)
+    started_at = Column(DateTime, nullable=False)
+    finished_at = Column(DateTime, nullable=True)
+    total_seconds = Column(Float, nullable=True)
+    peak_rss_mb = Column(Float, nullable=True)
+    model_version = Column(String, nullable=True, index=True)
+    stages = Column(Text, nullable=True)  # JSON: per-stage seconds, items/sec, peak RSS
+    epochs = Column(Text, nullable=True)  # JSON: per-epoch seconds and logs
+    config = Column(Text, nullable=True)  # JSON
+    created_at = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,20 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
+from datetime import datetime
+from ..database import Base
+
+class UploadSession(Base):
+    """A resumable upload: bytes received so far live in UPLOAD_DIR/partial/<id>.part"""
+    __tablename__ = "upload_sessions"
+    
+    id = Column(String(32), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    filename = Column(String, nullable=False)
+    size_bytes = Column(Integer, nullable=False)  # declared at init
+    received_bytes = Column(Integer, nullable=False, default=0)
+    status = Column(String, nullable=False, default="uploading")  # uploading | finalizing | completed
+    image_format = Column(String, nullable=True)  # sniffed from the first bytes
+    width = Column(Integer, nullable=True)
+    height = Column(Integer, nullable=True)
+    result = Column(Text, nullable=True)  # prediction JSON, returned again on a repeated finalize
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False, index=True)  # pushed back by every chunk
@@ -1,4 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from datetime import timedelta
 
@@ -6,43 +7,49 @@ from ..database import get_db
 from ..models.user import User
 from ..schemas.user import UserCreate, UserLogin, Token, User as UserSchema
 from ..services.auth import (
-    get_password_hash,
+    hash_password_async,
     authenticate_user,
     create_access_token,
+    get_current_admin,
     ACCESS_TOKEN_EXPIRE_MINUTES
 )
+from ..services.auth_cache import auth_cache
+from ..services.bcrypt_pool import bcrypt_pool
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
 @router.post("/register", response_model=UserSchema, status_code=status.HTTP_201_CREATED)
-def register(user: UserCreate, db: Session = Depends(get_db)):
+async def register(user: UserCreate, db: Session = Depends(get_db)):
     """Register a new user"""
     # Check if user already exists
-    db_user = db.query(User).filter(User.email == user.email).first()
+    db_user = await run_in_threadpool(lambda: db.query(User).filter(User.email == user.email).first())
     if db_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
     
-    # Create new user
-    hashed_password = get_password_hash(user.password)
+    # Create new user; bcrypt runs on its own bounded pool, not the shared threadpool
+    hashed_password = await hash_password_async(user.password)
     new_user = User(
         email=user.email,
         name=user.name,
         hashed_password=hashed_password,
         role=user.role
     )
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    
+    def save():
+        db.add(new_user)
+        db.commit()
+        db.refresh(new_user)
+    await run_in_threadpool(save)
     
     return new_user
 
 @router.post("/login", response_model=Token)
-def login(user_credentials: UserLogin, db: Session = Depends(get_db)):
+async def login(user_credentials: UserLogin, db: Session = Depends(get_db)):
     """Login user and return JWT token"""
-    user = authenticate_user(db, user_credentials.email, user_credentials.password)
+    user = await authenticate_user(db, user_credentials.email, user_credentials.password)
     
     if not user:
         raise HTTPException(
@@ -62,3 +69,13 @@ def login(user_credentials: UserLogin, db: Session = Depends(get_db)):
         "token_type": "bearer",
         "user": user
     }
+
+@router.get("/cache/stats")
+def auth_cache_stats(current_user: User = Depends(get_current_admin)):
+    """Hit/miss counters of the validated-token cache (admin only)"""
+    return auth_cache.stats()
+
+@router.get("/bcrypt/stats")
+def bcrypt_pool_stats(current_user: User = Depends(get_current_admin)):
+    """Load of the bcrypt pool used by login and registration (admin only)"""
+    return bcrypt_pool.stats()
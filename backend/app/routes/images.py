@@ -0,0 +1,76 @@
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse
+from sqlalchemy import exists, select
+from sqlalchemy.ext.asyncio import AsyncSession
+import os
+
+from ..database import get_async_db
+from ..models.prediction import Prediction
+from ..models.stored_image import StoredImage
+from ..models.user import User
+from ..services.auth import get_current_user_async
+from ..services.variants import VariantCache, get_variant_cache
+
+router = APIRouter(prefix="/api/images", tags=["Images"])
+
+# Stored images are immutable (addressed by content hash), so clients may cache them for good.
+# "private" keeps shared proxies from storing patient images.
+CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """True when If-None-Match already names this ETag (or is *)"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [value.strip() for value in header.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+@router.get("/{sha256}")
+async def get_image(
+    request: Request,
+    sha256: str = Path(..., pattern="^[0-9a-f]{64}$"),
+    variant: str = Query("thumb", pattern="^(thumb|medium|original)$"),
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Serve a stored image or a resized variant of it
+
+    `variant` is thumb (256 px), medium (1024 px) or original. Only users with a
+    prediction on the image (and admins/doctors) can fetch it. Variants are
+    rendered on first request and cached on disk. Responses carry a strong ETag
+    and a one-year immutable Cache-Control; If-None-Match gets a 304.
+    """
+    # Access is checked before any 304, so a known hash alone reveals nothing.
+    result = await db.execute(select(StoredImage.path).where(StoredImage.sha256 == sha256))
+    source_path = result.scalar()
+    if source_path is not None and current_user.role not in ["admin", "doctor"]:
+        owned = await db.execute(select(exists().where(
+            Prediction.user_id == current_user.id, Prediction.image_path == source_path
+        )))
+        if not owned.scalar():
+            source_path = None
+    if source_path is None or not os.path.exists(source_path):
+        # Same answer for unknown and not-yours images.
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Image not found"
+        )
+
+    etag = VariantCache.etag(sha256, variant)
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if etag_matches(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    if variant == "original":
+        return FileResponse(source_path, headers=headers)
+
+    try:
+        path = await run_in_threadpool(get_variant_cache().ensure, sha256, variant, source_path)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=str(e)
+        )
+    return FileResponse(path, media_type="image/jpeg", headers=headers)
@@ -1,180 +1,220 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
 import os
-import shutil
-from datetime import datetime
 import json
 
-from ..database import get_db
+from ..database import get_async_db
 from ..models.user import User
 from ..models.prediction import Prediction
-from ..models.metrics import ModelMetrics
-from ..schemas.prediction import PredictionResponse, Prediction as PredictionSchema
+from ..schemas.prediction import PredictionResponse, PredictionHistoryItem
 from ..schemas.metrics import MetricsResponse
-from ..services.auth import get_current_user, get_current_admin_or_doctor
+from ..schemas.stats import PredictionStatsResponse
+from ..services.auth import get_current_user, get_current_user_async, get_current_admin_or_doctor_async
+from ..services.metrics import latest_model_metrics
+from ..services.stats import stats_summary
+from ..services.ingest import UploadRejected, receive_upload
+from ..services.storage import get_image_store
+from ..services.variants import get_variant_cache
+from training.preprocessing import load_image
 from ..services.prediction import get_prediction_service
+from ..services.prediction_writer import get_prediction_writer, write_behind_enabled
+from ..services.history import export_csv, export_ndjson, history_page_async, iter_history, parse_fields
 
 router = APIRouter(prefix="/api", tags=["Predictions"])
 
 UPLOAD_DIR = os.getenv("UPLOAD_DIR", "./uploads")
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
-# Allowed file extensions
-ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png"}
-
-def validate_image_file(filename: str) -> bool:
-    """Validate if file is an allowed image type"""
-    ext = os.path.splitext(filename)[1].lower()
-    return ext in ALLOWED_EXTENSIONS
+# Request body of the upload routes, which parse multipart themselves (see services/ingest.py)
+UPLOAD_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "properties": {"file": {"type": "string", "format": "binary"}},
+            "required": ["file"],
+        }}},
+    }
+}
 
-@router.post("/upload", status_code=status.HTTP_200_OK)
-async def upload_image(
-    file: UploadFile = File(...),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
-    """Upload a retinal image"""
-    
-    # Validate file type
-    if not validate_image_file(file.filename):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Invalid file type. Allowed types: {', '.join(ALLOWED_EXTENSIONS)}"
-        )
-    
-    # Create user-specific directory
-    user_dir = os.path.join(UPLOAD_DIR, str(current_user.id))
-    os.makedirs(user_dir, exist_ok=True)
-    
-    # Generate unique filename
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    ext = os.path.splitext(file.filename)[1]
-    filename = f"{timestamp}_{file.filename}"
-    filepath = os.path.join(user_dir, filename)
-    
-    # Save file
+async def store_upload(request: Request) -> dict:
+    """Validate, hash and store the `file` part while it streams in"""
     try:
-        with open(filepath, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        return await receive_upload(request, get_image_store())
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Could not save file: {str(e)}"
         )
+
+@router.post("/upload", status_code=status.HTTP_200_OK, openapi_extra=UPLOAD_BODY)
+async def upload_image(
+    request: Request,
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Upload a retinal image"""
+    
+    # Stream the file in: type, size and dimensions are checked as it arrives,
+    # and identical bytes are stored once
+    stored = await store_upload(request)
+    filepath = stored["path"]
     
     return {
         "message": "File uploaded successfully",
-        "filename": filename,
-        "filepath": filepath
+        "filename": os.path.basename(filepath),
+        "filepath": filepath,
+        "sha256": stored["sha256"],
+        "deduplicated": stored["deduplicated"],
+        "width": stored["width"],
+        "height": stored["height"]
     }
 
-@router.post("/predict", response_model=PredictionResponse)
+@router.post("/predict", response_model=PredictionResponse, openapi_extra=UPLOAD_BODY)
 async def predict_dr(
-    file: UploadFile = File(...),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    background_tasks: BackgroundTasks,
+    request: Request,
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Predict diabetic retinopathy stage from uploaded image"""
     
-    # Validate file type
-    if not validate_image_file(file.filename):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Invalid file type. Allowed types: {', '.join(ALLOWED_EXTENSIONS)}"
-        )
-    
-    # Create user-specific directory
-    user_dir = os.path.join(UPLOAD_DIR, str(current_user.id))
-    os.makedirs(user_dir, exist_ok=True)
+    # Stream the file in: type, size and dimensions are checked as it arrives,
+    # and identical bytes are stored once
+    stored = await store_upload(request)
+    return await predict_stored(stored, current_user, db, background_tasks)
+
+async def predict_stored(stored: dict, current_user: User, db: AsyncSession,
+                         background_tasks: BackgroundTasks) -> dict:
+    """
+    Run the model on a stored upload and record the prediction
     
-    # Generate unique filename
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    ext = os.path.splitext(file.filename)[1]
-    filename = f"{timestamp}_{file.filename}"
-    filepath = os.path.join(user_dir, filename)
-    
-    # Save file
-    try:
-        with open(filepath, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Could not save file: {str(e)}"
-        )
+    Shared by /api/predict and resumable uploads (/api/uploads/{id}/finalize).
+    The upload's reference is released if the prediction fails.
+    """
+    filepath = stored["path"]
     
     # Make prediction
     try:
         pred_service = get_prediction_service()
-        predicted_class, confidence, class_name, explanation = pred_service.predict(filepath)
+        # Decode once: the model input and the thumbnails both come from this array.
+        image = load_image(filepath)
+        predicted_class, confidence, class_name, explanation, model_version = pred_service.predict(filepath, image=image)
     except ValueError as e:
         # Validation error - image is not a retinal image
-        if os.path.exists(filepath):
-            os.remove(filepath)
+        await run_in_threadpool(get_image_store().release, stored["sha256"])
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(e)
         )
     except FileNotFoundError as e:
-        if os.path.exists(filepath):
-            os.remove(filepath)
+        await run_in_threadpool(get_image_store().release, stored["sha256"])
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail=f"Prediction service unavailable: {str(e)}"
         )
     except Exception as e:
         # Clean up file on error
-        if os.path.exists(filepath):
-            os.remove(filepath)
+        await run_in_threadpool(get_image_store().release, stored["sha256"])
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Prediction failed: {str(e)}"
         )
     
-    # Save prediction to database
-    prediction = Prediction(
+    # Save prediction to database (group-committed in the background with write-behind)
+    fields = dict(
         user_id=current_user.id,
         image_path=filepath,
         predicted_class=predicted_class,
-        confidence=confidence
+        confidence=confidence,
+        model_version=model_version
     )
-    db.add(prediction)
-    db.commit()
-    db.refresh(prediction)
+    if write_behind_enabled():
+        await get_prediction_writer().add_async(**fields)
+    else:
+        db.add(Prediction(**fields))
+        await db.commit()
+    
+    # Render history thumbnails after the response, reusing the decoded image.
+    background_tasks.add_task(get_variant_cache().warm, stored["sha256"], image)
     
     return {
         "predicted_class": predicted_class,
         "class_name": class_name,
         "confidence": confidence,
         "explanation": explanation,
-        "image_path": filepath
+        "image_path": filepath,
+        "image_sha256": stored["sha256"],
+        "model_version": model_version
     }
 
-@router.get("/history", response_model=List[PredictionSchema])
+@router.get("/history", response_model=List[PredictionHistoryItem], response_model_exclude_unset=True)
 async def get_prediction_history(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    response: Response,
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get prediction history for current user"""
+    """
+    Get prediction history for current user, newest first
+    
+    Returns one page of at most `limit` rows. When more rows exist, the
+    X-Next-Cursor header holds the `cursor` for the next page. `fields` is a
+    comma-separated list of columns to return (default: all).
+    """
+    try:
+        selected = parse_fields(fields)
+        rows, next_cursor = await history_page_async(db, current_user.id, limit=limit, cursor=cursor, fields=selected)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     
-    predictions = db.query(Prediction).filter(
-        Prediction.user_id == current_user.id
-    ).order_by(Prediction.created_at.desc()).all()
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return rows
+
+@router.get("/history/export")
+def export_prediction_history(
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    fields: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """Stream the full prediction history for current user as CSV or NDJSON"""
+    try:
+        selected = parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     
-    return predictions
+    rows = iter_history(current_user.id, fields=selected)
+    if format == "ndjson":
+        return StreamingResponse(export_ndjson(rows), media_type="application/x-ndjson")
+    return StreamingResponse(
+        export_csv(rows, selected),
+        media_type="text/csv",
+        headers={"Content-Disposition": 'attachment; filename="prediction_history.csv"'}
+    )
 
 @router.get("/metrics", response_model=MetricsResponse)
 async def get_model_metrics(
-    current_user: User = Depends(get_current_admin_or_doctor),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_admin_or_doctor_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get model performance metrics (admin/doctor only)"""
     
     # Get latest metrics
-    metrics = db.query(ModelMetrics).order_by(
-        ModelMetrics.created_at.desc()
-    ).first()
+    metrics = await latest_model_metrics(db)
     
     if not metrics:
         raise HTTPException(
@@ -191,5 +231,30 @@ async def get_model_metrics(
         "recall": metrics.recall,
         "f1_score": metrics.f1_score,
         "confusion_matrix": confusion_matrix,
+        "model_version": metrics.model_version,
+        "details": json.loads(metrics.details) if metrics.details else None,
         "created_at": metrics.created_at
     }
+
+@router.get("/stats", response_model=PredictionStatsResponse)
+async def get_prediction_stats(
+    days: int = Query(30, ge=1, le=366),
+    user_id: Optional[int] = Query(None, description="Admin/doctor only; 0 = all users"),
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Prediction counts by DR grade, uncertain rate and daily trend
+    
+    Answered from the prediction_stats rollup. Patients get their own stats;
+    admins and doctors may pass user_id (0 for all users).
+    """
+    target = current_user.id
+    if user_id is not None and user_id != current_user.id:
+        if current_user.role not in ["admin", "doctor"]:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Not enough permissions"
+            )
+        target = user_id
+    return await stats_summary(db, target, days=days)
@@ -0,0 +1,92 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+from typing import Optional
+
+from ..database import get_db
+from ..models.user import User
+from ..schemas.registry import ModelVersionsResponse, ModelReloadResponse, ShadowResponse
+from ..services.auth import get_current_admin, get_current_admin_or_doctor
+from ..services.prediction import get_prediction_service
+from ..services.shadow import shadow_summary
+
+router = APIRouter(prefix="/api/models", tags=["Models"])
+
+@router.get("", response_model=ModelVersionsResponse)
+async def list_model_versions(
+    current_user: User = Depends(get_current_admin_or_doctor)
+):
+    """List published model versions and the one this worker serves (admin/doctor only)"""
+    pred_service = get_prediction_service()
+    return {
+        "active_version": pred_service.model_version,
+        "current_version": pred_service.registry.current_version(),
+        "versions": pred_service.registry.versions()
+    }
+
+@router.post("/reload", response_model=ModelReloadResponse)
+async def reload_model(
+    version: Optional[str] = None,
+    current_user: User = Depends(get_current_admin)
+):
+    """
+    Switch to a model version without restarting (admin only)
+
+    With a version, this worker loads it and then points CURRENT at it, so the other
+    workers' watchers follow; without one, this worker loads CURRENT now. Loading runs
+    off the event loop and predictions keep using the previous version until the swap.
+    """
+    pred_service = get_prediction_service()
+    previous_version = pred_service.model_version
+    try:
+        active_version = await run_in_threadpool(pred_service.reload, version)
+        if version is not None:
+            pred_service.registry.activate(version)
+    except FileNotFoundError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Could not load model version: {str(e)}"
+        )
+    
+    return {
+        "previous_version": previous_version,
+        "active_version": active_version
+    }
+
+@router.get("/shadow", response_model=ShadowResponse)
+def get_shadow_evaluation(
+    version: Optional[str] = None,
+    current_user: User = Depends(get_current_admin_or_doctor),
+    db: Session = Depends(get_db)
+):
+    """Agreement of a shadowed candidate with the served model (admin/doctor only)"""
+    # Plain def: FastAPI runs it in the threadpool, so the sync queries stay off the event loop.
+    shadow = get_prediction_service().shadow
+    return {
+        "active": shadow.stats() if shadow is not None else None,
+        "summary": shadow_summary(db, version or (shadow.version if shadow is not None else None))
+    }
+
+@router.post("/shadow", response_model=ShadowResponse)
+async def set_shadow_model(
+    version: Optional[str] = None,
+    sample_rate: float = Query(0.1, ge=0.0, le=1.0),
+    current_user: User = Depends(get_current_admin)
+):
+    """Start shadowing a registry version on this worker, or stop without a version (admin only)"""
+    pred_service = get_prediction_service()
+    try:
+        await run_in_threadpool(pred_service.set_shadow, version, sample_rate)
+    except FileNotFoundError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        )
+    
+    shadow = pred_service.shadow
+    return {"active": shadow.stats() if shadow is not None else None}
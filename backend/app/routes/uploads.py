@@ -0,0 +1,117 @@
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database import get_async_db
+from ..models.user import User
+from ..schemas.prediction import PredictionResponse
+from ..schemas.uploads import UploadSessionCreate, UploadSessionResponse
+from ..services.auth import get_current_user_async
+from ..services.ingest import UploadRejected
+from ..services.resumable import get_resumable_uploads, receive_chunk
+from .predictions import predict_stored
+
+router = APIRouter(prefix="/api/uploads", tags=["Uploads"])
+
+# Request body of the chunk route, which reads the raw stream itself
+CHUNK_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {"application/octet-stream": {"schema": {"type": "string", "format": "binary"}}},
+    }
+}
+
+def rejected(e: UploadRejected) -> HTTPException:
+    return HTTPException(status_code=e.status_code, detail=e.detail)
+
+@router.post("", response_model=UploadSessionResponse, status_code=status.HTTP_201_CREATED)
+async def create_upload(
+    body: UploadSessionCreate,
+    current_user: User = Depends(get_current_user_async)
+):
+    """
+    Start a resumable upload
+
+    Send the bytes with PUT /api/uploads/{upload_id}?offset=N, then call
+    /finalize to run the prediction. Unfinished uploads expire after
+    UPLOAD_SESSION_TTL seconds without a chunk.
+    """
+    try:
+        return await run_in_threadpool(get_resumable_uploads().create, current_user.id, body.filename, body.size)
+    except UploadRejected as e:
+        raise rejected(e)
+
+@router.get("/{upload_id}", response_model=UploadSessionResponse)
+async def get_upload(
+    upload_id: str,
+    current_user: User = Depends(get_current_user_async)
+):
+    """Get the state of an upload; `offset` is where to resume after a dropped connection"""
+    try:
+        return await run_in_threadpool(get_resumable_uploads().get, upload_id, current_user.id)
+    except UploadRejected as e:
+        raise rejected(e)
+
+@router.put("/{upload_id}", response_model=UploadSessionResponse, openapi_extra=CHUNK_BODY)
+async def put_chunk(
+    upload_id: str,
+    request: Request,
+    offset: int = Query(..., ge=0),
+    current_user: User = Depends(get_current_user_async)
+):
+    """
+    Append a chunk (raw request body) at `offset`
+
+    `offset` must equal the bytes received so far, otherwise 409 is returned and
+    the client should GET the upload for the current offset. The image header is
+    checked as soon as it has arrived.
+    """
+    try:
+        return await receive_chunk(request, get_resumable_uploads(), upload_id, current_user.id, offset)
+    except UploadRejected as e:
+        raise rejected(e)
+
+@router.post("/{upload_id}/finalize", response_model=PredictionResponse)
+async def finalize_upload(
+    upload_id: str,
+    background_tasks: BackgroundTasks,
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Store the completed upload and predict on it
+
+    Calling it again returns the same prediction without re-running the model.
+    If the prediction service fails, the upload is kept so finalize can be retried.
+    """
+    uploads = get_resumable_uploads()
+    try:
+        prepared = await run_in_threadpool(uploads.finalize, upload_id, current_user.id)
+    except UploadRejected as e:
+        raise rejected(e)
+    if "result" in prepared:
+        return prepared["result"]
+
+    try:
+        result = await predict_stored(prepared["stored"], current_user, db, background_tasks)
+    except HTTPException as e:
+        # Not a retinal image: nothing to retry. Server-side failures keep the bytes.
+        await run_in_threadpool(uploads.fail, upload_id, e.status_code >= 500)
+        raise
+    except BaseException:
+        await run_in_threadpool(uploads.fail, upload_id, True)
+        raise
+    await run_in_threadpool(uploads.complete, upload_id, result)
+    return result
+
+@router.delete("/{upload_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_upload(
+    upload_id: str,
+    current_user: User = Depends(get_current_user_async)
+):
+    """Abandon an upload and free its partial file"""
+    if not await run_in_threadpool(get_resumable_uploads().discard, upload_id, current_user.id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Upload not found or expired"
+        )
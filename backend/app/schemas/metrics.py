@@ -1,6 +1,6 @@
 from pydantic import BaseModel
 from datetime import datetime
-from typing import List
+from typing import Any, Dict, List, Optional
 
 class MetricsBase(BaseModel):
     accuracy: float
@@ -8,6 +8,8 @@ class MetricsBase(BaseModel):
     recall: float
     f1_score: float
     confusion_matrix: str
+    model_version: Optional[str] = None
+    details: Optional[str] = None
 
 class MetricsCreate(MetricsBase):
     pass
@@ -25,4 +27,6 @@ class MetricsResponse(BaseModel):
     recall: float
     f1_score: float
     confusion_matrix: List[List[int]]
+    model_version: Optional[str] = None
+    details: Optional[Dict[str, Any]] = None
     created_at: datetime
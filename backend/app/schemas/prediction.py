@@ -13,14 +13,28 @@ class PredictionCreate(PredictionBase):
 class Prediction(PredictionBase):
     id: int
     user_id: int
+    model_version: Optional[str] = None
     created_at: datetime
     
     class Config:
         from_attributes = True
 
+class PredictionHistoryItem(BaseModel):
+    """History row; only the requested fields are present"""
+    id: Optional[int] = None
+    user_id: Optional[int] = None
+    image_path: Optional[str] = None
+    image_sha256: Optional[str] = None  # for /api/images/{image_sha256}; None for pre-migration uploads
+    predicted_class: Optional[int] = None
+    confidence: Optional[float] = None
+    model_version: Optional[str] = None
+    created_at: Optional[datetime] = None
+
 class PredictionResponse(BaseModel):
     predicted_class: int
     class_name: str
     confidence: float
     explanation: str
     image_path: str
+    image_sha256: Optional[str] = None  # /api/images/{image_sha256} serves it and its thumbnails
+    model_version: Optional[str] = None
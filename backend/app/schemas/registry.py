@@ -0,0 +1,15 @@
+from pydantic import BaseModel
+from typing import Any, Dict, List, Optional
+
+class ModelVersionsResponse(BaseModel):
+    active_version: Optional[str] = None
+    current_version: Optional[str] = None
+    versions: List[Dict[str, Any]]
+
+class ModelReloadResponse(BaseModel):
+    previous_version: Optional[str] = None
+    active_version: str
+
+class ShadowResponse(BaseModel):
+    active: Optional[Dict[str, Any]] = None  # this worker's shadow queue stats
+    summary: Optional[Dict[str, Any]] = None  # agreement and distribution shift from the database
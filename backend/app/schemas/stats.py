@@ -0,0 +1,23 @@
+from pydantic import BaseModel
+from datetime import date
+from typing import Dict, List, Optional
+
+class ClassCount(BaseModel):
+    predicted_class: int  # -1 = uncertain
+    class_name: str
+    count: int
+
+class DailyStats(BaseModel):
+    day: date
+    total: int
+    by_class: Dict[int, int]
+
+class PredictionStatsResponse(BaseModel):
+    user_id: int  # 0 = all users
+    days: int
+    since: date
+    total: int
+    by_class: List[ClassCount]
+    uncertain_rate: Optional[float] = None
+    mean_confidence: Optional[float] = None
+    daily: List[DailyStats]
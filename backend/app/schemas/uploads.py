@@ -0,0 +1,15 @@
+from pydantic import BaseModel, Field
+from datetime import datetime
+
+class UploadSessionCreate(BaseModel):
+    filename: str
+    size: int = Field(..., gt=0)  # total bytes the client will send
+
+class UploadSessionResponse(BaseModel):
+    upload_id: str
+    filename: str
+    size: int
+    offset: int  # bytes received so far; the next chunk starts here
+    status: str  # uploading | finalizing | completed
+    expires_at: datetime
+    chunk_size: int  # suggested chunk size
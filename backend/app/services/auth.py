@@ -1,16 +1,20 @@
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
-import bcrypt
 from fastapi import Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 import os
 from dotenv import load_dotenv
 
-from ..database import get_db
+from ..database import get_async_db, get_db
 from ..models.user import User
 from ..schemas.user import TokenData
+from .auth_cache import AuthenticatedUser, auth_cache
+from .bcrypt_pool import BcryptPoolSaturated, bcrypt_pool, check_password_sync, hash_password_sync, needs_rehash
 
 load_dotenv()
 
@@ -21,17 +25,27 @@ ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
 security = HTTPBearer()
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a plain password against a hashed password"""
-    password_bytes = plain_password.encode('utf-8')
-    hashed_bytes = hashed_password.encode('utf-8')
-    return bcrypt.checkpw(password_bytes, hashed_bytes)
+    """Verify a plain password against a hashed password (blocking; for scripts and startup)"""
+    return check_password_sync(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
-    """Hash a password"""
-    password_bytes = password.encode('utf-8')
-    salt = bcrypt.gensalt()
-    hashed = bcrypt.hashpw(password_bytes, salt)
-    return hashed.decode('utf-8')
+    """Hash a password with BCRYPT_ROUNDS (blocking; for scripts and startup)"""
+    return hash_password_sync(password)
+
+def password_pool_busy() -> HTTPException:
+    """503 returned when the bcrypt pool rejects work"""
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many sign-in requests right now, please retry shortly",
+        headers={"Retry-After": "1"},
+    )
+
+async def hash_password_async(password: str) -> str:
+    """Hash a password on the bcrypt pool"""
+    try:
+        return await bcrypt_pool.hash(password)
+    except BcryptPoolSaturated:
+        raise password_pool_busy()
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create a JWT access token"""
@@ -47,30 +61,63 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
 def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: Session = Depends(get_db)
-) -> User:
-    """Get the current authenticated user from JWT token"""
-    credentials_exception = HTTPException(
+) -> AuthenticatedUser:
+    """
+    Get the current authenticated user from JWT token
+    
+    Returns a read-only AuthenticatedUser snapshot; repeat requests with the same
+    token are served from auth_cache without decoding the JWT or querying users.
+    """
+    token = credentials.credentials
+    cached = auth_cache.get(token)
+    if cached is not None:
+        return cached
+    
+    payload = _decode_token(token)
+    user = db.query(User).filter(User.email == payload["sub"]).first()
+    return _remember_user(token, payload, user)
+
+async def get_current_user_async(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: AsyncSession = Depends(get_async_db)
+) -> AuthenticatedUser:
+    """get_current_user for async routes; a cache miss queries users without blocking the event loop"""
+    token = credentials.credentials
+    cached = auth_cache.get(token)
+    if cached is not None:
+        return cached
+    
+    payload = _decode_token(token)
+    user = (await db.execute(select(User).where(User.email == payload["sub"]))).scalars().first()
+    return _remember_user(token, payload, user)
+
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def _decode_token(token: str) -> dict:
+    """Validated JWT payload with a subject; 401 otherwise"""
     try:
-        token = credentials.credentials
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
         if email is None:
-            raise credentials_exception
-        token_data = TokenData(email=email)
+            raise _credentials_exception()
+        TokenData(email=email)
     except JWTError:
-        raise credentials_exception
-    
-    user = db.query(User).filter(User.email == token_data.email).first()
+        raise _credentials_exception()
+    return payload
+
+def _remember_user(token: str, payload: dict, user: Optional[User]) -> AuthenticatedUser:
     if user is None:
-        raise credentials_exception
-    return user
+        raise _credentials_exception()
+    authenticated = AuthenticatedUser.from_user(user)
+    auth_cache.put(token, authenticated, token_expires_at=payload.get("exp"))
+    return authenticated
 
-def get_current_admin_or_doctor(current_user: User = Depends(get_current_user)) -> User:
-    """Verify user has admin or doctor role"""
+def _require_admin_or_doctor(current_user: AuthenticatedUser) -> AuthenticatedUser:
     if current_user.role not in ["admin", "doctor"]:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -78,11 +125,46 @@ def get_current_admin_or_doctor(current_user: User = Depends(get_current_user))
         )
     return current_user
 
-def authenticate_user(db: Session, email: str, password: str) -> Optional[User]:
-    """Authenticate a user with email and password"""
-    user = db.query(User).filter(User.email == email).first()
+def get_current_admin_or_doctor(current_user: AuthenticatedUser = Depends(get_current_user)) -> AuthenticatedUser:
+    """Verify user has admin or doctor role"""
+    return _require_admin_or_doctor(current_user)
+
+async def get_current_admin_or_doctor_async(
+    current_user: AuthenticatedUser = Depends(get_current_user_async)
+) -> AuthenticatedUser:
+    """get_current_admin_or_doctor for async routes"""
+    return _require_admin_or_doctor(current_user)
+
+def get_current_admin(current_user: AuthenticatedUser = Depends(get_current_user)) -> AuthenticatedUser:
+    """Verify user has admin role"""
+    if current_user.role != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+    return current_user
+
+async def authenticate_user(db: Session, email: str, password: str) -> Optional[User]:
+    """
+    Authenticate a user with email and password
+    
+    The bcrypt check runs on bcrypt_pool (503 when saturated). A hash made with a
+    different cost than BCRYPT_ROUNDS is replaced after a successful check.
+    """
+    user = await run_in_threadpool(lambda: db.query(User).filter(User.email == email).first())
     if not user:
         return None
-    if not verify_password(password, user.hashed_password):
-        return None
+    try:
+        if not await bcrypt_pool.verify(password, user.hashed_password):
+            return None
+    except BcryptPoolSaturated:
+        raise password_pool_busy()
+    
+    if needs_rehash(user.hashed_password):
+        try:
+            user.hashed_password = await bcrypt_pool.hash(password)
+            await run_in_threadpool(db.commit)
+        except BcryptPoolSaturated:
+            # Upgrade on a later login rather than failing a valid one.
+            pass
     return user
@@ -0,0 +1,153 @@
+"""
+Cache of validated access tokens
+Maps a bearer token to the identity of its user for a short TTL (never past the
+token's own expiry), so authenticated requests skip both the JWT decode and the
+user query. Entries for a user are dropped whenever that user's email, role or
+password changes in this process.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Optional
+
+from sqlalchemy import event, inspect
+
+from ..models.user import User
+
+
+class AuthenticatedUser:
+    """Read-only snapshot of the User fields routes need"""
+
+    __slots__ = ("id", "email", "name", "role", "created_at")
+
+    def __init__(self, id: int, email: str, name: str, role: str, created_at: datetime = None):
+        self.id = id
+        self.email = email
+        self.name = name
+        self.role = role
+        self.created_at = created_at
+
+    @classmethod
+    def from_user(cls, user: User) -> "AuthenticatedUser":
+        return cls(user.id, user.email, user.name, user.role, user.created_at)
+
+
+class AuthCache:
+    """Bounded TTL + LRU cache of token -> AuthenticatedUser"""
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 60.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (user, expires_at)
+        self._keys_by_email: Dict[str, set] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl_seconds > 0
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str) -> Optional[AuthenticatedUser]:
+        if not self.enabled:
+            return None
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time.time():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, token: str, user: AuthenticatedUser, token_expires_at: float = None):
+        """Cache user for token until the TTL or the token's exp, whichever comes first"""
+        if not self.enabled:
+            return
+        expires_at = time.time() + self.ttl_seconds
+        if token_expires_at is not None:
+            expires_at = min(expires_at, float(token_expires_at))
+        key = self._key(token)
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (user, expires_at)
+            self._keys_by_email.setdefault(user.email, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            keys = self._keys_by_email.get(entry[0].email)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_email[entry[0].email]
+
+    def invalidate_user(self, email: str):
+        """Drop every cached token of a user (call after a role or password change)"""
+        with self._lock:
+            for key in list(self._keys_by_email.get(email, ())):
+                self._remove(key)
+            self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_email.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+auth_cache = AuthCache(
+    max_entries=int(os.getenv("AUTH_CACHE_SIZE", "10000")),
+    ttl_seconds=float(os.getenv("AUTH_CACHE_TTL", "60"))
+)
+
+
+# Any change to these columns made through the ORM in this process invalidates the user.
+_IDENTITY_COLUMNS = ("email", "role", "hashed_password")
+
+
+@event.listens_for(User, "after_update")
+def _invalidate_on_update(mapper, connection, target):
+    state = inspect(target)
+    changed = [name for name in _IDENTITY_COLUMNS if state.attrs[name].history.has_changes()]
+    if changed:
+        auth_cache.invalidate_user(target.email)
+        # A changed email leaves tokens cached under the old address.
+        old_emails = state.attrs["email"].history.deleted
+        for email in old_emails or ():
+            auth_cache.invalidate_user(email)
+
+
+@event.listens_for(User, "after_delete")
+def _invalidate_on_delete(mapper, connection, target):
+    auth_cache.invalidate_user(target.email)
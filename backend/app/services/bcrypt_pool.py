@@ -0,0 +1,93 @@
+"""
+Bounded executor for bcrypt work
+Password hashing and verification run on their own small thread pool instead of
+FastAPI's shared threadpool. At most BCRYPT_QUEUE_LIMIT jobs may be queued or
+running; beyond that, callers are rejected at once instead of waiting.
+"""
+
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+
+class BcryptPoolSaturated(Exception):
+    """Raised when the bcrypt queue is full"""
+
+
+def hash_password_sync(password: str, rounds: int = None) -> str:
+    salt = bcrypt.gensalt(rounds=rounds or BCRYPT_ROUNDS)
+    return bcrypt.hashpw(password.encode("utf-8"), salt).decode("utf-8")
+
+
+def check_password_sync(password: str, hashed_password: str) -> bool:
+    return bcrypt.checkpw(password.encode("utf-8"), hashed_password.encode("utf-8"))
+
+
+def hash_rounds(hashed_password: str) -> int:
+    """Cost factor of a bcrypt hash ($2b$<rounds>$...)"""
+    try:
+        return int(hashed_password.split("$")[2])
+    except (IndexError, ValueError):
+        return 0
+
+
+def needs_rehash(hashed_password: str) -> bool:
+    return hash_rounds(hashed_password) != BCRYPT_ROUNDS
+
+
+class BcryptPool:
+    """Thread pool with a hard limit on queued + running bcrypt jobs"""
+
+    def __init__(self, workers: int = 2, queue_limit: int = 16):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._slots = threading.BoundedSemaphore(queue_limit)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+
+    async def run(self, fn, *args):
+        """Run fn(*args) on the pool; raises BcryptPoolSaturated without waiting when full"""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise BcryptPoolSaturated("Too many password operations in progress")
+        with self._lock:
+            self.in_flight += 1
+        try:
+            return await asyncio.wrap_future(self._executor.submit(fn, *args))
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+                self.completed += 1
+            self._slots.release()
+
+    async def hash(self, password: str) -> str:
+        return await self.run(hash_password_sync, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self.run(check_password_sync, password, hashed_password)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queue_limit": self.queue_limit,
+                "in_flight": self.in_flight,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "rounds": BCRYPT_ROUNDS,
+            }
+
+
+bcrypt_pool = BcryptPool(
+    workers=int(os.getenv("BCRYPT_WORKERS", str(min(4, os.cpu_count() or 1)))),
+    queue_limit=int(os.getenv("BCRYPT_QUEUE_LIMIT", "32"))
+)
@@ -0,0 +1,150 @@
+"""
+Keyset-paginated prediction history
+Pages are ordered by (created_at, id) descending and continue from an opaque
+cursor instead of an OFFSET, so every page is one index range scan on
+(user_id, created_at) no matter how long the history is.
+"""
+
+import base64
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from ..database import SessionLocal
+from ..models.prediction import Prediction
+from .storage import sha256_from_path
+
+# image_sha256 is derived from image_path; /api/images/{image_sha256} serves the image.
+HISTORY_FIELDS = ("id", "user_id", "image_path", "image_sha256", "predicted_class", "confidence",
+                  "model_version", "created_at")
+DERIVED_FIELDS = {"image_sha256": ("image_path", sha256_from_path)}
+
+
+def encode_cursor(created_at: datetime, prediction_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{prediction_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Inverse of encode_cursor; raises ValueError for malformed cursors"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, prediction_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(prediction_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def parse_fields(fields: Optional[str]) -> List[str]:
+    """Comma-separated field names to return (all fields when empty)"""
+    if not fields:
+        return list(HISTORY_FIELDS)
+    selected = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in selected if f not in HISTORY_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(HISTORY_FIELDS)}")
+    return selected
+
+
+def _page_statement(user_id: int, limit: int, cursor: Optional[str], fields: Sequence[str]):
+    # id and created_at are always read: the cursor is built from them.
+    columns = list(dict.fromkeys([
+        "id", "created_at", *(DERIVED_FIELDS[f][0] if f in DERIVED_FIELDS else f for f in fields)
+    ]))
+    statement = select(*[getattr(Prediction, c) for c in columns]).where(Prediction.user_id == user_id)
+    if cursor:
+        created_at, prediction_id = decode_cursor(cursor)
+        statement = statement.where(or_(
+            Prediction.created_at < created_at,
+            and_(Prediction.created_at == created_at, Prediction.id < prediction_id),
+        ))
+    return statement.order_by(Prediction.created_at.desc(), Prediction.id.desc()).limit(limit + 1)
+
+
+def _page_result(rows, limit: int, fields: Sequence[str]) -> Tuple[List[Dict], Optional[str]]:
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+    return [{f: _field(row, f) for f in fields} for row in rows], next_cursor
+
+
+def _field(row, field: str):
+    if field in DERIVED_FIELDS:
+        source, derive = DERIVED_FIELDS[field]
+        return derive(getattr(row, source))
+    return getattr(row, field)
+
+
+def history_page(db: Session, user_id: int, limit: int = 100, cursor: str = None,
+                 fields: Sequence[str] = HISTORY_FIELDS) -> Tuple[List[Dict], Optional[str]]:
+    """
+    One page of a user's predictions, newest first
+
+    Args:
+        db: Database session
+        user_id: Owner of the predictions
+        limit: Page size
+        cursor: Cursor returned with the previous page
+        fields: Columns to return
+
+    Returns:
+        Tuple of (rows as dicts, cursor for the next page or None on the last page)
+    """
+    rows = db.execute(_page_statement(user_id, limit, cursor, fields)).all()
+    return _page_result(rows, limit, fields)
+
+
+async def history_page_async(db: AsyncSession, user_id: int, limit: int = 100, cursor: str = None,
+                             fields: Sequence[str] = HISTORY_FIELDS) -> Tuple[List[Dict], Optional[str]]:
+    """history_page on an async session"""
+    rows = (await db.execute(_page_statement(user_id, limit, cursor, fields))).all()
+    return _page_result(rows, limit, fields)
+
+
+def iter_history(user_id: int, fields: Sequence[str] = HISTORY_FIELDS,
+                 page_size: int = 1000) -> Iterator[Dict]:
+    """
+    Every prediction of a user, newest first, read page by page
+
+    Uses its own session so a streaming response can outlive the request's session.
+    """
+    db = SessionLocal()
+    try:
+        cursor = None
+        while True:
+            rows, cursor = history_page(db, user_id, limit=page_size, cursor=cursor, fields=fields)
+            yield from rows
+            if cursor is None:
+                return
+    finally:
+        db.close()
+
+
+def _json_default(value):
+    return value.isoformat() if isinstance(value, datetime) else str(value)
+
+
+def export_ndjson(rows: Iterator[Dict]) -> Iterator[str]:
+    for row in rows:
+        yield json.dumps(row, default=_json_default) + "\n"
+
+
+def export_csv(rows: Iterator[Dict], fields: Sequence[str], chunk_rows: int = 500) -> Iterator[str]:
+    """CSV text in chunks of chunk_rows lines"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=list(fields))
+    writer.writeheader()
+    for i, row in enumerate(rows, start=1):
+        writer.writerow({k: _json_default(v) if isinstance(v, datetime) else v for k, v in row.items()})
+        if i % chunk_rows == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
@@ -0,0 +1,265 @@
+"""
+Streaming image upload ingestion
+Multipart bodies are parsed as they arrive instead of being spooled by the
+framework first. The file part is checked on the way in: its magic bytes and
+(from the PNG IHDR / JPEG SOF header) its dimensions are validated within the
+first few KB, the size cap is enforced per chunk, and the bytes are hashed and
+written to the store's temp file (from the threadpool) as they come. A rejected
+upload stops reading the body at that point.
+"""
+
+import os
+import struct
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import Request
+from fastapi.concurrency import run_in_threadpool
+
+try:
+    import python_multipart as multipart
+    from python_multipart.multipart import parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    import multipart
+    from multipart.multipart import parse_options_header
+
+from .storage import ImageStore, IncomingFile
+
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(20 * 1024 * 1024)))
+UPLOAD_MIN_DIMENSION = int(os.getenv("UPLOAD_MIN_DIMENSION", "100"))
+UPLOAD_MAX_DIMENSION = int(os.getenv("UPLOAD_MAX_DIMENSION", "10000"))
+UPLOAD_MAX_PIXELS = int(os.getenv("UPLOAD_MAX_PIXELS", str(50_000_000)))
+# JPEG dimensions follow the EXIF/ICC segments; give up if they are not found by then.
+SNIFF_LIMIT = 256 * 1024
+# Multipart boundaries and part headers on top of the file itself.
+MULTIPART_OVERHEAD = 64 * 1024
+
+ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png"}
+FORMAT_EXTENSIONS = {"png": ".png", "jpeg": ".jpg"}
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+JPEG_SOI = b"\xff\xd8\xff"
+# Start-of-frame markers carry the dimensions (C4, C8 and CC are other segments).
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+class UploadRejected(ValueError):
+    """An upload failed validation; status_code is the HTTP status to answer with"""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def _jpeg_dimensions(head: bytes) -> Optional[Tuple[int, int]]:
+    """(width, height) from the first SOF segment, or None if more bytes are needed"""
+    i = 2
+    while i + 4 <= len(head):
+        if head[i] != 0xFF:
+            raise UploadRejected(415, "Corrupt JPEG header")
+        marker = head[i + 1]
+        if marker == 0xFF:  # fill byte
+            i += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:  # standalone markers
+            i += 2
+            continue
+        if marker == 0xD9 or marker == 0xDA:
+            raise UploadRejected(415, "JPEG has no frame header")
+        if marker in JPEG_SOF_MARKERS:
+            if i + 9 > len(head):
+                return None
+            height, width = struct.unpack(">HH", head[i + 5:i + 9])
+            return width, height
+        i += 2 + struct.unpack(">H", head[i + 2:i + 4])[0]
+    return None
+
+
+def sniff_image(head: bytes) -> Optional[Tuple[str, int, int]]:
+    """
+    Identify an image from its first bytes
+
+    Args:
+        head: Leading bytes of the file
+
+    Returns:
+        (format, width, height), or None when more bytes are needed
+
+    Raises:
+        UploadRejected: If the bytes are not a PNG or JPEG
+    """
+    if head.startswith(PNG_SIGNATURE):
+        if len(head) < 24:
+            return None
+        if head[12:16] != b"IHDR":
+            raise UploadRejected(415, "Corrupt PNG header")
+        width, height = struct.unpack(">II", head[16:24])
+        return "png", width, height
+    if head.startswith(JPEG_SOI):
+        dimensions = _jpeg_dimensions(head)
+        return None if dimensions is None else ("jpeg", *dimensions)
+    if len(head) < len(PNG_SIGNATURE) and (PNG_SIGNATURE.startswith(head) or JPEG_SOI.startswith(head[:3])):
+        return None
+    raise UploadRejected(415, "File is not a PNG or JPEG image")
+
+
+def too_large(max_bytes: int) -> UploadRejected:
+    return UploadRejected(413, f"File is larger than {max_bytes / (1024 * 1024):.3g} MB")
+
+
+def check_dimensions(width: int, height: int):
+    if min(width, height) < UPLOAD_MIN_DIMENSION:
+        raise UploadRejected(
+            400, f"Image is too small ({width}x{height}). Please upload a high-quality retinal image "
+                 f"(minimum {UPLOAD_MIN_DIMENSION}x{UPLOAD_MIN_DIMENSION} pixels)"
+        )
+    if max(width, height) > UPLOAD_MAX_DIMENSION or width * height > UPLOAD_MAX_PIXELS:
+        raise UploadRejected(400, f"Image dimensions {width}x{height} exceed the allowed maximum")
+
+
+class ImageIngest:
+    """
+    Validates, hashes and stores one file part chunk by chunk
+
+    feed() only validates and buffers, so it is safe on the event loop;
+    flush() does the file I/O and belongs in the threadpool.
+    """
+
+    def __init__(self, store: ImageStore, max_bytes: int = UPLOAD_MAX_BYTES):
+        self.store = store
+        self.max_bytes = max_bytes
+        self.incoming: Optional[IncomingFile] = None
+        self.size = 0
+        self.pending: List[bytes] = []
+        self.head = b""
+        self.info: Optional[Tuple[str, int, int]] = None
+
+    def feed(self, chunk: bytes):
+        if self.size + len(chunk) > self.max_bytes:
+            raise too_large(self.max_bytes)
+        if self.info is None:
+            self.head += chunk
+            self.info = sniff_image(self.head)
+            if self.info is not None:
+                check_dimensions(self.info[1], self.info[2])
+                self.head = b""
+            elif len(self.head) > SNIFF_LIMIT:
+                raise UploadRejected(415, "Could not find the image dimensions")
+        self.size += len(chunk)
+        self.pending.append(chunk)
+
+    def flush(self):
+        """Write the chunks buffered by feed() to the temp file"""
+        if self.incoming is None:
+            self.incoming = self.store.begin()
+        pending, self.pending = self.pending, []
+        for chunk in pending:
+            self.incoming.write(chunk)
+
+    def finish(self) -> Dict:
+        """Store the received file; returns the store's result plus format, width and height"""
+        if self.size == 0:
+            raise UploadRejected(400, "Uploaded file is empty")
+        if self.info is None:
+            sniff_image(self.head)  # raises for non-images
+            raise UploadRejected(415, "Image header is truncated")
+        self.flush()
+        image_format, width, height = self.info
+        stored = self.store.commit(self.incoming, FORMAT_EXTENSIONS[image_format])
+        return {**stored, "format": image_format, "width": width, "height": height}
+
+    def abort(self):
+        if self.incoming is not None:
+            self.incoming.abort()
+
+
+async def receive_upload(request: Request, store: ImageStore, field: str = "file") -> Dict:
+    """
+    Parse a multipart/form-data request and ingest its `field` file part as it streams in
+
+    Args:
+        request: Incoming request (its body must not have been read yet)
+        store: Image store receiving the file
+        field: Form field holding the image
+
+    Returns:
+        Stored file dict (path, sha256, size_bytes, deduplicated, format, width, height, filename)
+
+    Raises:
+        UploadRejected: On a missing, oversized or invalid file, before the rest of the body is read
+    """
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > UPLOAD_MAX_BYTES + MULTIPART_OVERHEAD:
+        raise too_large(UPLOAD_MAX_BYTES)
+
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise UploadRejected(415, "Expected a multipart/form-data upload")
+
+    state = {"headers": {}, "header_field": b"", "header_value": b"", "ingest": None, "filename": None}
+    ingest = ImageIngest(store)
+
+    def on_part_begin():
+        state["headers"] = {}
+
+    def on_header_field(data, start, end):
+        state["header_field"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        state["header_value"] += data[start:end]
+
+    def on_header_end():
+        state["headers"][state["header_field"].lower()] = state["header_value"]
+        state["header_field"] = state["header_value"] = b""
+
+    def on_headers_finished():
+        _, options = parse_options_header(state["headers"].get(b"content-disposition", b""))
+        is_target = options.get(b"name") == field.encode() and b"filename" in options
+        if is_target and state["ingest"] is None and state["filename"] is None:
+            filename = options[b"filename"].decode("utf-8", "replace")
+            if os.path.splitext(filename)[1].lower() not in ALLOWED_EXTENSIONS:
+                raise UploadRejected(
+                    400, f"Invalid file type. Allowed types: {', '.join(sorted(ALLOWED_EXTENSIONS))}"
+                )
+            state["filename"] = filename
+            state["ingest"] = ingest
+        else:
+            state["ingest"] = None
+
+    def on_part_data(data, start, end):
+        if state["ingest"] is not None:
+            state["ingest"].feed(data[start:end])
+
+    def on_part_end():
+        state["ingest"] = None
+
+    parser = multipart.MultipartParser(boundary, {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+
+    try:
+        try:
+            async for chunk in request.stream():
+                if chunk:
+                    parser.write(chunk)
+                    if ingest.pending:
+                        await run_in_threadpool(ingest.flush)
+            parser.finalize()
+        except UploadRejected:
+            raise
+        except Exception as e:
+            raise UploadRejected(400, f"Malformed upload: {e}")
+        if state["filename"] is None:
+            raise UploadRejected(422, f"Missing file field '{field}'")
+        stored = await run_in_threadpool(ingest.finish)
+    except BaseException:
+        ingest.abort()
+        raise
+    return {**stored, "filename": state["filename"]}
@@ -0,0 +1,84 @@
+import json
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database import SessionLocal, init_db
+from ..models.metrics import ModelMetrics
+from ..models.training_run import TrainingRun
+
+
+def record_model_metrics(report: dict, model_version: str) -> ModelMetrics:
+    """
+    Store an evaluation report (training.evaluation) as the latest ModelMetrics row.
+    
+    Args:
+        report: Report from evaluate_predictions
+        model_version: Version tag of the evaluated model
+    
+    Returns:
+        The stored row
+    """
+    init_db()
+    # Everything without its own column (per-class stats, calibration, served decision)
+    columns = ("accuracy", "precision", "recall", "f1_score", "confusion_matrix")
+    details = {key: value for key, value in report.items() if key not in columns}
+    db = SessionLocal()
+    try:
+        metrics = ModelMetrics(
+            accuracy=report["accuracy"],
+            precision=report["precision"],
+            recall=report["recall"],
+            f1_score=report["f1_score"],
+            confusion_matrix=json.dumps(report["confusion_matrix"]),
+            model_version=model_version,
+            details=json.dumps(details)
+        )
+        db.add(metrics)
+        db.commit()
+        db.refresh(metrics)
+        return metrics
+    finally:
+        db.close()
+
+
+def record_training_run(summary: dict) -> TrainingRun:
+    """
+    Store a training run summary (training.telemetry) in the training_runs table.
+    
+    Args:
+        summary: Summary from RunTelemetry.summary()
+    
+    Returns:
+        The stored row
+    """
+    init_db()
+    db = SessionLocal()
+    try:
+        run = TrainingRun(
+            run_id=summary["run_id"],
+            script=summary["script"],
+            status=summary["status"],
+            started_at=datetime.fromisoformat(summary["started_at"]),
+            finished_at=datetime.fromisoformat(summary["finished_at"]),
+            total_seconds=summary["total_seconds"],
+            peak_rss_mb=summary["peak_rss_mb"],
+            model_version=summary["info"].get("model_version"),
+            stages=json.dumps(summary["stages"]),
+            epochs=json.dumps(summary["epochs"]),
+            config=json.dumps({"config": summary["config"], "info": summary["info"]}, default=str)
+        )
+        db.add(run)
+        db.commit()
+        db.refresh(run)
+        return run
+    finally:
+        db.close()
+
+
+async def latest_model_metrics(db: AsyncSession) -> Optional[ModelMetrics]:
+    """Most recent ModelMetrics row, or None before the first training run"""
+    result = await db.execute(select(ModelMetrics).order_by(ModelMetrics.created_at.desc()).limit(1))
+    return result.scalars().first()
@@ -1,17 +1,38 @@
 import os
 import sys
+import threading
+import time
 import numpy as np
 import requests
-from typing import Tuple
+from typing import Dict, Optional, Tuple
 
 # Add training module to path
 sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))))
 
 from training.preprocessing import preprocess_image
+from training.decision import UNCERTAIN_CLASS, calibrate_probabilities, decide
+from training.heads import has_head, head_artifacts
+from training.registry import ModelRegistry
+
+class ModelBundle:
+    """One loaded model version; never modified after construction"""
+
+    def __init__(self, version: str, feature_extractor=None, classifier=None, student=None,
+                 fallback_mode: bool = False, digests: Dict[str, str] = None):
+        self.version = version
+        self.feature_extractor = feature_extractor
+        self.classifier = classifier
+        self.student = student
+        self.fallback_mode = fallback_mode
+        self.digests = digests or {}
+
+    def shares(self, digests: Dict[str, str], *names: str) -> bool:
+        """True when every named file has the same digest in both versions"""
+        return bool(self.digests) and all(self.digests.get(name) == digests.get(name) for name in names)
 
 class PredictionService:
     """Service for making DR predictions"""
-    UNCERTAIN_CLASS = -1
+    UNCERTAIN_CLASS = UNCERTAIN_CLASS
     
     # Class names and descriptions
     CLASS_NAMES = {
@@ -38,57 +59,186 @@ class PredictionService:
     
     def __init__(self, models_dir: str = "./models_saved"):
         self.models_dir = models_dir
-        self.feature_extractor = None
-        self.classifier = None
-        self.feature_extractor_cls = None
-        self.classifier_cls = None
-        self.fallback_mode = False
-        self._load_models()
-    
-    def _load_models(self):
-        """Load the trained models"""
+        self.engine = os.getenv("PREDICTION_ENGINE", "ensemble").strip().lower()
+        self.registry = ModelRegistry(models_dir=models_dir)
+        self.watch_interval = float(os.getenv("MODEL_WATCH_INTERVAL", "10"))
+        self.bundle = None
+        self._reload_lock = threading.Lock()
+        self._failed_version = None
+        self._watcher = None
+        self.shadow = None
+        self.bundle = self._load_bundle(self.registry.current_version())
+        if self.watch_interval > 0:
+            self.start_watcher()
+
+        # Optional candidate run on a sample of live traffic, off the request path.
+        shadow_version = os.getenv("SHADOW_MODEL_VERSION", "").strip()
+        if shadow_version:
+            try:
+                self.set_shadow(shadow_version, float(os.getenv("SHADOW_SAMPLE_RATE", "0.1")))
+            except Exception as e:
+                print(f"Warning: Could not start shadow model {shadow_version}: {e}")
+
+    # The active bundle's models, for callers that predate the registry.
+    @property
+    def model_version(self) -> str:
+        return self.bundle.version
+
+    @property
+    def feature_extractor(self):
+        return self.bundle.feature_extractor
+
+    @property
+    def classifier(self):
+        return self.bundle.classifier
+
+    @property
+    def student(self):
+        return self.bundle.student
+
+    @property
+    def fallback_mode(self) -> bool:
+        return self.bundle.fallback_mode
+
+    def _load_bundle(self, version: Optional[str] = None) -> "ModelBundle":
+        """
+        Load a model version into a new bundle
+
+        Args:
+            version: Registry version, or None for the unversioned files in models_dir
+
+        Returns:
+            ModelBundle; models whose files did not change are shared with the active bundle
+        """
         try:
-            feature_extractor_path = os.path.join(self.models_dir, "feature_extractor.h5")
-            vit_path = os.path.join(self.models_dir, "vit_classifier.weights.h5")
+            if version is None:
+                model_dir = self.models_dir
+                digests = {}
+                os.makedirs(self.models_dir, exist_ok=True)
+            else:
+                model_dir = str(self.registry.version_dir(version))
+                digests = self.registry.manifest(version)["files"]
+            feature_extractor_path = os.path.join(model_dir, "feature_extractor.h5")
+            vit_path = os.path.join(model_dir, "vit_classifier.weights.h5")
+            previous = self.bundle
 
-            os.makedirs(self.models_dir, exist_ok=True)
+            # Distilled single-CNN engine (built by distill.py) replaces the ensemble.
+            if self.engine == "student":
+                student_path = os.path.join(model_dir, "student_model.h5")
+                if os.path.exists(student_path):
+                    from training.distillation import StudentClassifier
+                    student = StudentClassifier.from_file(student_path)
+                    print(f"Loaded student model from {student_path}")
+                    return ModelBundle(version or "unversioned", student=student, digests=digests)
+                print(f"Warning: {student_path} not found; using the ensemble engine.")
 
             # Optional: fetch model artifacts from URLs for cloud hosts where large files are not in git.
-            feature_url = os.getenv("MODEL_FEATURE_EXTRACTOR_URL", "").strip()
-            vit_url = os.getenv("MODEL_VIT_WEIGHTS_URL", "").strip()
-            if feature_url and not os.path.exists(feature_extractor_path):
-                self._download_file(feature_url, feature_extractor_path)
-            if vit_url and not os.path.exists(vit_path):
-                self._download_file(vit_url, vit_path)
-
-            if not os.path.exists(feature_extractor_path) or not os.path.exists(vit_path):
-                self.fallback_mode = True
+            if version is None:
+                feature_url = os.getenv("MODEL_FEATURE_EXTRACTOR_URL", "").strip()
+                vit_url = os.getenv("MODEL_VIT_WEIGHTS_URL", "").strip()
+                if feature_url and not os.path.exists(feature_extractor_path):
+                    self._download_file(feature_url, feature_extractor_path)
+                if vit_url and not os.path.exists(vit_path):
+                    self._download_file(vit_url, vit_path)
+
+            if not os.path.exists(feature_extractor_path) or not has_head(model_dir):
                 print(
                     "Warning: Model files are missing. "
                     "Prediction service will use lightweight fallback mode."
                 )
-                return
+                return ModelBundle("fallback", fallback_mode=True)
 
             # Import TensorFlow-dependent modules only when real artifacts exist.
             from training.feature_extractor import HybridCNNFeatureExtractor
-            from training.vit_classifier import VisionTransformerClassifier
+            from training.heads import load_head
 
-            self.feature_extractor_cls = HybridCNNFeatureExtractor
-            self.classifier_cls = VisionTransformerClassifier
+            # The CNN extractor rarely changes between versions; reuse it when the file is identical.
+            if previous is not None and previous.shares(digests, "feature_extractor.h5"):
+                feature_extractor = previous.feature_extractor
+            else:
+                feature_extractor = HybridCNNFeatureExtractor()
+                feature_extractor.load(feature_extractor_path)
+                print(f"Loaded feature extractor from {feature_extractor_path}")
 
-            # Only build heavy TensorFlow models when artifacts are present.
-            self.feature_extractor = self.feature_extractor_cls()
-            self.feature_extractor.load(feature_extractor_path)
-            print(f"Loaded feature extractor from {feature_extractor_path}")
+            # Any head type (ViT, linear, logistic regression, boosted trees) saved by training.heads
+            if previous is not None and previous.shares(digests, *head_artifacts(model_dir)):
+                classifier = previous.classifier
+            else:
+                classifier = load_head(model_dir)
+                print(f"Loaded {classifier.head_type} classifier head from {model_dir}")
 
-            self.classifier = self.classifier_cls(num_classes=5, feature_dim=2560)
-            self.classifier.load(vit_path)
-            print(f"Loaded ViT classifier from {vit_path}")
+            return ModelBundle(version or "unversioned", feature_extractor=feature_extractor,
+                               classifier=classifier, digests=digests)
         
         except Exception as e:
             print(f"Error loading models: {e}")
             raise
 
+    def reload(self, version: Optional[str] = None) -> str:
+        """
+        Load a version (default: the registry's CURRENT) and switch to it
+
+        The new bundle is fully loaded before the swap; requests already running keep
+        the bundle they started with.
+
+        Returns:
+            The active model version
+        """
+        with self._reload_lock:
+            version = version or self.registry.current_version()
+            if version is not None and version == self.bundle.version:
+                return version
+            bundle = self._load_bundle(version)
+            self.bundle = bundle
+            self._failed_version = None
+            print(f"Serving model version {bundle.version}")
+            return bundle.version
+
+    def set_shadow(self, version: Optional[str], sample_rate: float = 0.1):
+        """
+        Shadow a candidate registry version on a fraction of requests (None stops shadowing)
+
+        The candidate shares every model whose files match the active bundle, so a new
+        head over the same extractor reuses the primary's CNN features.
+        """
+        from .shadow import ShadowEvaluator
+
+        previous = self.shadow
+        if version is None:
+            self.shadow = None
+        else:
+            bundle = self._load_bundle(version)
+            if bundle.fallback_mode:
+                raise FileNotFoundError(f"Model version {version} has no servable model files")
+            self.shadow = ShadowEvaluator(
+                bundle, sample_rate, queue_size=int(os.getenv("SHADOW_QUEUE_SIZE", "64"))
+            )
+            print(f"Shadowing model version {version} on {sample_rate:.0%} of requests")
+        if previous is not None:
+            previous.stop()
+
+    def start_watcher(self):
+        """Poll the registry's CURRENT pointer and hot-swap when it changes"""
+        if self._watcher is not None:
+            return
+
+        def watch():
+            while True:
+                time.sleep(self.watch_interval)
+                version = None
+                try:
+                    version = self.registry.current_version()
+                    if version in (None, self.bundle.version, self._failed_version):
+                        continue
+                    self.reload(version)
+                except Exception as e:
+                    # Keep serving the old version; retry only when CURRENT moves again.
+                    self._failed_version = version
+                    print(f"Warning: Could not load model version {version}: {e}")
+
+        self._watcher = threading.Thread(target=watch, name="model-registry-watcher", daemon=True)
+        self._watcher.start()
+
     def _download_file(self, url: str, destination: str):
         """Download a file from URL to destination path."""
         print(f"Downloading model artifact from: {url}")
@@ -100,22 +250,25 @@ class PredictionService:
                         f.write(chunk)
         print(f"Saved model artifact to: {destination}")
     
-    def predict(self, image_path: str) -> Tuple[int, float, str, str]:
+    def predict(self, image_path: str, image: np.ndarray = None) -> Tuple[int, float, str, str, str]:
         """
         Make a prediction for a retinal image.
         
         Args:
             image_path: Path to the image file
+            image: Already decoded BGR image (training.preprocessing.load_image), if the caller has one
         
         Returns:
-            Tuple of (predicted_class, confidence, class_name, explanation)
+            Tuple of (predicted_class, confidence, class_name, explanation, model_version)
         """
-        if self.feature_extractor is None or self.classifier is None:
-            if not self.fallback_mode:
+        # One bundle for the whole request, even if a reload swaps it meanwhile.
+        bundle = self.bundle
+        if bundle.student is None and (bundle.feature_extractor is None or bundle.classifier is None):
+            if not bundle.fallback_mode:
                 raise RuntimeError("Models not loaded. Please check model files.")
 
-        if self.fallback_mode:
-            preprocessed = preprocess_image(image_path, target_size=(224, 224), validate=False)
+        if bundle.fallback_mode:
+            preprocessed = preprocess_image(image_path, target_size=(224, 224), validate=False, image=image)
             mean_intensity = float(np.mean(preprocessed))
             std_intensity = float(np.std(preprocessed))
             red_mean = float(np.mean(preprocessed[:, :, 0]))
@@ -145,17 +298,21 @@ class PredictionService:
                 self.EXPLANATIONS[predicted_class]
                 + " (Fallback mode: full trained model artifacts are not available on server.)"
             )
-            return predicted_class, confidence, class_name, explanation
+            return predicted_class, confidence, class_name, explanation, bundle.version
         
         # Preprocess image
-        preprocessed = preprocess_image(image_path, target_size=(224, 224))
+        preprocessed = preprocess_image(image_path, target_size=(224, 224), image=image)
         
-        # Extract features (feature extractor handles batch dimension internally)
-        features = self.feature_extractor.extract_features(preprocessed)
+        features = None
+        if bundle.student is not None:
+            probabilities = bundle.student.predict(preprocessed)
+        else:
+            # Extract features (feature extractor handles batch dimension internally)
+            features = bundle.feature_extractor.extract_features(preprocessed)
+            probabilities = bundle.classifier.predict(features)
         
-        # Get class probabilities and calibrate to reduce severe-class overprediction.
-        probabilities = self.classifier.predict(features)
-        calibrated = self._calibrate_probabilities(probabilities)
+        # Calibrate to reduce severe-class overprediction.
+        calibrated = calibrate_probabilities(probabilities)
         probs = calibrated[0]
         
         # Log probabilities for debugging
@@ -164,48 +321,28 @@ class PredictionService:
             print(f"{self.CLASS_NAMES[i]}: {prob*100:.2f}%")
         print(f"================================\n")
 
-        # Predict from calibrated probabilities.
-        sorted_idx = np.argsort(probs)[::-1]
-        predicted_class = int(sorted_idx[0])
-        confidence = float(probs[sorted_idx[0]])
-        second_best = float(probs[sorted_idx[1]])
-        margin = confidence - second_best
+        # Predict from calibrated probabilities, gating low-confidence and weak severe calls.
+        predicted_class, confidence = decide(probs)
 
-        uncertainty_threshold = float(os.getenv("PREDICTION_CONFIDENCE_THRESHOLD", "0.62"))
-        margin_threshold = float(os.getenv("PREDICTION_MARGIN_THRESHOLD", "0.08"))
-        if confidence < uncertainty_threshold or margin < margin_threshold:
+        shadow = self.shadow
+        if shadow is not None and shadow.sample():
+            shadow.submit(
+                image_path, bundle.version, predicted_class, confidence, preprocessed,
+                features=features if shadow.shares_features(bundle) else None
+            )
+        if predicted_class == self.UNCERTAIN_CLASS:
             return (
                 self.UNCERTAIN_CLASS,
                 confidence,
                 self.UNCERTAIN_LABEL,
                 self.UNCERTAIN_EXPLANATION,
+                bundle.version,
             )
 
-        # Guardrail: only return severe/proliferative when evidence is clearly strong.
-        if predicted_class in (3, 4):
-            high_severity_threshold = float(os.getenv("SEVERE_CLASS_CONFIDENCE_THRESHOLD", "0.72"))
-            moderate_support = float(probs[1] + probs[2])
-            if confidence < high_severity_threshold or moderate_support > confidence:
-                return (
-                    self.UNCERTAIN_CLASS,
-                    confidence,
-                    self.UNCERTAIN_LABEL,
-                    self.UNCERTAIN_EXPLANATION,
-                )
-
         class_name = self.CLASS_NAMES[predicted_class]
         explanation = self.EXPLANATIONS[predicted_class]
         
-        return predicted_class, confidence, class_name, explanation
-
-    def _calibrate_probabilities(self, probabilities: np.ndarray) -> np.ndarray:
-        """Apply lightweight class-wise calibration and renormalize probabilities."""
-        # Slightly downweight severe classes; upweight early classes to reduce false severe calls.
-        weights = np.array([1.06, 1.08, 1.00, 0.93, 0.87], dtype=np.float32)
-        calibrated = probabilities * weights
-        denom = np.sum(calibrated, axis=1, keepdims=True)
-        denom = np.where(denom == 0, 1.0, denom)
-        return calibrated / denom
+        return predicted_class, confidence, class_name, explanation, bundle.version
 
 # Global prediction service instance
 prediction_service = None
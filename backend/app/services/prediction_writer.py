@@ -0,0 +1,186 @@
+"""
+Write-behind buffer for prediction rows
+With PREDICTION_WRITE_BEHIND=true, predict requests hand their Prediction row to a
+background thread that inserts a whole batch in one transaction every
+PREDICTION_FLUSH_MS or PREDICTION_FLUSH_ROWS rows, whichever comes first. On
+SQLite this turns one fsync and one write-lock per request into one per batch.
+Pending rows are flushed on application shutdown and at interpreter exit.
+"""
+
+import atexit
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List
+
+from fastapi.concurrency import run_in_threadpool
+
+from ..database import SessionLocal
+from ..models.prediction import Prediction
+
+
+class PredictionWriter:
+    """Group-commits Prediction inserts from a background thread"""
+
+    def __init__(self, flush_interval_ms: int = 50, max_rows: int = 100, queue_size: int = 10000):
+        """
+        Args:
+            flush_interval_ms: Longest time a row waits before its batch is committed
+            max_rows: Batch size that triggers an immediate commit
+            queue_size: Pending rows kept; when full, add() writes synchronously instead
+        """
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_rows = max_rows
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self.counts = {"queued": 0, "written": 0, "batches": 0, "sync_writes": 0, "failed_batches": 0}
+        self._thread = threading.Thread(target=self._run, name="prediction-writer", daemon=True)
+        self._thread.start()
+
+    def _enqueue(self, fields: Dict) -> bool:
+        """Queue a row; False when it must be written directly (queue full or shutting down)"""
+        if "created_at" not in fields:
+            # Stamp the request time, not the flush time, so history order is unchanged.
+            fields["created_at"] = datetime.utcnow()
+        if not self._stopped.is_set():
+            try:
+                self._queue.put_nowait(fields)
+                with self._lock:
+                    self.counts["queued"] += 1
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _write_direct(self, fields: Dict):
+        self._write([fields])
+        with self._lock:
+            self.counts["sync_writes"] += 1
+
+    def add(self, **fields):
+        """Queue a Prediction row; never blocks on the database unless the queue is full"""
+        if not self._enqueue(fields):
+            # Backpressure (or shutdown): write this row in the caller's thread.
+            self._write_direct(fields)
+
+    async def add_async(self, **fields):
+        """add() for async routes: a backpressure write runs in the threadpool, off the event loop"""
+        if not self._enqueue(fields):
+            await run_in_threadpool(self._write_direct, fields)
+
+    def _drain(self, first: Dict) -> List[Dict]:
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.max_rows:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put_nowait(None)  # let _run see the stop marker
+                break
+            batch.append(item)
+        return batch
+
+    def _write(self, rows: List[Dict]):
+        db = SessionLocal()
+        try:
+            db.add_all([Prediction(**row) for row in rows])
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _write_batch(self, batch: List[Dict]):
+        try:
+            self._write(batch)
+        except Exception as e:
+            # Retry row by row so one bad row does not drop the whole batch.
+            print(f"Warning: Prediction batch of {len(batch)} failed ({e}); writing rows individually")
+            with self._lock:
+                self.counts["failed_batches"] += 1
+            written = 0
+            for row in batch:
+                try:
+                    self._write([row])
+                    written += 1
+                except Exception as row_error:
+                    print(f"Warning: Could not save prediction for {row.get('image_path')}: {row_error}")
+            with self._lock:
+                self.counts["written"] += written
+            return
+        with self._lock:
+            self.counts["written"] += len(batch)
+            self.counts["batches"] += 1
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            self._write_batch(self._drain(first))
+
+    def close(self, timeout: float = 10.0):
+        """Stop accepting rows and commit everything still queued"""
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        self._queue.put(None)
+        self._thread.join(timeout)
+        # Rows queued while the stop marker was being enqueued.
+        leftovers = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                leftovers.append(item)
+        if leftovers:
+            self._write_batch(leftovers)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "pending": self._queue.qsize(),
+                "flush_interval_ms": round(self.flush_interval * 1000),
+                "max_rows": self.max_rows,
+                **self.counts,
+            }
+
+
+# Global writer, created on first use when write-behind is enabled
+prediction_writer = None
+_writer_lock = threading.Lock()
+
+
+def write_behind_enabled() -> bool:
+    return os.getenv("PREDICTION_WRITE_BEHIND", "false").lower() == "true"
+
+
+def get_prediction_writer() -> PredictionWriter:
+    """Get or create the prediction writer"""
+    global prediction_writer
+    with _writer_lock:
+        if prediction_writer is None:
+            prediction_writer = PredictionWriter(
+                flush_interval_ms=int(os.getenv("PREDICTION_FLUSH_MS", "50")),
+                max_rows=int(os.getenv("PREDICTION_FLUSH_ROWS", "100")),
+                queue_size=int(os.getenv("PREDICTION_QUEUE_SIZE", "10000"))
+            )
+            atexit.register(prediction_writer.close)
+        return prediction_writer
+
+
+def close_prediction_writer():
+    """Flush and stop the writer if it was started"""
+    if prediction_writer is not None:
+        prediction_writer.close()
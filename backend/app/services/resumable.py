@@ -0,0 +1,384 @@
+"""
+Resumable chunked uploads
+A client declares the file (name and size), then PUTs its bytes in chunks at
+explicit offsets; after a dropped connection it asks for the current offset and
+carries on from there. Received bytes live in UPLOAD_DIR/partial/<id>.part.
+A chunk (at most UPLOAD_CHUNK_SIZE) is read into memory first and only appended
+inside the transaction that advances received_bytes, so a retried or duplicated
+chunk can never be written twice, a slow client never holds a database lock,
+and the lock is held for at most one bounded write.
+Finalizing moves the assembled file into the image store. Sessions expire
+UPLOAD_SESSION_TTL seconds after their last chunk; a background sweeper deletes
+them with their partial files.
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Optional
+
+from fastapi import Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import delete, func, insert, select, update
+
+from ..database import engine
+from ..models.upload_session import UploadSession
+from .ingest import (
+    ALLOWED_EXTENSIONS, FORMAT_EXTENSIONS, SNIFF_LIMIT, UPLOAD_MAX_BYTES,
+    UploadRejected, check_dimensions, sniff_image, too_large
+)
+from .storage import get_image_store
+
+UPLOAD_SESSION_TTL = int(os.getenv("UPLOAD_SESSION_TTL", str(24 * 3600)))
+UPLOAD_SWEEP_INTERVAL = int(os.getenv("UPLOAD_SWEEP_INTERVAL", "300"))
+UPLOAD_SESSION_LIMIT = int(os.getenv("UPLOAD_SESSION_LIMIT", "10"))
+# Largest chunk accepted (and suggested to clients); smaller chunks lose less on a
+# dropped link, and it bounds the write done while the session row is locked.
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+
+
+def _session_dict(row) -> Dict:
+    return {
+        "upload_id": row.id,
+        "filename": row.filename,
+        "size": row.size_bytes,
+        "offset": row.received_bytes,
+        "status": row.status,
+        "expires_at": row.expires_at,
+        "chunk_size": UPLOAD_CHUNK_SIZE,
+    }
+
+
+class ResumableUploads:
+    """Upload sessions and their partial files"""
+
+    def __init__(self, root: str = None, bind=None, ttl: int = UPLOAD_SESSION_TTL):
+        """
+        Args:
+            root: Upload directory (default: UPLOAD_DIR or ./uploads)
+            bind: Engine holding upload_sessions (default: app engine)
+            ttl: Seconds a session lives after its last chunk
+        """
+        self.root = Path(root or os.getenv("UPLOAD_DIR", "./uploads"))
+        self.partial = self.root / "partial"
+        self.bind = bind or engine
+        self.ttl = ttl
+
+    def part_path(self, upload_id: str) -> Path:
+        return self.partial / f"{upload_id}.part"
+
+    def _expiry(self) -> datetime:
+        return datetime.utcnow() + timedelta(seconds=self.ttl)
+
+    def _load(self, conn, upload_id: str, user_id: int):
+        table = UploadSession.__table__
+        row = conn.execute(
+            select(table).where(table.c.id == upload_id, table.c.user_id == user_id)
+        ).first()
+        if row is None:
+            raise UploadRejected(404, "Upload not found or expired")
+        return row
+
+    def create(self, user_id: int, filename: str, size: int) -> Dict:
+        """
+        Open an upload session
+
+        Args:
+            user_id: Owner of the upload
+            filename: Original file name (its extension is checked)
+            size: Total size in bytes
+
+        Returns:
+            Session dict (upload_id, filename, size, offset, status, expires_at, chunk_size)
+        """
+        if os.path.splitext(filename)[1].lower() not in ALLOWED_EXTENSIONS:
+            raise UploadRejected(400, f"Invalid file type. Allowed types: {', '.join(sorted(ALLOWED_EXTENSIONS))}")
+        if size <= 0:
+            raise UploadRejected(400, "Uploaded file is empty")
+        if size > UPLOAD_MAX_BYTES:
+            raise too_large(UPLOAD_MAX_BYTES)
+
+        table = UploadSession.__table__
+        upload_id = uuid.uuid4().hex
+        self.partial.mkdir(parents=True, exist_ok=True)
+        with self.bind.begin() as conn:
+            open_sessions = conn.execute(
+                select(func.count()).select_from(table).where(
+                    table.c.user_id == user_id, table.c.status != "completed"
+                )
+            ).scalar()
+            if open_sessions >= UPLOAD_SESSION_LIMIT:
+                raise UploadRejected(429, f"Too many unfinished uploads (limit {UPLOAD_SESSION_LIMIT})")
+            conn.execute(insert(table).values(
+                id=upload_id, user_id=user_id, filename=filename, size_bytes=size, received_bytes=0,
+                status="uploading", created_at=datetime.utcnow(), expires_at=self._expiry()
+            ))
+            self.part_path(upload_id).touch()
+            return _session_dict(self._load(conn, upload_id, user_id))
+
+    def get(self, upload_id: str, user_id: int) -> Dict:
+        with self.bind.connect() as conn:
+            return _session_dict(self._load(conn, upload_id, user_id))
+
+    def append(self, upload_id: str, user_id: int, offset: int, data: bytes) -> Dict:
+        """
+        Append a received chunk at offset
+
+        Args:
+            upload_id: Session id
+            user_id: Owner of the upload
+            offset: Byte offset the chunk starts at; must equal the bytes received so far
+            data: Chunk bytes (at most UPLOAD_CHUNK_SIZE)
+
+        Returns:
+            Updated session dict
+
+        Raises:
+            UploadRejected: 409 on a wrong offset, 413 past the declared size,
+                400/415 when the image header is invalid (the session is then discarded)
+        """
+        table = UploadSession.__table__
+        length = len(data)
+        if length > UPLOAD_CHUNK_SIZE:
+            raise UploadRejected(413, f"Chunks are limited to {UPLOAD_CHUNK_SIZE} bytes")
+        with self.bind.begin() as conn:
+            # Compare-and-set on the offset; the row stays locked while the bytes are appended.
+            result = conn.execute(
+                update(table)
+                .where(table.c.id == upload_id, table.c.user_id == user_id, table.c.status == "uploading",
+                       table.c.received_bytes == offset, table.c.size_bytes >= offset + length)
+                .values(received_bytes=offset + length, expires_at=self._expiry())
+            )
+            if result.rowcount == 0:
+                row = self._load(conn, upload_id, user_id)
+                if row.status != "uploading":
+                    raise UploadRejected(409, f"Upload is {row.status}")
+                if row.received_bytes != offset:
+                    raise UploadRejected(409, f"Expected offset {row.received_bytes}")
+                raise UploadRejected(413, f"Chunk ends past the declared size of {row.size_bytes} bytes")
+            with open(self.part_path(upload_id), "r+b") as part:
+                part.seek(offset)
+                part.write(data)
+                part.truncate()
+            row = self._load(conn, upload_id, user_id)
+
+        if row.image_format is None:
+            try:
+                self._sniff(upload_id, row.received_bytes, row.size_bytes)
+            except UploadRejected:
+                self.discard(upload_id)
+                raise
+        return _session_dict(row)
+
+    def _sniff(self, upload_id: str, received: int, size: int):
+        """Record the format and dimensions once the header has arrived"""
+        with open(self.part_path(upload_id), "rb") as part:
+            head = part.read(min(received, SNIFF_LIMIT + 1))
+        info = sniff_image(head)
+        if info is None:
+            if len(head) > SNIFF_LIMIT:
+                raise UploadRejected(415, "Could not find the image dimensions")
+            if received >= size:
+                raise UploadRejected(415, "Image header is truncated")
+            return
+        image_format, width, height = info
+        check_dimensions(width, height)
+        table = UploadSession.__table__
+        with self.bind.begin() as conn:
+            conn.execute(
+                update(table).where(table.c.id == upload_id)
+                .values(image_format=image_format, width=width, height=height)
+            )
+
+    def finalize(self, upload_id: str, user_id: int) -> Dict:
+        """
+        Move a fully received upload into the image store
+
+        Returns:
+            {"stored": stored file dict} to predict on, or {"result": prediction dict}
+            when the upload was already finalized
+
+        Raises:
+            UploadRejected: 409 while bytes are missing or another finalize is running
+        """
+        table = UploadSession.__table__
+        with self.bind.begin() as conn:
+            result = conn.execute(
+                update(table)
+                .where(table.c.id == upload_id, table.c.user_id == user_id, table.c.status == "uploading",
+                       table.c.received_bytes == table.c.size_bytes, table.c.image_format.is_not(None))
+                .values(status="finalizing")
+            )
+            row = self._load(conn, upload_id, user_id)
+        if result.rowcount == 0:
+            if row.status == "completed":
+                return {"result": json.loads(row.result)}
+            if row.status == "finalizing":
+                raise UploadRejected(409, "Upload is already being finalized")
+            raise UploadRejected(409, f"Upload incomplete: {row.received_bytes} of {row.size_bytes} bytes received")
+
+        try:
+            with open(self.part_path(upload_id), "rb") as part:
+                stored = get_image_store().put(part, "image" + FORMAT_EXTENSIONS[row.image_format])
+        except BaseException:
+            self.fail(upload_id, keep=True)
+            raise
+        return {"stored": {**stored, "format": row.image_format, "width": row.width,
+                           "height": row.height, "filename": row.filename}}
+
+    def complete(self, upload_id: str, result: Dict):
+        """Keep the prediction for repeated finalize calls and free the partial file"""
+        table = UploadSession.__table__
+        with self.bind.begin() as conn:
+            conn.execute(
+                update(table).where(table.c.id == upload_id)
+                .values(status="completed", result=json.dumps(result), expires_at=self._expiry())
+            )
+        self.part_path(upload_id).unlink(missing_ok=True)
+
+    def fail(self, upload_id: str, keep: bool):
+        """After a failed finalize: reopen the session for a retry (keep) or discard it"""
+        if not keep:
+            self.discard(upload_id)
+            return
+        table = UploadSession.__table__
+        with self.bind.begin() as conn:
+            conn.execute(update(table).where(table.c.id == upload_id).values(status="uploading"))
+
+    def discard(self, upload_id: str, user_id: int = None) -> bool:
+        """Delete a session and its partial file; returns False if it did not exist"""
+        table = UploadSession.__table__
+        statement = delete(table).where(table.c.id == upload_id)
+        if user_id is not None:
+            statement = statement.where(table.c.user_id == user_id)
+        with self.bind.begin() as conn:
+            deleted = conn.execute(statement).rowcount > 0
+        if deleted:
+            self.part_path(upload_id).unlink(missing_ok=True)
+        return deleted
+
+    def sweep(self) -> Dict:
+        """
+        Delete expired sessions, then partial and temp files nothing refers to
+
+        Returns:
+            Dict with sessions, files and bytes freed
+        """
+        table = UploadSession.__table__
+        now = datetime.utcnow()
+        freed = {"sessions": 0, "files": 0, "bytes": 0}
+        with self.bind.connect() as conn:
+            expired = conn.execute(select(table.c.id).where(table.c.expires_at < now)).scalars().all()
+        for upload_id in expired:
+            path = self.part_path(upload_id)
+            size = path.stat().st_size if path.exists() else 0
+            with self.bind.begin() as conn:
+                # Re-check: a chunk may have extended the session since the select.
+                if conn.execute(delete(table).where(table.c.id == upload_id, table.c.expires_at < now)).rowcount:
+                    path.unlink(missing_ok=True)
+                    freed["sessions"] += 1
+                    freed["bytes"] += size
+
+        # Store temp files left by a crashed worker, and partial files whose
+        # session row is gone. Anything this old is not in use.
+        cutoff = time.time() - self.ttl
+        with self.bind.connect() as conn:
+            live = set(conn.execute(select(table.c.id)).scalars())
+        for directory in (self.partial, self.root / "tmp"):
+            if not directory.is_dir():
+                continue
+            for path in directory.iterdir():
+                try:
+                    stat = path.stat()
+                    if stat.st_mtime >= cutoff or path.name.split(".")[0] in live:
+                        continue
+                    path.unlink()
+                except FileNotFoundError:
+                    continue
+                freed["files"] += 1
+                freed["bytes"] += stat.st_size
+        return freed
+
+
+async def receive_chunk(request: Request, uploads: ResumableUploads, upload_id: str,
+                        user_id: int, offset: int) -> Dict:
+    """
+    Read the request body and append it to an upload at offset
+
+    Args:
+        request: Incoming request whose raw body is the chunk
+        uploads: Upload sessions
+        upload_id: Session id
+        user_id: Owner of the upload
+        offset: Byte offset of the chunk
+
+    Returns:
+        Updated session dict
+
+    Raises:
+        UploadRejected: On a wrong offset or an oversized or invalid chunk
+    """
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > UPLOAD_CHUNK_SIZE:
+        raise UploadRejected(413, f"Chunks are limited to {UPLOAD_CHUNK_SIZE} bytes")
+    session = await run_in_threadpool(uploads.get, upload_id, user_id)
+    if session["status"] != "uploading":
+        raise UploadRejected(409, f"Upload is {session['status']}")
+    if offset != session["offset"]:
+        raise UploadRejected(409, f"Expected offset {session['offset']}")
+    remaining = session["size"] - offset
+    if content_length and content_length.isdigit() and int(content_length) > remaining:
+        raise UploadRejected(413, f"Chunk ends past the declared size of {session['size']} bytes")
+
+    # Buffered in memory (chunks are capped); the disk write happens in the threadpool.
+    chunk = bytearray()
+    async for data in request.stream():
+        chunk += data
+        if len(chunk) > UPLOAD_CHUNK_SIZE:
+            raise UploadRejected(413, f"Chunks are limited to {UPLOAD_CHUNK_SIZE} bytes")
+        if len(chunk) > remaining:
+            raise UploadRejected(413, f"Chunk ends past the declared size of {session['size']} bytes")
+    return await run_in_threadpool(uploads.append, upload_id, user_id, offset, bytes(chunk))
+
+
+# Global upload sessions and sweeper thread
+resumable_uploads: Optional[ResumableUploads] = None
+_sweeper_stop = threading.Event()
+_sweeper: Optional[threading.Thread] = None
+
+
+def get_resumable_uploads() -> ResumableUploads:
+    """Get or create the upload sessions"""
+    global resumable_uploads
+    if resumable_uploads is None:
+        resumable_uploads = ResumableUploads()
+    return resumable_uploads
+
+
+def _sweep_loop():
+    while not _sweeper_stop.wait(UPLOAD_SWEEP_INTERVAL):
+        try:
+            freed = get_resumable_uploads().sweep()
+            if freed["sessions"] or freed["files"]:
+                print(f"Upload sweeper: removed {freed['sessions']} expired sessions and "
+                      f"{freed['files']} stale files ({freed['bytes'] / 1e6:.1f} MB)")
+        except Exception as e:
+            print(f"Warning: Upload sweep failed: {e}")
+
+
+def start_upload_sweeper():
+    """Sweep expired uploads every UPLOAD_SWEEP_INTERVAL seconds (0 disables)"""
+    global _sweeper
+    if UPLOAD_SWEEP_INTERVAL <= 0 or (_sweeper is not None and _sweeper.is_alive()):
+        return
+    _sweeper_stop.clear()
+    _sweeper = threading.Thread(target=_sweep_loop, name="upload-sweeper", daemon=True)
+    _sweeper.start()
+
+
+def stop_upload_sweeper():
+    _sweeper_stop.set()
@@ -0,0 +1,194 @@
+"""
+Shadow evaluation of a candidate model on live traffic
+A sampled fraction of predictions is handed to one low-priority background thread
+that runs the candidate model and stores how it compares in shadow_evaluations.
+The request thread only does a non-blocking put on a bounded queue.
+"""
+
+import os
+import queue
+import random
+import threading
+import time
+from typing import Dict, Optional
+
+import numpy as np
+from sqlalchemy import Float, cast, func
+from sqlalchemy.orm import Session
+
+from ..database import SessionLocal
+from ..models.shadow_evaluation import ShadowEvaluation
+from training.decision import UNCERTAIN_CLASS, calibrate_probabilities, decide
+
+CLASS_LABELS = ["No DR", "Mild DR", "Moderate DR", "Severe DR", "Proliferative DR", "Uncertain"]
+
+
+def _lower_thread_priority(niceness: int = 10):
+    """Deprioritise the calling thread on Linux, where threads have their own nice value"""
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), niceness)
+    except (AttributeError, OSError):
+        pass
+
+
+class ShadowEvaluator:
+    """Runs a candidate model bundle on sampled requests in a background thread"""
+
+    def __init__(self, bundle, sample_rate: float, queue_size: int = 64):
+        """
+        Args:
+            bundle: Candidate ModelBundle (from PredictionService._load_bundle)
+            sample_rate: Fraction of requests to shadow, 0-1
+            queue_size: Pending jobs kept; further samples are dropped, never waited on
+        """
+        self.bundle = bundle
+        self.sample_rate = sample_rate
+        self.queue_size = queue_size
+        self._queue = queue.Queue(maxsize=queue_size)
+        self.counts = {"submitted": 0, "dropped": 0, "completed": 0, "failed": 0}
+        self._thread = threading.Thread(target=self._run, name="shadow-evaluator", daemon=True)
+        self._thread.start()
+
+    @property
+    def version(self) -> str:
+        return self.bundle.version
+
+    def sample(self) -> bool:
+        return random.random() < self.sample_rate
+
+    def shares_features(self, primary) -> bool:
+        """True when the candidate can reuse features extracted by the primary bundle"""
+        return (primary.student is None and self.bundle.student is None
+                and self.bundle.feature_extractor is primary.feature_extractor)
+
+    def submit(self, image_path: str, primary_version: str, primary_class: int,
+               primary_confidence: float, image: np.ndarray, features: Optional[np.ndarray] = None):
+        """Queue a request for the candidate without blocking"""
+        try:
+            self._queue.put_nowait({
+                "image_path": image_path,
+                "primary_version": primary_version,
+                "primary_class": primary_class,
+                "primary_confidence": primary_confidence,
+                "image": image,
+                "features": features,
+            })
+            self.counts["submitted"] += 1
+        except queue.Full:
+            self.counts["dropped"] += 1
+
+    def stop(self):
+        """Stop the worker after the jobs already queued"""
+        try:
+            self._queue.put_nowait(None)
+        except queue.Full:
+            # The thread is a daemon; it exits with the process.
+            pass
+
+    def stats(self) -> Dict:
+        return {
+            "shadow_version": self.version,
+            "sample_rate": self.sample_rate,
+            "queue_depth": self._queue.qsize(),
+            "queue_size": self.queue_size,
+            **self.counts,
+        }
+
+    def _run(self):
+        _lower_thread_priority()
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            try:
+                self._evaluate(job)
+                self.counts["completed"] += 1
+            except Exception as e:
+                self.counts["failed"] += 1
+                print(f"Warning: Shadow evaluation failed: {e}")
+
+    def _evaluate(self, job: Dict):
+        started = time.perf_counter()
+        bundle = self.bundle
+        if bundle.student is not None:
+            probabilities = bundle.student.predict(job["image"])
+        else:
+            features = job["features"]
+            if features is None:
+                features = bundle.feature_extractor.extract_features(job["image"])
+            probabilities = bundle.classifier.predict(features)
+        shadow_class, shadow_confidence = decide(calibrate_probabilities(probabilities)[0])
+        latency_ms = (time.perf_counter() - started) * 1000
+
+        db = SessionLocal()
+        try:
+            db.add(ShadowEvaluation(
+                image_path=job["image_path"],
+                primary_version=job["primary_version"],
+                shadow_version=bundle.version,
+                primary_class=job["primary_class"],
+                shadow_class=shadow_class,
+                primary_confidence=job["primary_confidence"],
+                shadow_confidence=shadow_confidence,
+                agree=shadow_class == job["primary_class"],
+                shared_features=job["features"] is not None,
+                shadow_latency_ms=latency_ms
+            ))
+            db.commit()
+        finally:
+            db.close()
+
+
+def shadow_summary(db: Session, shadow_version: str = None) -> Optional[Dict]:
+    """
+    Agreement and class-distribution differences for a shadowed version
+
+    Args:
+        db: Database session
+        shadow_version: Candidate version (default: the most recently shadowed one)
+
+    Returns:
+        Summary dictionary, or None when nothing has been shadowed yet
+    """
+    if shadow_version is None:
+        latest = db.query(ShadowEvaluation.shadow_version).order_by(ShadowEvaluation.id.desc()).first()
+        if latest is None:
+            return None
+        shadow_version = latest[0]
+
+    rows = db.query(
+        ShadowEvaluation.primary_class, ShadowEvaluation.shadow_class, func.count()
+    ).filter(
+        ShadowEvaluation.shadow_version == shadow_version
+    ).group_by(ShadowEvaluation.primary_class, ShadowEvaluation.shadow_class).all()
+    if not rows:
+        return None
+
+    # Rows = primary decision, columns = candidate decision; the last index is "uncertain".
+    agreement = np.zeros((len(CLASS_LABELS), len(CLASS_LABELS)), dtype=np.int64)
+    for primary_class, shadow_class, count in rows:
+        agreement[len(CLASS_LABELS) - 1 if primary_class == UNCERTAIN_CLASS else primary_class,
+                  len(CLASS_LABELS) - 1 if shadow_class == UNCERTAIN_CLASS else shadow_class] += count
+    total = int(agreement.sum())
+    latency, shared, primary_versions = db.query(
+        func.avg(ShadowEvaluation.shadow_latency_ms),
+        func.avg(cast(ShadowEvaluation.shared_features, Float)),
+        func.count(func.distinct(ShadowEvaluation.primary_version))
+    ).filter(ShadowEvaluation.shadow_version == shadow_version).one()
+
+    primary_counts = agreement.sum(axis=1)
+    shadow_counts = agreement.sum(axis=0)
+    return {
+        "shadow_version": shadow_version,
+        "samples": total,
+        "agreement": float(np.trace(agreement) / total),
+        "primary_distribution": {label: int(n) for label, n in zip(CLASS_LABELS, primary_counts)},
+        "shadow_distribution": {label: int(n) for label, n in zip(CLASS_LABELS, shadow_counts)},
+        "distribution_shift": {
+            label: float((s - p) / total) for label, p, s in zip(CLASS_LABELS, primary_counts, shadow_counts)
+        },
+        "agreement_matrix": agreement.tolist(),
+        "mean_shadow_latency_ms": float(latency) if latency is not None else None,
+        "shared_feature_rate": float(shared) if shared is not None else None,
+        "primary_versions": int(primary_versions),
+    }
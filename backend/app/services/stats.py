@@ -0,0 +1,174 @@
+"""
+Incrementally maintained prediction statistics
+prediction_stats holds one row per (user, day, class) plus an all-users row
+(user_id 0). The row is updated by an after_flush hook, registered by
+database.init_db, in the same transaction that inserts or deletes the
+Prediction, so /api/stats reads at most days x classes rows and never scans
+predictions.
+"""
+
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import delete, event, func, insert, literal, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from ..models.prediction import Prediction
+from ..models.prediction_stat import PredictionStat
+from training.decision import UNCERTAIN_CLASS
+
+ALL_USERS = 0
+CLASS_LABELS = {
+    UNCERTAIN_CLASS: "Uncertain",
+    0: "No DR",
+    1: "Mild DR",
+    2: "Moderate DR",
+    3: "Severe DR",
+    4: "Proliferative DR",
+}
+
+_BUCKET = ("user_id", "day", "predicted_class")
+
+
+def _deltas(added: Iterable[Prediction], removed: Iterable[Prediction]) -> Dict[Tuple, List]:
+    """(user_id, day, class) -> [count delta, confidence delta], including the all-users rows"""
+    deltas = defaultdict(lambda: [0, 0.0])
+    for predictions, sign in ((added, 1), (removed, -1)):
+        for p in predictions:
+            day = (p.created_at or datetime.utcnow()).date()
+            for user_id in (p.user_id, ALL_USERS):
+                delta = deltas[(user_id, day, p.predicted_class)]
+                delta[0] += sign
+                delta[1] += sign * float(p.confidence)
+    return deltas
+
+
+def apply_deltas(connection, deltas: Dict[Tuple, List]):
+    """Add count/confidence deltas to their buckets, creating missing buckets"""
+    table = PredictionStat.__table__
+    rows = [
+        {"user_id": u, "day": d, "predicted_class": c, "count": n, "confidence_sum": s}
+        for (u, d, c), (n, s) in deltas.items() if n
+    ]
+    if not rows:
+        return
+
+    dialect = connection.dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as upsert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as upsert
+        statement = upsert(table)
+        connection.execute(
+            statement.on_conflict_do_update(
+                index_elements=list(_BUCKET),
+                set_={
+                    "count": table.c.count + statement.excluded.count,
+                    "confidence_sum": table.c.confidence_sum + statement.excluded.confidence_sum,
+                },
+            ),
+            rows,
+        )
+        return
+
+    # Other backends: update the bucket, insert it when it does not exist yet.
+    for row in rows:
+        result = connection.execute(
+            update(table)
+            .where(table.c.user_id == row["user_id"], table.c.day == row["day"],
+                   table.c.predicted_class == row["predicted_class"])
+            .values(count=table.c.count + row["count"],
+                    confidence_sum=table.c.confidence_sum + row["confidence_sum"])
+        )
+        if result.rowcount == 0:
+            connection.execute(insert(table).values(**row))
+
+
+def _update_prediction_stats(session, flush_context):
+    added = [obj for obj in session.new if isinstance(obj, Prediction)]
+    removed = [obj for obj in session.deleted if isinstance(obj, Prediction)]
+    if added or removed:
+        apply_deltas(session.connection(), _deltas(added, removed))
+
+
+def register_rollup_hook():
+    """Keep prediction_stats in step with every flush; safe to call more than once"""
+    if not event.contains(Session, "after_flush", _update_prediction_stats):
+        event.listen(Session, "after_flush", _update_prediction_stats)
+
+
+def backfill_prediction_stats(connection) -> int:
+    """
+    Rebuild prediction_stats from the predictions table
+
+    Args:
+        connection: Connection inside a transaction (engine.begin())
+
+    Returns:
+        Number of buckets written
+    """
+    table = PredictionStat.__table__
+    day = func.date(Prediction.created_at)
+    columns = ["user_id", "day", "predicted_class", "count", "confidence_sum"]
+    connection.execute(delete(table))
+    per_user = select(
+        Prediction.user_id, day, Prediction.predicted_class,
+        func.count(Prediction.id), func.coalesce(func.sum(Prediction.confidence), 0.0)
+    ).group_by(Prediction.user_id, day, Prediction.predicted_class)
+    all_users = select(
+        literal(ALL_USERS), day, Prediction.predicted_class,
+        func.count(Prediction.id), func.coalesce(func.sum(Prediction.confidence), 0.0)
+    ).group_by(day, Prediction.predicted_class)
+    connection.execute(insert(table).from_select(columns, per_user))
+    connection.execute(insert(table).from_select(columns, all_users))
+    return connection.execute(select(func.count()).select_from(table)).scalar()
+
+
+async def stats_summary(db: AsyncSession, user_id: int, days: int = 30) -> Dict:
+    """
+    Prediction counts for the last `days` days from prediction_stats
+
+    Args:
+        db: Async database session
+        user_id: User to summarise, or ALL_USERS
+        days: Window length, ending today (UTC)
+
+    Returns:
+        Totals per class, uncertain rate, mean confidence and a daily series
+    """
+    since = datetime.utcnow().date() - timedelta(days=days - 1)
+    result = await db.execute(
+        select(PredictionStat.day, PredictionStat.predicted_class,
+               PredictionStat.count, PredictionStat.confidence_sum)
+        .where(PredictionStat.user_id == user_id, PredictionStat.day >= since)
+        .order_by(PredictionStat.day)
+    )
+
+    by_class = {c: 0 for c in CLASS_LABELS}
+    daily: Dict[date, Dict[int, int]] = {}
+    confidence_sum = 0.0
+    for day, predicted_class, count, class_confidence in result.all():
+        by_class[predicted_class] = by_class.get(predicted_class, 0) + count
+        daily.setdefault(day, {})[predicted_class] = count
+        confidence_sum += class_confidence
+
+    total = sum(by_class.values())
+    return {
+        "user_id": user_id,
+        "days": days,
+        "since": since,
+        "total": total,
+        "by_class": [
+            {"predicted_class": c, "class_name": CLASS_LABELS.get(c, str(c)), "count": n}
+            for c, n in sorted(by_class.items())
+        ],
+        "uncertain_rate": round(by_class[UNCERTAIN_CLASS] / total, 4) if total else None,
+        "mean_confidence": round(confidence_sum / total, 4) if total else None,
+        "daily": [
+            {"day": d, "total": sum(counts.values()), "by_class": counts}
+            for d, counts in sorted(daily.items())
+        ],
+    }
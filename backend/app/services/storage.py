@@ -0,0 +1,209 @@
+"""
+Content-addressed upload storage
+Uploaded bytes are hashed while they stream to a temp file and stored once at
+UPLOAD_DIR/objects/<h0h1>/<h2h3>/<sha256><ext>. stored_images counts the uploads
+that refer to each file; the file is deleted when the last one is released.
+File moves and deletes happen inside the transaction that changes the count,
+so concurrent workers storing and releasing the same image are serialised by
+the database.
+"""
+
+import hashlib
+import os
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import BinaryIO, Dict, Optional
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from ..database import engine
+from ..models.stored_image import StoredImage
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def sha256_from_path(path: Optional[str]) -> Optional[str]:
+    """Content hash of a stored path (objects are named <sha256><ext>); None for legacy paths"""
+    if not path:
+        return None
+    stem = os.path.splitext(os.path.basename(path))[0]
+    if len(stem) == 64 and all(c in "0123456789abcdef" for c in stem):
+        return stem
+    return None
+
+
+class IncomingFile:
+    """An upload being received: bytes go to a temp file and into the hash as they arrive"""
+
+    def __init__(self, tmp_dir: Path):
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        self.tmp_path = tmp_dir / f"{uuid.uuid4().hex}.part"
+        self._file = open(self.tmp_path, "wb")
+        self._digest = hashlib.sha256()
+        self.size = 0
+
+    def write(self, chunk: bytes):
+        self._digest.update(chunk)
+        self._file.write(chunk)
+        self.size += len(chunk)
+
+    @property
+    def sha256(self) -> str:
+        return self._digest.hexdigest()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    def abort(self):
+        """Discard the partial upload"""
+        self.close()
+        self.tmp_path.unlink(missing_ok=True)
+
+
+class ImageStore:
+    """Deduplicating, reference-counted image storage under UPLOAD_DIR"""
+
+    def __init__(self, root: str = None, bind=None):
+        """
+        Args:
+            root: Upload directory (default: UPLOAD_DIR or ./uploads)
+            bind: Engine holding stored_images (default: app engine)
+        """
+        self.root = Path(root or os.getenv("UPLOAD_DIR", "./uploads"))
+        self.objects = self.root / "objects"
+        self.tmp = self.root / "tmp"
+        self.bind = bind or engine
+
+    def object_path(self, sha256: str, ext: str) -> Path:
+        return self.objects / sha256[:2] / sha256[2:4] / f"{sha256}{ext.lower()}"
+
+    def begin(self) -> IncomingFile:
+        """Start receiving an upload; finish with commit() or incoming.abort()"""
+        return IncomingFile(self.tmp)
+
+    def _add_reference(self, conn, sha256: str, path: str, size: int) -> str:
+        """Increment the count (creating the row) and return the stored path"""
+        table = StoredImage.__table__
+        # Write first so the row lock is taken before anything is read.
+        result = conn.execute(
+            update(table).where(table.c.sha256 == sha256).values(ref_count=table.c.ref_count + 1)
+        )
+        if result.rowcount == 0:
+            conn.execute(insert(table).values(
+                sha256=sha256, path=path, size_bytes=size, ref_count=1, created_at=datetime.utcnow()
+            ))
+            return path
+        return conn.execute(select(table.c.path).where(table.c.sha256 == sha256)).scalar()
+
+    def put(self, fileobj: BinaryIO, filename: str) -> Dict:
+        """
+        Store an uploaded image, reusing the existing file when the bytes are known
+
+        Args:
+            fileobj: Binary stream positioned at the start of the image
+            filename: Original file name (only its extension is kept)
+
+        Returns:
+            Dict with path, sha256, size_bytes and deduplicated
+        """
+        incoming = self.begin()
+        try:
+            for chunk in iter(lambda: fileobj.read(CHUNK_SIZE), b""):
+                incoming.write(chunk)
+        except BaseException:
+            incoming.abort()
+            raise
+        return self.commit(incoming, os.path.splitext(filename)[1])
+
+    def commit(self, incoming: IncomingFile, ext: str) -> Dict:
+        """
+        Store a fully received upload, reusing the existing file when the bytes are known
+
+        Args:
+            incoming: Upload from begin()
+            ext: File extension for a newly stored file
+
+        Returns:
+            Dict with path, sha256, size_bytes and deduplicated
+        """
+        incoming.close()
+        try:
+            try:
+                return self._commit(incoming.tmp_path, incoming.sha256, incoming.size, ext)
+            except IntegrityError:
+                # Another worker created the row for the same bytes first; count onto it.
+                return self._commit(incoming.tmp_path, incoming.sha256, incoming.size, ext)
+        finally:
+            incoming.tmp_path.unlink(missing_ok=True)
+
+    def put_file(self, source: str, move: bool = False) -> Dict:
+        """put() for a file already on disk; with move=True the source is removed afterwards"""
+        with open(source, "rb") as f:
+            stored = self.put(f, source)
+        if move:
+            os.remove(source)
+        return stored
+
+    def _commit(self, tmp_path: Path, sha256: str, size: int, ext: str) -> Dict:
+        target = self.object_path(sha256, ext)
+        with self.bind.begin() as conn:
+            stored_path = self._add_reference(conn, sha256, str(target), size)
+            deduplicated = os.path.exists(stored_path)
+            if not deduplicated:
+                os.makedirs(os.path.dirname(stored_path), exist_ok=True)
+                os.replace(tmp_path, stored_path)
+        return {"path": stored_path, "sha256": sha256, "size_bytes": size, "deduplicated": deduplicated}
+
+    def release(self, sha256: str) -> bool:
+        """
+        Drop one reference to a stored image
+
+        Args:
+            sha256: Content hash returned by put()
+
+        Returns:
+            True when this was the last reference and the file was deleted
+        """
+        table = StoredImage.__table__
+        with self.bind.begin() as conn:
+            # sha256 is the unique key, so both statements are index lookups.
+            conn.execute(
+                update(table).where(table.c.sha256 == sha256).values(ref_count=table.c.ref_count - 1)
+            )
+            path = conn.execute(
+                select(table.c.path).where(table.c.sha256 == sha256, table.c.ref_count <= 0)
+            ).scalar()
+            if path is None:
+                return False
+            conn.execute(delete(table).where(table.c.sha256 == sha256))
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        # Resized copies go with the original.
+        from .variants import get_variant_cache
+        get_variant_cache().discard(sha256)
+        return True
+
+    def stats(self) -> Dict:
+        table = StoredImage.__table__
+        with self.bind.connect() as conn:
+            files, references, size = conn.execute(select(
+                func.count(), func.sum(table.c.ref_count), func.sum(table.c.size_bytes)
+            )).one()
+        return {"files": files, "references": int(references or 0), "size_bytes": int(size or 0)}
+
+
+# Global store instance
+image_store: Optional[ImageStore] = None
+
+
+def get_image_store() -> ImageStore:
+    """Get or create the image store"""
+    global image_store
+    if image_store is None:
+        image_store = ImageStore()
+    return image_store
@@ -0,0 +1,134 @@
+"""
+Resized variants of stored images
+Thumbnails and medium-size JPEGs are rendered on first request (or right after
+a prediction, from the image it already decoded) and cached on disk at
+UPLOAD_DIR/variants/<variant>/<ab>/<cd>/<sha256>.jpg. Stored images never
+change, so a variant's ETag is fixed by the content hash and render settings.
+"""
+
+import os
+import threading
+import uuid
+from pathlib import Path
+from typing import Dict, Optional
+
+import cv2
+import numpy as np
+
+# Longest edge in pixels; images are only ever scaled down.
+VARIANT_SIZES = {
+    "thumb": int(os.getenv("IMAGE_THUMB_SIZE", "256")),
+    "medium": int(os.getenv("IMAGE_MEDIUM_SIZE", "1024")),
+}
+JPEG_QUALITY = int(os.getenv("IMAGE_VARIANT_QUALITY", "85"))
+
+
+def render_variant(image: np.ndarray, max_edge: int, quality: int = JPEG_QUALITY) -> bytes:
+    """
+    Encode a downscaled JPEG of a decoded image
+
+    Args:
+        image: BGR image as decoded by cv2
+        max_edge: Longest edge of the result
+        quality: JPEG quality, 1-100
+
+    Returns:
+        JPEG bytes
+    """
+    height, width = image.shape[:2]
+    scale = max_edge / max(height, width)
+    if scale < 1:
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+    ok, encoded = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError("Could not encode image variant")
+    return encoded.tobytes()
+
+
+class VariantCache:
+    """On-disk cache of resized variants, rendered at most once per image"""
+
+    def __init__(self, root: str = None):
+        """
+        Args:
+            root: Cache directory (default: UPLOAD_DIR/variants)
+        """
+        self.root = Path(root or os.path.join(os.getenv("UPLOAD_DIR", "./uploads"), "variants"))
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+
+    def path(self, sha256: str, variant: str) -> Path:
+        return self.root / variant / sha256[:2] / sha256[2:4] / f"{sha256}.jpg"
+
+    @staticmethod
+    def etag(sha256: str, variant: str) -> str:
+        """Strong ETag; changes only with the bytes or the render settings"""
+        if variant == "original":
+            return f'"{sha256}"'
+        return f'"{sha256}-{variant}{VARIANT_SIZES[variant]}q{JPEG_QUALITY}"'
+
+    def _lock(self, key: str) -> threading.Lock:
+        with self._locks_lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def ensure(self, sha256: str, variant: str, source_path: str = None,
+               image: Optional[np.ndarray] = None) -> Path:
+        """
+        Path of a variant, rendering it first if it is not cached
+
+        Args:
+            sha256: Content hash of the stored image
+            variant: Key of VARIANT_SIZES
+            source_path: Stored original, decoded when image is not given
+            image: Already decoded BGR original
+
+        Returns:
+            Path of the cached JPEG
+        """
+        target = self.path(sha256, variant)
+        if target.exists():
+            return target
+        key = f"{variant}/{sha256}"
+        lock = self._lock(key)
+        with lock:
+            # Another request may have rendered it while this one waited.
+            if not target.exists():
+                if image is None:
+                    image = cv2.imread(source_path)
+                    if image is None:
+                        raise ValueError(f"Could not read image from {source_path}")
+                data = render_variant(image, VARIANT_SIZES[variant])
+                target.parent.mkdir(parents=True, exist_ok=True)
+                tmp = target.with_name(f".{target.name}.{uuid.uuid4().hex}.tmp")
+                with open(tmp, "wb") as f:
+                    f.write(data)
+                os.replace(tmp, target)
+        with self._locks_lock:
+            self._locks.pop(key, None)
+        return target
+
+    def discard(self, sha256: str):
+        """Delete every cached variant of an image (after the original is deleted)"""
+        for variant in VARIANT_SIZES:
+            self.path(sha256, variant).unlink(missing_ok=True)
+
+    def warm(self, sha256: str, image: np.ndarray):
+        """Render every variant from an image that is already decoded (after a prediction)"""
+        for variant in VARIANT_SIZES:
+            try:
+                self.ensure(sha256, variant, image=image)
+            except Exception as e:
+                print(f"Warning: Could not render {variant} for {sha256}: {e}")
+
+
+# Global variant cache instance
+variant_cache: Optional[VariantCache] = None
+
+
+def get_variant_cache() -> VariantCache:
+    """Get or create the variant cache"""
+    global variant_cache
+    if variant_cache is None:
+        variant_cache = VariantCache()
+    return variant_cache
@@ -0,0 +1,18 @@
+"""
+Rebuild the prediction_stats rollup from the predictions table
+Run after importing predictions outside the ORM (raw SQL, restores), or to
+repair the rollup. Safe to run any time: the table is rebuilt in one transaction.
+"""
+from app.database import engine, init_db
+from app.services.stats import backfill_prediction_stats
+
+def backfill_stats():
+    """Recompute every (user, day, class) bucket"""
+    init_db()
+    print("🔄 Rebuilding prediction_stats from predictions...")
+    with engine.begin() as conn:
+        buckets = backfill_prediction_stats(conn)
+    print(f"✅ Wrote {buckets} buckets")
+
+if __name__ == "__main__":
+    backfill_stats()
@@ -0,0 +1,169 @@
+"""
+Benchmark concurrent /api/history throughput, sync vs async database path
+Seeds a separate SQLite database with one user's predictions, then fires
+concurrent requests at the async /api/history route and at a copy of the
+previous handler (sync def on get_db + history_page, run in FastAPI's
+threadpool). Requests go through the ASGI app in-process, so the numbers
+compare the database paths, not the network.
+"""
+
+import asyncio
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List, Optional
+
+# The app reads DATABASE_URL at import time; never benchmark against the real database.
+os.environ["DATABASE_URL"] = os.getenv("BENCH_DATABASE_URL", "sqlite:///./bench_history.db")
+os.environ.setdefault("LOAD_MODELS_ON_STARTUP", "false")
+
+sys.path.append(str(Path(__file__).parent))
+
+import httpx
+from fastapi import Depends, Query, Response
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal, get_db, init_db
+from app.main import app
+from app.models.prediction import Prediction
+from app.models.user import User
+from app.services.auth import create_access_token, get_current_user, get_password_hash
+from app.services.history import history_page
+
+BENCH_EMAIL = "bench@bench.local"
+
+
+@app.get("/bench/history-sync", include_in_schema=False)
+def history_sync(
+    response: Response,
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """The /api/history handler before the async path: sync def, sync session"""
+    rows, next_cursor = history_page(db, current_user.id, limit=limit, cursor=cursor)
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return rows
+
+
+def seed(rows: int) -> str:
+    """Create the benchmark user with `rows` predictions (once) and return a token"""
+    init_db()
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.email == BENCH_EMAIL).first()
+        if user is None:
+            user = User(email=BENCH_EMAIL, name="Benchmark", role="patient",
+                        hashed_password=get_password_hash("bench"))
+            db.add(user)
+            db.commit()
+            db.refresh(user)
+        existing = db.query(Prediction).filter(Prediction.user_id == user.id).count()
+        if existing < rows:
+            print(f"🌱 Seeding {rows - existing} predictions...")
+            start = datetime.utcnow()
+            batch = []
+            for i in range(existing, rows):
+                batch.append(Prediction(
+                    user_id=user.id,
+                    image_path=f"uploads/{user.id}/bench_{i}.png",
+                    predicted_class=i % 5,
+                    confidence=0.5 + (i % 50) / 100,
+                    model_version="bench",
+                    created_at=start - timedelta(seconds=i)
+                ))
+                if len(batch) == 5000:
+                    db.add_all(batch)
+                    db.commit()
+                    batch = []
+            db.add_all(batch)
+            db.commit()
+        return create_access_token({"sub": user.email})
+    finally:
+        db.close()
+
+
+async def run_load(path: str, token: str, requests: int, concurrency: int, pages: int) -> dict:
+    """
+    Fire `requests` history walks at `path`, `concurrency` at a time
+
+    Args:
+        path: Route to call
+        token: Bearer token of the benchmark user
+        requests: Number of history walks
+        concurrency: Walks in flight at once
+        pages: Pages fetched per walk, following X-Next-Cursor
+
+    Returns:
+        Throughput and latency summary
+    """
+    headers = {"Authorization": f"Bearer {token}"}
+    latencies: List[float] = []
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def walk():
+            async with semaphore:
+                cursor = None
+                for _ in range(pages):
+                    params = {"limit": 100, **({"cursor": cursor} if cursor else {})}
+                    started = time.perf_counter()
+                    response = await client.get(path, params=params, headers=headers)
+                    latencies.append((time.perf_counter() - started) * 1000)
+                    response.raise_for_status()
+                    cursor = response.headers.get("X-Next-Cursor")
+                    if cursor is None:
+                        break
+
+        # Warm-up: fills the auth cache and opens pooled connections.
+        await asyncio.gather(*[walk() for _ in range(concurrency)])
+        latencies.clear()
+
+        started = time.perf_counter()
+        await asyncio.gather(*[walk() for _ in range(requests)])
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "seconds": round(elapsed, 2),
+        "req_per_s": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies), 1),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1], 1),
+    }
+
+
+def main():
+    """Compare sync and async /api/history under concurrent load"""
+    print("=" * 70)
+    print("⏱️  /api/history Benchmark: sync vs async database path")
+    print("=" * 70)
+
+    rows = int(os.getenv("BENCH_ROWS", "20000"))
+    requests = int(os.getenv("BENCH_REQUESTS", "500"))
+    concurrency = int(os.getenv("BENCH_CONCURRENCY", "64"))
+    pages = int(os.getenv("BENCH_PAGES", "3"))
+
+    print(f"📁 Database: {os.environ['DATABASE_URL']}")
+    token = seed(rows)
+    print(f"🚀 {requests} walks of up to {pages} pages, {concurrency} concurrent\n")
+
+    results = {}
+    for label, path in (("sync (before)", "/bench/history-sync"), ("async (after)", "/api/history")):
+        results[label] = asyncio.run(run_load(path, token, requests, concurrency, pages))
+        r = results[label]
+        print(f"   {label:<14} {r['req_per_s']:>8} req/s   p50 {r['p50_ms']:>7} ms   "
+              f"p95 {r['p95_ms']:>7} ms   ({r['requests']} requests in {r['seconds']} s)")
+
+    before, after = results["sync (before)"], results["async (after)"]
+    print(f"\n📊 Throughput change: {after['req_per_s'] / before['req_per_s']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""
+One-time conversion of the retinal dataset into uint8 image shards
+Decodes and resizes every image once so training runs can stream from
+memory-mapped shards instead of decoding JPEG/PNG files each time
+"""
+
+import os
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent))
+
+from training.dataset_loader import RetinalDataset
+from training.image_shards import write_image_shards
+
+
+def main():
+    """Convert the dataset to shards"""
+    print("=" * 70)
+    print("📦 Building uint8 image shards")
+    print("=" * 70)
+
+    data_dir = os.getenv("DATA_DIR", "./data")
+    csv_path = os.getenv("DATA_CSV_PATH", "").strip() or None
+    images_dir = os.getenv("DATA_IMAGES_DIR", "").strip() or None
+    shard_dir = os.getenv("DATA_SHARD_DIR", "./data_shards")
+    shard_size = int(os.getenv("SHARD_SIZE", "1024"))
+
+    dataset = RetinalDataset(data_dir=data_dir, image_size=(224, 224))
+    dataset.load_from_csv(csv_path=csv_path, images_dir=images_dir)
+
+    print(f"\n🔄 Writing {len(dataset.image_paths)} images to {shard_dir} ({shard_size} per shard)...")
+    index = write_image_shards(
+        dataset.image_paths, dataset.labels, shard_dir,
+        image_size=dataset.image_size, shard_size=shard_size
+    )
+
+    print(f"\n✅ Wrote {len(index)} images to {shard_dir}")
+    print(f"   Set DATA_SHARD_DIR={shard_dir} when running train.py to train from shards")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Compare classifier heads on the cached CNN features
+Trains each head type (ViT, linear, logistic regression, gradient boosting) on the
+same cached features and reports test accuracy, calibration and per-batch CPU
+latency. Results go to models_saved/head_comparison.csv/.json; each trained head
+is saved under models_saved/heads/<type>/. Train the chosen one with HEAD_TYPE=<type>.
+"""
+
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.append(str(Path(__file__).parent))
+
+from train import ModelTrainer
+from training.evaluation import collect_probabilities, evaluate_predictions
+from training.feature_extractor import HybridCNNFeatureExtractor
+from training.heads import HEAD_TYPES, batch_latency, create_head, save_head
+
+
+def main():
+    """Train every requested head type and compare them"""
+    print("=" * 70)
+    print("⚖️  Classifier Head Comparison")
+    print("=" * 70)
+
+    data_dir = os.getenv("DATA_DIR", "./data")
+    models_dir = os.getenv("MODELS_DIR", "./models_saved")
+    head_types = [h.strip() for h in os.getenv("COMPARE_HEADS", ",".join(HEAD_TYPES)).split(",") if h.strip()]
+    epochs = int(os.getenv("COMPARE_EPOCHS", "50"))
+    batch_size = int(os.getenv("COMPARE_BATCH_SIZE", "32"))
+
+    if os.getenv("COMPARE_ON_CPU", "true").lower() == "true":
+        # Latency is reported for CPU serving, so keep the Keras heads off the GPU too.
+        import tensorflow as tf
+        tf.config.set_visible_devices([], "GPU")
+
+    trainer = ModelTrainer(
+        data_dir=data_dir,
+        models_dir=models_dir,
+        cache_dir=os.getenv("FEATURE_CACHE_DIR", "./feature_cache"),
+        extraction_workers=int(os.getenv("EXTRACTION_WORKERS", "1"))
+    )
+    trainer.load_dataset(
+        csv_path=os.getenv("DATA_CSV_PATH", "").strip() or None,
+        images_dir=os.getenv("DATA_IMAGES_DIR", "").strip() or None,
+        manifest_path=os.getenv(
+            "DATASET_MANIFEST", os.path.join(models_dir, "dataset_manifest.sqlite")
+        ).strip() or None
+    )
+    trainer.check_integrity(os.path.join(models_dir, "image_integrity.csv"))
+    train_paths, train_labels, val_paths, val_labels, test_paths, test_labels = trainer.prepare_data_splits()
+
+    extractor_path = os.path.join(models_dir, "feature_extractor.h5")
+    if not os.path.exists(extractor_path):
+        raise FileNotFoundError(f"{extractor_path} not found; run train.py first")
+    trainer.feature_extractor = HybridCNNFeatureExtractor()
+    trainer.feature_extractor.load(extractor_path)
+
+    # Features come from the shared cache; only missing images go through the CNN.
+    train_features, train_labels = trainer.extract_features(train_paths, train_labels, batch_size=batch_size)
+    val_features, val_labels = trainer.extract_features(val_paths, val_labels, batch_size=batch_size)
+    test_features, test_labels = trainer.extract_features(test_paths, test_labels, batch_size=batch_size)
+
+    rows = []
+    for head_type in head_types:
+        print(f"\n🤖 {head_type}")
+        head = create_head(head_type, feature_dim=train_features.shape[1], num_classes=5,
+                           **(trainer.vit_config if head_type == "vit" else {}))
+        started = time.perf_counter()
+        result = head.fit(train_features, train_labels, val_features, val_labels,
+                          epochs=epochs, batch_size=batch_size)
+        train_seconds = time.perf_counter() - started
+
+        probabilities, labels = collect_probabilities(head, test_features, test_labels)
+        report = evaluate_predictions(labels, probabilities)
+        weights_path = save_head(head, Path(models_dir) / "heads" / head_type)
+
+        rows.append({
+            "head": head_type,
+            "accuracy": round(report["accuracy"], 4),
+            "macro_f1": round(report["f1_score"], 4),
+            "ece": round(report["ece"], 4),
+            "nll": round(report["nll"], 4),
+            "served_accuracy": round(report["served"]["accuracy"], 4),
+            "coverage": round(report["served"]["coverage"], 4),
+            "train_seconds": round(train_seconds, 1),
+            "epochs": result.get("epochs"),
+            **batch_latency(head, test_features, batch_size=batch_size),
+            "size_kb": round(os.path.getsize(weights_path) / 1024, 1),
+        })
+        print(f"   accuracy {rows[-1]['accuracy']:.4f}, ECE {rows[-1]['ece']:.4f}, "
+              f"{rows[-1]['latency_ms_p50']:.2f} ms per batch of {batch_size}")
+
+    results = pd.DataFrame(rows).sort_values("macro_f1", ascending=False)
+    csv_path = os.path.join(models_dir, "head_comparison.csv")
+    results.to_csv(csv_path, index=False)
+    with open(os.path.join(models_dir, "head_comparison.json"), "w") as f:
+        json.dump(results.to_dict(orient="records"), f, indent=2)
+
+    print("\n📊 Results (test set):")
+    print(results.to_string(index=False))
+    print(f"\n✅ Saved comparison to {csv_path}")
+    print(f"   Trained heads are in {os.path.join(models_dir, 'heads')}/; "
+          f"train and publish one with HEAD_TYPE=<head> python train.py")
+
+
+if __name__ == "__main__":
+    main()
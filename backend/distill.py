@@ -0,0 +1,139 @@
+"""
+Distil the hybrid CNN + ViT model into a compact student CNN
+Teacher probabilities are cached with the CNN features, the student is trained
+end to end on images, and the result is saved as models_saved/student_model.h5.
+Serve it with PREDICTION_ENGINE=student.
+"""
+
+import json
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+import tensorflow as tf
+
+sys.path.append(str(Path(__file__).parent))
+
+from train import ModelTrainer
+from training.distillation import (
+    StudentClassifier, distillation_loss, distillation_report,
+    label_accuracy, pack_targets, teacher_probabilities
+)
+from training.feature_extractor import HybridCNNFeatureExtractor
+from training.heads import has_head, load_head
+from training.registry import ModelRegistry
+
+
+def main():
+    """Train the student on cached teacher outputs and report how it compares"""
+    print("=" * 70)
+    print("🎓 Distilling Hybrid CNN + ViT into a Student CNN")
+    print("=" * 70)
+
+    data_dir = os.getenv("DATA_DIR", "./data")
+    models_dir = os.getenv("MODELS_DIR", "./models_saved")
+    batch_size = int(os.getenv("DISTILL_BATCH_SIZE", "32"))
+    epochs = int(os.getenv("DISTILL_EPOCHS", "40"))
+    temperature = float(os.getenv("DISTILL_TEMPERATURE", "4.0"))
+    alpha = float(os.getenv("DISTILL_ALPHA", "0.7"))
+    width = int(os.getenv("STUDENT_WIDTH", "32"))
+
+    trainer = ModelTrainer(
+        data_dir=data_dir,
+        models_dir=models_dir,
+        cache_dir=os.getenv("FEATURE_CACHE_DIR", "./feature_cache"),
+        extraction_workers=int(os.getenv("EXTRACTION_WORKERS", "1"))
+    )
+    trainer.load_dataset(
+        csv_path=os.getenv("DATA_CSV_PATH", "").strip() or None,
+        images_dir=os.getenv("DATA_IMAGES_DIR", "").strip() or None,
+        manifest_path=os.getenv(
+            "DATASET_MANIFEST", os.path.join(models_dir, "dataset_manifest.sqlite")
+        ).strip() or None
+    )
+    trainer.check_integrity(os.path.join(models_dir, "image_integrity.csv"))
+    splits = trainer.prepare_data_splits()
+
+    # Teacher: the deployed feature extractor + classifier head
+    extractor_path = os.path.join(models_dir, "feature_extractor.h5")
+    if not os.path.exists(extractor_path) or not has_head(models_dir):
+        raise FileNotFoundError("Teacher models not found; run train.py first")
+    trainer.feature_extractor = HybridCNNFeatureExtractor()
+    trainer.feature_extractor.load(extractor_path)
+    teacher_head = load_head(models_dir)
+    head_path = os.path.join(models_dir, teacher_head.weights_file)
+
+    # Teacher outputs for every split, computed once from cached features
+    split_data = {}
+    for name, (paths, labels) in zip(("train", "val", "test"), zip(splits[0::2], splits[1::2])):
+        print(f"\n📦 Teacher outputs for {name} set...")
+        trainer.cache_features(paths, labels, batch_size=batch_size)
+        probs, valid = teacher_probabilities(trainer.feature_cache, teacher_head, paths, head_path)
+        paths = [p for p, ok in zip(paths, valid) if ok]
+        labels = np.asarray(labels)[valid]
+        split_data[name] = (paths, labels, probs)
+
+    # Student
+    print("\n🧠 Training student...")
+    student = StudentClassifier(width=width)
+    student.model.compile(
+        optimizer=tf.keras.optimizers.Adam(learning_rate=float(os.getenv("DISTILL_LEARNING_RATE", "0.001"))),
+        loss=distillation_loss(temperature=temperature, alpha=alpha),
+        metrics=[label_accuracy()]
+    )
+    train_paths, train_labels, train_probs = split_data["train"]
+    val_paths, val_labels, val_probs = split_data["val"]
+    dataset = trainer.dataset
+    student.model.fit(
+        dataset.create_tf_dataset(train_paths, pack_targets(train_probs, train_labels),
+                                  batch_size=batch_size, shuffle=True, augment=True),
+        validation_data=dataset.create_tf_dataset(val_paths, pack_targets(val_probs, val_labels),
+                                                  batch_size=batch_size, shuffle=False),
+        epochs=epochs,
+        callbacks=[
+            tf.keras.callbacks.EarlyStopping(monitor='val_loss', patience=8, restore_best_weights=True, verbose=1),
+            tf.keras.callbacks.ReduceLROnPlateau(monitor='val_loss', factor=0.5, patience=3, min_lr=1e-6, verbose=1)
+        ],
+        verbose=1
+    )
+
+    student_path = os.path.join(models_dir, "student_model.h5")
+    student.save(student_path)
+    print(f"\n💾 Saved student to {student_path}")
+
+    # Report on the test split
+    print("\n📊 Comparing student with teacher on the test set...")
+    test_paths, test_labels, test_probs = split_data["test"]
+    student_probs = student.predict_dataset(
+        dataset.create_tf_dataset(test_paths, pack_targets(test_probs, test_labels),
+                                  batch_size=batch_size, shuffle=False)
+    )
+    timing_images = dataset.load_images_to_memory(test_paths[:32])
+    report = distillation_report(
+        student,
+        lambda images: teacher_head.predict(trainer.feature_extractor.extract_features(images)),
+        student_probs, test_probs, test_labels, timing_images
+    )
+    report.update(temperature=temperature, alpha=alpha, width=width)
+
+    report_path = os.path.join(models_dir, "distillation_report.json")
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"   Agreement with teacher: {report['agreement']:.4f}")
+    print(f"   Teacher accuracy: {report['teacher_accuracy']:.4f}")
+    print(f"   Student accuracy: {report['student_accuracy']:.4f}")
+    print(f"   Latency: {report['teacher_latency_ms']} ms -> {report['student_latency_ms']} ms "
+          f"({report['speedup']}x faster)")
+    print(f"\n✅ Report saved to {report_path}")
+
+    version = ModelRegistry(models_dir=models_dir).publish_directory(
+        models_dir, metadata={"source": "distill.py", "student_accuracy": report["student_accuracy"]}
+    )
+    print(f"📦 Published model version {version} (ensemble + student)")
+    print("   Set PREDICTION_ENGINE=student to serve the student")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Standalone sharded feature extraction
+Fills the feature cache for the whole dataset using several worker processes.
+Run the same command on several machines that share the data and cache
+directories (mounted at the same paths) to spread the work; an interrupted
+run resumes from the last finished work unit.
+"""
+
+import os
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent))
+
+from training.dataset_loader import RetinalDataset
+from training.extraction_runner import ShardedExtractionRunner
+
+
+def main():
+    """Extract features for every image in the dataset manifest"""
+    print("=" * 70)
+    print("🧩 Sharded Feature Extraction")
+    print("=" * 70)
+
+    data_dir = os.getenv("DATA_DIR", "./data")
+    models_dir = os.getenv("MODELS_DIR", "./models_saved")
+    threads = os.getenv("EXTRACTION_THREADS_PER_WORKER", "").strip()
+
+    dataset = RetinalDataset(data_dir=data_dir, image_size=(224, 224))
+    dataset.load_from_manifest(
+        os.getenv("DATASET_MANIFEST", os.path.join(models_dir, "dataset_manifest.sqlite")),
+        csv_path=os.getenv("DATA_CSV_PATH", "").strip() or None,
+        images_dir=os.getenv("DATA_IMAGES_DIR", "").strip() or None
+    )
+    dataset.apply_integrity_manifest(dataset.manifest.integrity_frame())
+
+    runner = ShardedExtractionRunner(
+        extractor_path=os.path.join(models_dir, "feature_extractor.h5"),
+        cache_dir=os.getenv("FEATURE_CACHE_DIR", "./feature_cache"),
+        unit_size=int(os.getenv("EXTRACTION_UNIT_SIZE", "512")),
+        num_workers=int(os.getenv("EXTRACTION_WORKERS", "0")) or None,
+        threads_per_worker=int(threads) if threads else None
+    )
+    runner.run(dataset.image_paths)
+
+    print("\n✅ Feature cache is complete for this dataset")
+
+
+if __name__ == "__main__":
+    main()
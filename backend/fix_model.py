@@ -4,17 +4,21 @@ import sys
 from pathlib import Path
 sys.path.append(str(Path(__file__).parent))
 
-from training.vit_classifier import VisionTransformerClassifier
+from training.heads import HEAD_CONFIG, load_head, save_head
+from training.registry import ModelRegistry
 
 print("🔧 Fixing model bias...")
 print("Loading current model...")
 
 # Load existing model
-vit = VisionTransformerClassifier(feature_dim=2560, num_classes=5)
-vit.load("./models_saved/vit_classifier.weights.h5")
+models_dir = "./models_saved"
+head = load_head(models_dir)
+if not hasattr(head, "model"):
+    print(f"❌ Only Keras heads can be adjusted; the saved head is {head.head_type}")
+    sys.exit(1)
 
 # Get the final dense layer and add noise to break the bias
-final_layer = vit.model.layers[-1]
+final_layer = head.model.layers[-1]
 current_weights, current_bias = final_layer.get_weights()
 
 print(f"Current weights shape: {current_weights.shape}")
@@ -31,9 +35,14 @@ new_bias = np.zeros_like(current_bias)
 # Set new weights
 final_layer.set_weights([new_weights, new_bias])
 
-# Save updated model
-vit.save("./models_saved/vit_classifier.weights.h5")
+# Save updated model and publish it as a new registry version
+save_head(head, models_dir)
+names = ["feature_extractor.h5", HEAD_CONFIG] + head.artifacts()
+version = ModelRegistry().publish(
+    {name: str(Path(models_dir) / name) for name in names},
+    metadata={"source": "fix_model.py"}
+)
 
 print("✅ Model updated!")
 print("The model should now give more varied predictions")
-print("\nRestart the backend server to use the updated model")
+print(f"\n📦 Published model version {version}; running servers switch to it automatically")
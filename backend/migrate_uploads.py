@@ -0,0 +1,91 @@
+"""
+Move legacy uploads into the content-addressed store
+Every file under UPLOAD_DIR/<user_id>/ is stored once under UPLOAD_DIR/objects/,
+predictions and shadow evaluations that pointed at it are re-pointed, and the
+original is removed. Safe to re-run after an interruption: a file whose old copy
+was not yet removed only ends up with one extra reference.
+Set MIGRATE_DRY_RUN=true to only report what would move.
+"""
+import os
+from collections import defaultdict
+from pathlib import Path
+
+from sqlalchemy import select, update
+
+from app.database import engine, init_db
+from app.models.prediction import Prediction
+from app.models.shadow_evaluation import ShadowEvaluation
+from app.services.storage import ImageStore
+
+def legacy_files(upload_dir: Path):
+    """Files in the per-user directories (UPLOAD_DIR/<user_id>/...)"""
+    for user_dir in sorted(upload_dir.iterdir()):
+        if user_dir.is_dir() and user_dir.name.isdigit():
+            for path in sorted(user_dir.rglob("*")):
+                if path.is_file():
+                    yield path
+
+def referencing_rows(table):
+    """Absolute image path -> ids of rows in table that point at it"""
+    rows = defaultdict(list)
+    with engine.connect() as conn:
+        for row_id, image_path in conn.execute(select(table.c.id, table.c.image_path)):
+            rows[os.path.abspath(image_path)].append(row_id)
+    return rows
+
+def migrate_uploads():
+    """Store every legacy upload once and re-point the rows that use it"""
+    init_db()
+    upload_dir = Path(os.getenv("UPLOAD_DIR", "./uploads"))
+    dry_run = os.getenv("MIGRATE_DRY_RUN", "false").lower() == "true"
+    store = ImageStore(root=str(upload_dir))
+
+    print("=" * 70)
+    print(f"📦 Migrating uploads in {upload_dir} to content-addressed storage"
+          + (" (dry run)" if dry_run else ""))
+    print("=" * 70)
+
+    tables = [Prediction.__table__, ShadowEvaluation.__table__]
+    references = {table.name: referencing_rows(table) for table in tables}
+
+    moved = deduplicated = repointed = 0
+    bytes_before = 0
+    for path in legacy_files(upload_dir):
+        bytes_before += path.stat().st_size
+        matches = {table.name: references[table.name].get(os.path.abspath(path), []) for table in tables}
+        if dry_run:
+            moved += 1
+            repointed += sum(len(ids) for ids in matches.values())
+            continue
+
+        # Store first, re-point rows, and only then remove the original.
+        stored = store.put_file(str(path))
+        with engine.begin() as conn:
+            for table in tables:
+                ids = matches[table.name]
+                if ids:
+                    conn.execute(update(table).where(table.c.id.in_(ids)).values(image_path=stored["path"]))
+                    repointed += len(ids)
+        os.remove(path)
+        moved += 1
+        deduplicated += stored["deduplicated"]
+        if moved % 500 == 0:
+            print(f"   {moved} files migrated...")
+
+    if not dry_run:
+        # Remove the per-user directories left empty.
+        for user_dir in upload_dir.iterdir():
+            if user_dir.is_dir() and user_dir.name.isdigit():
+                for directory in sorted(user_dir.rglob("*"), reverse=True) + [user_dir]:
+                    if directory.is_dir() and not any(directory.iterdir()):
+                        directory.rmdir()
+
+    print(f"\n✅ {moved} files {'would be ' if dry_run else ''}migrated, "
+          f"{repointed} rows re-pointed, {deduplicated} duplicates collapsed")
+    if not dry_run:
+        stats = store.stats()
+        print(f"   Store: {stats['files']} files, {stats['references']} references, "
+              f"{stats['size_bytes'] / 1e6:.1f} MB (legacy files were {bytes_before / 1e6:.1f} MB)")
+
+if __name__ == "__main__":
+    migrate_uploads()
@@ -5,19 +5,23 @@ Retrains the model on the current dataset to improve accuracy
 
 import os
 import sys
+import time
 import numpy as np
 from pathlib import Path
 from tensorflow import keras
-from sklearn.model_selection import train_test_split
 
 # Add paths
 sys.path.append(os.path.dirname(__file__))
 
-from training.dataset_loader import load_dataset
+from training.dataset_loader import RetinalDataset
+from training.feature_cache import FeatureCache
 from training.feature_extractor import HybridCNNFeatureExtractor
+from training.heads import HEAD_CONFIG, ViTHead, save_head
+from training.registry import ModelRegistry
+from training.telemetry import RunTelemetry
 from training.vit_classifier import VisionTransformerClassifier
 
-def retrain_model():
+def retrain_model(telemetry: RunTelemetry):
     """Retrain the Vision Transformer classifier"""
     
     print("=" * 60)
@@ -26,17 +30,19 @@ def retrain_model():
     
     # Load dataset
     print("\n📂 Loading dataset...")
-    dataset_dir = "./dataset"
-    X_train, y_train, class_names = load_dataset(dataset_dir)
-    print(f"✓ Loaded {len(X_train)} images")
+    with telemetry.stage("dataset_discovery") as stage:
+        dataset = RetinalDataset(data_dir=os.getenv("DATA_DIR", "./dataset"), image_size=(224, 224))
+        dataset.load_from_manifest(os.getenv("DATASET_MANIFEST", "./models_saved/dataset_manifest.sqlite"))
+        dataset.apply_integrity_manifest(dataset.manifest.integrity_frame())
+        stage["items"] = len(dataset.image_paths)
+    class_names = [RetinalDataset.CLASS_NAMES[i] for i in range(5)]
+    print(f"✓ Loaded {len(dataset.image_paths)} images")
     print(f"✓ Classes: {class_names}")
     
-    # Split into train and validation
-    X_train_split, X_val, y_train_split, y_val = train_test_split(
-        X_train, y_train, test_size=0.2, random_state=42, stratify=y_train
-    )
-    print(f"✓ Train: {len(X_train_split)} images")
-    print(f"✓ Validation: {len(X_val)} images")
+    # Use the stable split stored in the manifest (shared with train.py)
+    train_paths, y_train_split, val_paths, y_val, _, _ = dataset.split_dataset()
+    print(f"✓ Train: {len(train_paths)} images")
+    print(f"✓ Validation: {len(val_paths)} images")
     
     # Extract features
     print("\n🔧 Extracting features with CNN...")
@@ -48,8 +54,27 @@ def retrain_model():
         feature_extractor.load(feature_extractor_path)
         print("✓ Loaded existing feature extractor")
     
-    train_features = feature_extractor.extract_features(X_train_split)
-    val_features = feature_extractor.extract_features(X_val)
+    feature_cache = FeatureCache(
+        cache_dir=os.getenv("FEATURE_CACHE_DIR", "./feature_cache"),
+        fingerprint=feature_extractor.fingerprint()
+    )
+    
+    def compute(batch_paths):
+        started = time.perf_counter()
+        images, loaded = dataset.load_images_to_memory(batch_paths, return_mask=True)
+        if len(images) == 0:
+            return np.empty((0, 0), dtype=np.float32), loaded
+        decoded = time.perf_counter()
+        features = feature_extractor.extract_features(images)
+        telemetry.accumulate("decode", decoded - started, len(batch_paths))
+        telemetry.accumulate("cnn_forward", time.perf_counter() - decoded, len(images))
+        return features, loaded
+    
+    with telemetry.stage("feature_extraction", items=len(train_paths) + len(val_paths)):
+        train_features, train_valid = feature_cache.get_or_compute(train_paths, compute)
+        val_features, val_valid = feature_cache.get_or_compute(val_paths, compute)
+    y_train_split = np.asarray(y_train_split)[train_valid]
+    y_val = np.asarray(y_val)[val_valid]
     print(f"✓ Extracted features: {train_features.shape}")
     
     # Build and train ViT classifier
@@ -85,24 +110,29 @@ def retrain_model():
             factor=0.5,
             patience=5,
             min_lr=1e-7
-        )
+        ),
+        telemetry.epoch_callback()
     ]
     
     # Train
     print("\nTraining started...")
-    history = vit.model.fit(
-        train_features, y_train_split,
-        validation_data=(val_features, y_val),
-        epochs=100,
-        batch_size=8,
-        callbacks=callbacks,
-        verbose=1
-    )
+    with telemetry.stage("head_training") as stage:
+        history = vit.model.fit(
+            train_features, y_train_split,
+            validation_data=(val_features, y_val),
+            epochs=100,
+            batch_size=8,
+            callbacks=callbacks,
+            verbose=1
+        )
+        stage["items"] = len(train_features) * len(history.history["loss"])
     
     # Evaluate
     print("\n📊 Evaluating model...")
-    train_loss, train_acc = vit.model.evaluate(train_features, y_train_split, verbose=0)
-    val_loss, val_acc = vit.model.evaluate(val_features, y_val, verbose=0)
+    with telemetry.stage("evaluation", items=len(train_features) + len(val_features)):
+        train_loss, train_acc = vit.model.evaluate(train_features, y_train_split, verbose=0)
+        val_loss, val_acc = vit.model.evaluate(val_features, y_val, verbose=0)
+    telemetry.set(train_accuracy=float(train_acc), val_accuracy=float(val_acc))
     
     print(f"\n✓ Training Accuracy: {train_acc*100:.2f}%")
     print(f"✓ Validation Accuracy: {val_acc*100:.2f}%")
@@ -130,23 +160,33 @@ def retrain_model():
     # Save model
     print("\n💾 Saving retrained model...")
     os.makedirs("./models_saved", exist_ok=True)
-    vit_path = "./models_saved/vit_classifier.weights.h5"
-    vit.save(vit_path)
+    head = ViTHead(classifier=vit)
+    vit_path = save_head(head, "./models_saved")
     print(f"✓ Saved to {vit_path}")
+    # Publish only the extractor and this head, not whatever else sits in models_saved
+    names = ["feature_extractor.h5", HEAD_CONFIG] + head.artifacts()
+    version = ModelRegistry().publish(
+        {name: os.path.join("./models_saved", name) for name in names},
+        metadata={"source": "retrain_model.py", "train_accuracy": float(train_acc), "val_accuracy": float(val_acc)}
+    )
+    telemetry.set(model_version=version)
     
     print("\n" + "=" * 60)
     print("✅ RETRAINING COMPLETE!")
     print("=" * 60)
-    print("\n🔄 Restart the backend server to use the new model")
-    print("   The predictions should now be more accurate!")
+    print(f"\n📦 Published model version {version}")
+    print("   Running servers switch to it automatically (no restart needed)")
     
     return val_acc
 
 if __name__ == "__main__":
+    telemetry = RunTelemetry("retrain_model.py", "./models_saved", config={"epochs": 100, "batch_size": 8})
     try:
-        accuracy = retrain_model()
+        accuracy = retrain_model(telemetry)
+        telemetry.finish()
         print(f"\n🎯 Final Validation Accuracy: {accuracy*100:.2f}%")
     except Exception as e:
+        telemetry.finish(status="failed")
         print(f"\n❌ Error during retraining: {e}")
         import traceback
         traceback.print_exc()
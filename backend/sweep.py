@@ -0,0 +1,93 @@
+"""
+Hyperparameter sweep for the ViT head
+Trains many head configurations in parallel over the cached CNN features and
+exports the best one to models_saved/vit_best_config.json, which train.py uses.
+"""
+
+import os
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent))
+
+from train import ModelTrainer
+from training.feature_extractor import HybridCNNFeatureExtractor
+from training.sweep import SweepRunner, grid_configs, load_search_space, random_configs
+
+
+def main():
+    """Run a grid or random sweep over the search space"""
+    print("=" * 70)
+    print("🧪 ViT Head Hyperparameter Sweep")
+    print("=" * 70)
+
+    data_dir = os.getenv("DATA_DIR", "./data")
+    models_dir = os.getenv("MODELS_DIR", "./models_saved")
+    mode = os.getenv("SWEEP_MODE", "grid").lower()
+    num_trials = int(os.getenv("SWEEP_TRIALS", "20"))
+    folds = int(os.getenv("SWEEP_FOLDS", "1"))
+    workers = int(os.getenv("SWEEP_WORKERS", "0")) or None
+    seed = int(os.getenv("TRAIN_SEED", "42"))
+
+    trainer = ModelTrainer(
+        data_dir=data_dir,
+        models_dir=models_dir,
+        cache_dir=os.getenv("FEATURE_CACHE_DIR", "./feature_cache"),
+        extraction_workers=int(os.getenv("EXTRACTION_WORKERS", "1"))
+    )
+    trainer.load_dataset(
+        csv_path=os.getenv("DATA_CSV_PATH", "").strip() or None,
+        images_dir=os.getenv("DATA_IMAGES_DIR", "").strip() or None,
+        manifest_path=os.getenv(
+            "DATASET_MANIFEST", os.path.join(models_dir, "dataset_manifest.sqlite")
+        ).strip() or None
+    )
+    trainer.check_integrity(os.path.join(models_dir, "image_integrity.csv"))
+    train_paths, train_labels, val_paths, val_labels, _, _ = trainer.prepare_data_splits()
+
+    extractor_path = os.path.join(models_dir, "feature_extractor.h5")
+    if not os.path.exists(extractor_path):
+        raise FileNotFoundError(f"{extractor_path} not found; run train.py first")
+    trainer.feature_extractor = HybridCNNFeatureExtractor()
+    trainer.feature_extractor.load(extractor_path)
+
+    # Fill the cache once up front; sweep workers only read it.
+    train_keys, train_labels = trainer.cache_features(train_paths, train_labels)
+    val_keys, val_labels = trainer.cache_features(val_paths, val_labels)
+
+    space = load_search_space(os.getenv("SWEEP_SPACE", "").strip() or None)
+    if mode == "random":
+        configs = random_configs(space, num_trials, seed=seed)
+    else:
+        configs = grid_configs(space)
+
+    if folds > 1:
+        # k-fold over train + val; the test split stays untouched for train.py.
+        runner_kwargs = dict(keys=train_keys + val_keys, labels=list(train_labels) + list(val_labels))
+    else:
+        runner_kwargs = dict(keys=train_keys, labels=train_labels, val_keys=val_keys, val_labels=val_labels)
+    runner = SweepRunner(
+        cache_dir=trainer.cache_dir,
+        fingerprint=trainer.feature_cache.fingerprint,
+        folds=folds,
+        num_workers=workers,
+        threads_per_worker=int(os.getenv("SWEEP_THREADS_PER_WORKER", "2")),
+        epochs=int(os.getenv("SWEEP_EPOCHS", "30")),
+        metric=os.getenv("SWEEP_METRIC", "val_macro_f1"),
+        seed=seed,
+        output_dir=os.path.join(models_dir, "sweeps"),
+        **runner_kwargs
+    )
+    leaderboard = runner.run(configs)
+
+    print("\n🏆 Top configurations:")
+    print(leaderboard.head(10).to_string(index=False))
+
+    best_path = os.getenv("VIT_CONFIG_PATH", os.path.join(models_dir, "vit_best_config.json"))
+    best = runner.export_best(leaderboard, best_path)
+    print(f"\n✅ Best config ({best['metric']} = {best['score']:.4f}) saved to {best_path}")
+    print("   train.py will use it on the next run")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+pytest.importorskip("tensorflow")
+
+from training.dataset_loader import RetinalDataset
+
+
+def _write_images(images_dir, names):
+    images_dir.mkdir(parents=True)
+    for name in names:
+        cv2.imwrite(str(images_dir / f"{name}.png"), np.zeros((8, 8, 3), dtype=np.uint8))
+
+
+@pytest.mark.skipif(not hasattr(os, "symlink"), reason="needs symlink support")
+def test_images_dir_under_symlinked_ancestor(tmp_path):
+    # data/link -> ../real, images in data/link/images
+    names = ["img_0", "img_1", "img_2", "img_3"]
+    _write_images(tmp_path / "real" / "images", names)
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    os.symlink(tmp_path / "real", data_dir / "link", target_is_directory=True)
+    csv_path = data_dir / "labels.csv"
+    csv_path.write_text("image,level\n" + "".join(f"{name},{i}\n" for i, name in enumerate(names)))
+
+    dataset = RetinalDataset(data_dir=str(data_dir), image_size=(8, 8))
+    dataset.load_from_csv(images_dir=str(data_dir / "link" / "images"))
+
+    assert len(dataset.image_paths) == 4
+    assert dataset.labels == [0, 1, 2, 3]
+    assert dataset.missing_images == []
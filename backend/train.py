@@ -6,9 +6,12 @@ on real retinal images
 
 import os
 import sys
+import json
+import time
 import numpy as np
 import tensorflow as tf
 from pathlib import Path
+from contextlib import nullcontext
 from datetime import datetime
 from sklearn.utils.class_weight import compute_class_weight
 
@@ -16,43 +19,104 @@ from sklearn.utils.class_weight import compute_class_weight
 sys.path.append(str(Path(__file__).parent.parent))
 
 from training.dataset_loader import RetinalDataset
+from training.preprocessing import augment_image, augmentation_seed
 from training.feature_extractor import HybridCNNFeatureExtractor
+from training.feature_cache import FeatureCache
+from training.extraction_runner import ShardedExtractionRunner
+from training.feature_pipeline import feature_dim, make_feature_dataset, make_balanced_feature_dataset
+from training import integrity
+from training.heads import HEAD_CONFIG, ViTHead, create_head, save_head
+from training.registry import ModelRegistry
+from training.evaluation import collect_probabilities, evaluate_predictions, format_report, model_version
+from training.sweep import load_best_config
+from training.telemetry import RunTelemetry
 from training.vit_classifier import VisionTransformerClassifier
 
 class ModelTrainer:
     """Trains the DR detection model on Kaggle dataset"""
     
-    def __init__(self, data_dir: str = "./data", models_dir: str = "./models_saved"):
+    # ViT head architecture used unless a tuned config is passed in
+    DEFAULT_VIT_CONFIG = {
+        "num_transformer_blocks": 4,
+        "num_heads": 8,
+        "ff_dim": 256,
+        "dropout_rate": 0.1,
+    }
+    
+    def __init__(self, data_dir: str = "./data", models_dir: str = "./models_saved",
+                 cache_dir: str = "./feature_cache", extraction_workers: int = 1,
+                 vit_config: dict = None, telemetry: RunTelemetry = None):
         self.data_dir = data_dir
         self.models_dir = Path(models_dir)
         self.models_dir.mkdir(exist_ok=True)
+        self.cache_dir = cache_dir
+        self.extraction_workers = extraction_workers
+        self.vit_config = {**self.DEFAULT_VIT_CONFIG, **(vit_config or {})}
+        self.telemetry = telemetry
         
         self.feature_extractor = None
+        self.feature_cache = None
         self.vit_classifier = None
+        self.head = None
         self.dataset = None
         
-    def load_dataset(self):
-        """Load and prepare the Kaggle dataset"""
+    def _stage(self, name, items=None):
+        """Time a pipeline stage when telemetry is enabled"""
+        if self.telemetry is None:
+            return nullcontext({})
+        return self.telemetry.stage(name, items)
+    
+    def load_dataset(self, csv_path=None, images_dir=None, manifest_path=None):
+        """Load and prepare the Kaggle dataset, through the dataset manifest if given"""
         print("=" * 70)
         print("📊 Loading Kaggle Retinal Disease Classification Dataset")
         print("=" * 70)
         
-        self.dataset = RetinalDataset(data_dir=self.data_dir, image_size=(224, 224))
-        
-        # Try loading from CSV first (most common format)
-        try:
-            self.dataset.load_from_csv()
-        except Exception as e:
-            print(f"⚠️  CSV loading failed: {e}")
-            print("   Trying directory structure...")
+        with self._stage("dataset_discovery") as stage:
+            self.dataset = RetinalDataset(data_dir=self.data_dir, image_size=(224, 224))
+            
+            # Try loading from CSV first (most common format)
             try:
-                self.dataset.load_from_directory(split_by_folder=False)
-            except Exception as e2:
-                print(f"❌ Directory loading failed: {e2}")
-                raise ValueError("Could not load dataset. Please check the data directory.")
+                if manifest_path is not None:
+                    self.dataset.load_from_manifest(manifest_path, csv_path=csv_path, images_dir=images_dir)
+                else:
+                    self.dataset.load_from_csv(csv_path=csv_path, images_dir=images_dir)
+            except Exception as e:
+                if csv_path is not None or images_dir is not None:
+                    raise
+                self.dataset.manifest = None
+                print(f"⚠️  CSV loading failed: {e}")
+                print("   Trying directory structure...")
+                try:
+                    self.dataset.load_from_directory(split_by_folder=False)
+                except Exception as e2:
+                    print(f"❌ Directory loading failed: {e2}")
+                    raise ValueError("Could not load dataset. Please check the data directory.")
+            
+            stage["items"] = len(self.dataset.image_paths)
         
         return self.dataset
     
+    def check_integrity(self, manifest_path, workers=None):
+        """Scan images in parallel and drop corrupt or duplicate entries before splitting"""
+        print("\n" + "=" * 70)
+        print("🔎 Checking Image Integrity")
+        print("=" * 70)
+        
+        with self._stage("integrity_check", items=len(self.dataset.image_paths)):
+            if self.dataset.manifest is not None:
+                # The dataset manifest already probed every new or changed image.
+                manifest = self.dataset.manifest.integrity_frame()
+            elif self.dataset.shard_store is not None:
+                # Shards hold only images that decoded; duplicates come from the recorded hashes.
+                manifest = self.dataset.shard_store.integrity_frame()
+            else:
+                manifest = integrity.load_or_scan(self.dataset.image_paths, manifest_path, workers=workers)
+            integrity.summarize(manifest)
+            self.dataset.apply_integrity_manifest(manifest)
+        
+        return manifest
+    
     def prepare_data_splits(self, train_ratio=0.7, val_ratio=0.15, test_ratio=0.15):
         """Split dataset into train/val/test"""
         print("\n" + "=" * 70)
@@ -93,55 +157,130 @@ class ModelTrainer:
         
         return self.feature_extractor
     
-    def extract_features(self, image_paths, labels, batch_size=32):
-        """Extract features from images using the trained feature extractor"""
+    def get_feature_cache(self) -> FeatureCache:
+        """Open the feature cache namespace for the current feature extractor"""
+        if self.feature_cache is None:
+            fingerprint = self.feature_extractor.fingerprint()
+            self.feature_cache = FeatureCache(cache_dir=self.cache_dir, fingerprint=fingerprint)
+            if self.dataset is not None and self.dataset.shard_store is not None:
+                # Key images by the identities recorded in the shard index; the originals may be absent.
+                self.feature_cache.use_identities(self.dataset.shard_store.file_identities())
+            print(f"🗄️  Feature cache: {self.feature_cache.root} ({len(self.feature_cache)} entries)")
+        return self.feature_cache
+    
+    def _ensure_features(self, image_paths, batch_size=32, view=0):
+        """
+        Cache features for image_paths (view > 0: that augmented view)
+        
+        Returns:
+            Tuple of (cache keys of the valid images, boolean mask over image_paths)
+        """
+        cache = self.get_feature_cache()
+        # Keys stat every image, so work out what is missing once.
+        missing = cache.missing(cache.keys_for(image_paths)) if view == 0 and self.extraction_workers > 1 else []
+        if missing:
+            runner = ShardedExtractionRunner(
+                extractor_path=self.models_dir / "feature_extractor.h5",
+                cache_dir=self.cache_dir,
+                fingerprint=cache.fingerprint,
+                batch_size=batch_size,
+                num_workers=self.extraction_workers,
+                shard_dir=self.dataset.shard_store.shard_dir if self.dataset.shard_store is not None else None
+            )
+            with self._stage("parallel_extraction", items=len(missing)):
+                runner.run(image_paths)
+            cache.refresh()
+        
+        def compute(batch_paths):
+            started = time.perf_counter()
+            images, loaded = self.dataset.load_images_to_memory(batch_paths, return_mask=True)
+            if len(images) == 0:
+                return np.empty((0, 0), dtype=np.float32), loaded
+            if view > 0:
+                loaded_paths = [p for p, ok in zip(batch_paths, loaded) if ok]
+                images = np.stack([
+                    augment_image(image, augmentation_seed(str(path), view))
+                    for image, path in zip(images, loaded_paths)
+                ])
+            decoded = time.perf_counter()
+            features = self.feature_extractor.extract_features(images)
+            if self.telemetry is not None:
+                self.telemetry.accumulate("decode", decoded - started, len(batch_paths))
+                self.telemetry.accumulate("cnn_forward", time.perf_counter() - decoded, len(images))
+            return features, loaded
+        
+        variant = f"aug{view}" if view > 0 else ""
+        with self._stage("feature_extraction", items=len(image_paths)):
+            return cache.ensure(image_paths, compute, batch_size=batch_size, variant=variant)
+    
+    def cache_features(self, image_paths, labels, batch_size=32):
+        """
+        Make sure features for image_paths are in the feature cache
+        
+        Returns:
+            Tuple of (cache keys, labels) for the images that loaded
+        """
         print(f"\n🔍 Extracting features from {len(image_paths)} images...")
         
-        # Load images in batches
-        all_features = []
-        all_labels = []
+        keys, valid = self._ensure_features(image_paths, batch_size=batch_size)
+        # Labels follow the images that actually loaded, so one bad file cannot shift the rest.
+        labels = np.asarray(labels)[valid]
         
-        for i in range(0, len(image_paths), batch_size):
-            batch_paths = image_paths[i:i+batch_size]
-            batch_labels = labels[i:i+batch_size]
-            
-            # Load and preprocess images
-            images = self.dataset.load_images_to_memory(batch_paths)
-            
-            # Extract features
-            features = self.feature_extractor.extract_features(images)
-            all_features.append(features)
-            all_labels.extend(batch_labels)
-            
-            if (i // batch_size + 1) % 5 == 0:
-                print(f"   Processed {i + len(batch_paths)}/{len(image_paths)} images...")
+        return keys, labels
+    
+    def cache_training_views(self, image_paths, labels, num_views, batch_size=32):
+        """
+        Cache the original features plus num_views augmented views per image
+        
+        Each view is one offline pass of the CNN over flipped/brightness/contrast
+        jittered images; head training then samples one view per image per epoch.
+        
+        Returns:
+            Tuple of (original keys, labels, list of augmented key lists aligned with the keys)
+        """
+        print(f"\n🔍 Extracting features from {len(image_paths)} images (+{num_views} augmented views)...")
         
-        features = np.concatenate(all_features, axis=0)
-        labels = np.array(all_labels)
+        _, valid = self._ensure_features(image_paths, batch_size=batch_size)
+        for view in range(1, num_views + 1):
+            print(f"   Augmented view {view}/{num_views}")
+            _, view_valid = self._ensure_features(image_paths, batch_size=batch_size, view=view)
+            valid &= view_valid
+        
+        # Keep only images present in every view so all key lists stay aligned.
+        cache = self.feature_cache
+        paths = [p for p, ok in zip(image_paths, valid) if ok]
+        keys = cache.keys_for(paths)
+        view_keys = [cache.keys_for(paths, variant=f"aug{view}") for view in range(1, num_views + 1)]
+        
+        return keys, np.asarray(labels)[valid], view_keys
+    
+    def extract_features(self, image_paths, labels, batch_size=32):
+        """Extract features from images, reusing cached features where possible"""
+        keys, labels = self.cache_features(image_paths, labels, batch_size=batch_size)
+        features = self.feature_cache.get(keys)
         
         print(f"✅ Extracted features shape: {features.shape}")
         
         return features, labels
     
-    def train_vit_classifier(self, train_features, train_labels, 
-                            val_features, val_labels,
-                            epochs=50, batch_size=32, learning_rate=0.0001):
-        """Train the Vision Transformer Classifier"""
-        print("\n" + "=" * 70)
-        print("🤖 Training Vision Transformer Classifier")
-        print("=" * 70)
-        
-        # Initialize ViT classifier
+    def _build_vit_classifier(self, feature_dim, learning_rate):
+        """Create and compile the ViT classifier head"""
         self.vit_classifier = VisionTransformerClassifier(
-            feature_dim=train_features.shape[1],  # 2560 for hybrid CNN
+            feature_dim=feature_dim,  # 2560 for hybrid CNN
             num_classes=5,
-            num_transformer_blocks=4,
-            num_heads=8,
-            ff_dim=256,
-            dropout_rate=0.1
+            **self.vit_config
         )
-
-        # Handle class imbalance in DR datasets (usually many class 0 and fewer class 3/4).
+        
+        # Compile model
+        self.vit_classifier.model.compile(
+            optimizer=tf.keras.optimizers.Adam(learning_rate=learning_rate),
+            loss='sparse_categorical_crossentropy',
+            metrics=['accuracy']
+        )
+        return self.vit_classifier
+    
+    def _class_weight(self, train_labels):
+        """Balanced class weights for imbalanced DR datasets (usually many class 0 and fewer class 3/4)"""
         unique_classes = np.unique(train_labels)
         weights = compute_class_weight(
             class_weight='balanced',
@@ -150,15 +289,10 @@ class ModelTrainer:
         )
         class_weight = {int(cls): float(w) for cls, w in zip(unique_classes, weights)}
         print(f"   Class weights: {class_weight}")
-        
-        # Compile model
-        self.vit_classifier.model.compile(
-            optimizer=tf.keras.optimizers.Adam(learning_rate=learning_rate),
-            loss='sparse_categorical_crossentropy',
-            metrics=['accuracy']
-        )
-        
-        # Callbacks
+        return class_weight
+    
+    def _training_callbacks(self):
+        """Early stopping, LR schedule, best-weights checkpoint and epoch timing"""
         callbacks = [
             tf.keras.callbacks.EarlyStopping(
                 monitor='val_loss',
@@ -181,57 +315,196 @@ class ModelTrainer:
                 verbose=1
             )
         ]
+        if self.telemetry is not None:
+            callbacks.append(self.telemetry.epoch_callback())
+        return callbacks
+    
+    def _save_vit_classifier(self):
+        self.head = ViTHead(classifier=self.vit_classifier)
+        save_path = save_head(self.head, self.models_dir)
+        print(f"\n💾 Saved ViT classifier to {save_path}")
+    
+    def train_head(self, head_type, train_features, train_labels, val_features, val_labels,
+                   epochs=50, batch_size=32, head_config=None):
+        """
+        Train a lightweight head ("linear", "logreg", "gbt") on feature arrays
+        
+        Returns:
+            Keras History for Keras heads, None otherwise
+        """
+        print("\n" + "=" * 70)
+        print(f"🤖 Training {head_type} classifier head")
+        print("=" * 70)
+        
+        self.head = create_head(head_type, feature_dim=train_features.shape[1], num_classes=5,
+                                **(head_config or {}))
+        callbacks = [self.telemetry.epoch_callback()] if self.telemetry is not None else []
+        print(f"\n🚀 Training on {len(train_features)} samples...")
+        with self._stage("head_training") as stage:
+            result = self.head.fit(
+                train_features, train_labels, val_features, val_labels,
+                epochs=epochs, batch_size=batch_size, callbacks=callbacks, verbose=1
+            )
+            stage["items"] = len(train_features) * result.get("epochs", 1)
+        
+        save_path = save_head(self.head, self.models_dir)
+        print(f"\n💾 Saved {head_type} head to {save_path}")
+        return result.get("history")
+    
+    def train_vit_classifier(self, train_features, train_labels, 
+                            val_features, val_labels,
+                            epochs=50, batch_size=32, learning_rate=0.0001):
+        """Train the Vision Transformer Classifier"""
+        print("\n" + "=" * 70)
+        print("🤖 Training Vision Transformer Classifier")
+        print("=" * 70)
+        
+        self._build_vit_classifier(train_features.shape[1], learning_rate)
+        class_weight = self._class_weight(train_labels)
         
         # Train
         print(f"\n🚀 Training on {len(train_features)} samples...")
         print(f"   Validation: {len(val_features)} samples")
         print(f"   Epochs: {epochs}, Batch size: {batch_size}")
         
-        history = self.vit_classifier.model.fit(
-            train_features, train_labels,
-            validation_data=(val_features, val_labels),
-            epochs=epochs,
-            batch_size=batch_size,
-            class_weight=class_weight,
-            callbacks=callbacks,
-            verbose=1
-        )
+        with self._stage("head_training") as stage:
+            history = self.vit_classifier.model.fit(
+                train_features, train_labels,
+                validation_data=(val_features, val_labels),
+                epochs=epochs,
+                batch_size=batch_size,
+                class_weight=class_weight,
+                callbacks=self._training_callbacks(),
+                verbose=1
+            )
+            stage["items"] = len(train_features) * len(history.history["loss"])
         
         # Save final model
-        save_path = self.models_dir / "vit_classifier.weights.h5"
-        self.vit_classifier.save(str(save_path))
-        print(f"\n💾 Saved ViT classifier to {save_path}")
+        self._save_vit_classifier()
         
         return history
     
-    def evaluate(self, test_features, test_labels):
-        """Evaluate the trained model"""
+    def train_vit_classifier_streaming(self, train_keys, train_labels, val_keys, val_labels,
+                                       epochs=50, batch_size=32, learning_rate=0.0001,
+                                       balanced_sampling=False, shuffle_buffer=4096,
+                                       train_view_keys=None):
+        """
+        Train the Vision Transformer Classifier from memory-mapped cached features
+        
+        Features are streamed from the cache shards through tf.data, so memory use
+        does not grow with the dataset. With balanced_sampling, every class is drawn
+        with equal probability instead of weighting the loss. train_view_keys adds
+        cached augmented views (see cache_training_views), sampled once per epoch.
+        """
         print("\n" + "=" * 70)
-        print("📊 Evaluating Model")
+        print("🤖 Training Vision Transformer Classifier (streaming)")
         print("=" * 70)
         
-        # Evaluate
-        results = self.vit_classifier.model.evaluate(test_features, test_labels, verbose=1)
+        cache = self.feature_cache
+        self._build_vit_classifier(feature_dim(cache, train_keys), learning_rate)
         
-        print(f"\n✅ Test Loss: {results[0]:.4f}")
-        print(f"✅ Test Accuracy: {results[1]:.4f}")
+        steps_per_epoch = None
+        class_weight = None
+        if balanced_sampling:
+            print("   Using class-balanced sampling")
+            train_ds = make_balanced_feature_dataset(
+                cache, train_keys, train_labels, batch_size=batch_size,
+                view_keys=train_view_keys
+            )
+            steps_per_epoch = int(np.ceil(len(train_keys) / batch_size))
+        else:
+            train_ds = make_feature_dataset(
+                cache, train_keys, train_labels,
+                batch_size=batch_size, shuffle=True, shuffle_buffer=shuffle_buffer,
+                view_keys=train_view_keys
+            )
+            class_weight = self._class_weight(train_labels)
+        val_ds = make_feature_dataset(cache, val_keys, val_labels, batch_size=batch_size, shuffle=False)
         
-        # Detailed predictions
-        predictions = self.vit_classifier.predict(test_features)
-        predicted_classes = np.argmax(predictions, axis=1)
+        # Train
+        print(f"\n🚀 Training on {len(train_keys)} samples...")
+        print(f"   Validation: {len(val_keys)} samples")
+        print(f"   Epochs: {epochs}, Batch size: {batch_size}")
         
-        # Confusion matrix
-        from sklearn.metrics import confusion_matrix, classification_report
+        with self._stage("head_training") as stage:
+            history = self.vit_classifier.model.fit(
+                train_ds,
+                validation_data=val_ds,
+                epochs=epochs,
+                steps_per_epoch=steps_per_epoch,
+                class_weight=class_weight,
+                callbacks=self._training_callbacks(),
+                verbose=1
+            )
+            stage["items"] = len(train_keys) * len(history.history["loss"])
         
-        cm = confusion_matrix(test_labels, predicted_classes)
-        print("\n📈 Confusion Matrix:")
-        print(cm)
+        # Save final model
+        self._save_vit_classifier()
         
-        print("\n📋 Classification Report:")
-        class_names = ["No_DR", "Mild", "Moderate", "Severe", "Proliferative_DR"]
-        print(classification_report(test_labels, predicted_classes, target_names=class_names))
+        return history
+    
+    def evaluate(self, test_features, test_labels=None, record_metrics=True):
+        """
+        Evaluate the trained model in one prediction pass
         
-        return results
+        test_features may be an array or a tf.data.Dataset of (features, labels) batches.
+        The report covers the raw argmax and the served decision (calibration +
+        uncertainty gating), is saved as JSON and stored as a ModelMetrics row.
+        """
+        print("\n" + "=" * 70)
+        print("📊 Evaluating Model")
+        print("=" * 70)
+        
+        with self._stage("evaluation") as stage:
+            probabilities, labels = collect_probabilities(self.head, test_features, test_labels)
+            report = evaluate_predictions(labels, probabilities)
+            stage["items"] = len(labels)
+        version = model_version(self.get_feature_cache().fingerprint, self.models_dir / self.head.weights_file)
+        report["model_version"] = version
+        if self.telemetry is not None:
+            self.telemetry.set(model_version=version, test_accuracy=report["accuracy"],
+                               served_accuracy=report["served"]["accuracy"])
+        
+        print(f"\n✅ Test Accuracy: {report['accuracy']:.4f}")
+        print(f"✅ Served accuracy: {report['served']['accuracy']:.4f} "
+              f"at {report['served']['coverage']:.1%} coverage")
+        print("\n📋 Evaluation Report:")
+        print(format_report(report))
+        
+        report_path = self.models_dir / f"evaluation_{version}.json"
+        with open(report_path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n📝 Saved evaluation report to {report_path}")
+        
+        if record_metrics:
+            try:
+                from app.services.metrics import record_model_metrics
+                record_model_metrics(report, version)
+                print(f"💾 Stored metrics for model {version} (served by /api/metrics)")
+            except Exception as e:
+                print(f"⚠️  Could not store metrics in the database: {e}")
+        
+        return report
+    
+    def run_artifacts(self):
+        """Model files written by this run: the feature extractor and the trained head"""
+        if self.head is None:
+            raise RuntimeError("No classifier head was trained in this run")
+        names = ["feature_extractor.h5", HEAD_CONFIG] + self.head.artifacts()
+        return {name: str(self.models_dir / name) for name in names}
+    
+    def publish(self, report):
+        """Publish this run's models as a registry version named after the evaluated model"""
+        # Only what this run wrote: leftovers in models_dir (e.g. an old student_model.h5)
+        # belong to other runs.
+        version = ModelRegistry(models_dir=str(self.models_dir)).publish(
+            self.run_artifacts(), version=report["model_version"],
+            metadata={"source": "train.py", "accuracy": report["accuracy"],
+                      "served_accuracy": report["served"]["accuracy"],
+                      "coverage": report["served"]["coverage"]}
+        )
+        print(f"📦 Published model version {version}; running servers switch to it automatically")
+        return version
     
     def save_training_log(self, history):
         """Save training history"""
@@ -262,63 +535,169 @@ def main():
 
     DATA_DIR = os.getenv("DATA_DIR", "./data")
     MODELS_DIR = os.getenv("MODELS_DIR", "./models_saved")
+    FEATURE_CACHE_DIR = os.getenv("FEATURE_CACHE_DIR", "./feature_cache")
+    EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", "1"))
+    STREAM_FEATURES = os.getenv("STREAM_FEATURES", "true").lower() == "true"
+    BALANCED_SAMPLING = os.getenv("BALANCED_SAMPLING", "false").lower() == "true"
+    AUGMENT_VIEWS = int(os.getenv("AUGMENT_VIEWS", "0"))
+    RECORD_METRICS = os.getenv("RECORD_METRICS", "true").lower() == "true"
+    PUBLISH_MODEL = os.getenv("PUBLISH_MODEL", "true").lower() == "true"
+    # Classifier head: vit (default), linear, logreg or gbt (see compare_heads.py)
+    HEAD_TYPE = os.getenv("HEAD_TYPE", "vit").strip().lower()
+    INTEGRITY_SCAN = os.getenv("INTEGRITY_SCAN", "true").lower() == "true"
+    INTEGRITY_MANIFEST = os.getenv("INTEGRITY_MANIFEST", os.path.join(MODELS_DIR, "image_integrity.csv"))
+    DATASET_MANIFEST = os.getenv(
+        "DATASET_MANIFEST", os.path.join(MODELS_DIR, "dataset_manifest.sqlite")
+    ).strip() or None
     DATA_CSV_PATH = os.getenv("DATA_CSV_PATH", "").strip() or None
     DATA_IMAGES_DIR = os.getenv("DATA_IMAGES_DIR", "").strip() or None
+    DATA_SHARD_DIR = os.getenv("DATA_SHARD_DIR", "").strip() or None
+    
+    VIT_CONFIG_PATH = os.getenv("VIT_CONFIG_PATH", os.path.join(MODELS_DIR, "vit_best_config.json"))
     
     BATCH_SIZE = 32
     VIT_EPOCHS = 50
     LEARNING_RATE = 0.0001
     
-    # Initialize trainer
-    trainer = ModelTrainer(data_dir=DATA_DIR, models_dir=MODELS_DIR)
-    
-    # Step 1: Load dataset
-    if DATA_CSV_PATH is not None or DATA_IMAGES_DIR is not None:
-        print("Using dataset paths from environment...")
-        trainer.dataset = RetinalDataset(data_dir=DATA_DIR, image_size=(224, 224))
-        trainer.dataset.load_from_csv(csv_path=DATA_CSV_PATH, images_dir=DATA_IMAGES_DIR)
-    else:
-        trainer.load_dataset()
-    
-    # Step 2: Split data
-    train_paths, train_labels, val_paths, val_labels, test_paths, test_labels = \
-        trainer.prepare_data_splits(train_ratio=0.7, val_ratio=0.15, test_ratio=0.15)
-    
-    # Step 3: Train/Load feature extractor
-    trainer.train_feature_extractor(train_paths, train_labels, val_paths, val_labels)
-    
-    # Step 4: Extract features
-    print("\n📦 Extracting features for training set...")
-    train_features, train_labels = trainer.extract_features(train_paths, train_labels, batch_size=BATCH_SIZE)
-    
-    print("\n📦 Extracting features for validation set...")
-    val_features, val_labels = trainer.extract_features(val_paths, val_labels, batch_size=BATCH_SIZE)
+    # Use the best head config from sweep.py when one has been exported
+    vit_config = load_best_config(VIT_CONFIG_PATH)
+    if vit_config:
+        print(f"Using ViT config from {VIT_CONFIG_PATH}: {vit_config}")
+        LEARNING_RATE = vit_config.pop("learning_rate", LEARNING_RATE)
+        BATCH_SIZE = int(vit_config.pop("batch_size", BATCH_SIZE))
     
-    print("\n📦 Extracting features for test set...")
-    test_features, test_labels = trainer.extract_features(test_paths, test_labels, batch_size=BATCH_SIZE)
-    
-    # Step 5: Train ViT classifier
-    history = trainer.train_vit_classifier(
-        train_features, train_labels,
-        val_features, val_labels,
-        epochs=VIT_EPOCHS,
-        batch_size=BATCH_SIZE,
-        learning_rate=LEARNING_RATE
+    # Initialize trainer
+    trainer = ModelTrainer(
+        data_dir=DATA_DIR,
+        models_dir=MODELS_DIR,
+        cache_dir=FEATURE_CACHE_DIR,
+        extraction_workers=EXTRACTION_WORKERS,
+        vit_config=vit_config,
+        telemetry=RunTelemetry("train.py", MODELS_DIR, config={
+            "batch_size": BATCH_SIZE, "epochs": VIT_EPOCHS, "learning_rate": LEARNING_RATE,
+            "vit_config": vit_config, "extraction_workers": EXTRACTION_WORKERS,
+            "head_type": HEAD_TYPE, "stream_features": STREAM_FEATURES, "balanced_sampling": BALANCED_SAMPLING,
+            "augment_views": AUGMENT_VIEWS, "shards": DATA_SHARD_DIR is not None,
+        })
     )
     
-    # Step 6: Evaluate
-    trainer.evaluate(test_features, test_labels)
-    
-    # Step 7: Save training log
-    trainer.save_training_log(history)
+    try:
+        # Step 1: Load dataset
+        if DATA_SHARD_DIR is not None:
+            print(f"Using preprocessed image shards from {DATA_SHARD_DIR}...")
+            with trainer._stage("dataset_discovery") as stage:
+                trainer.dataset = RetinalDataset(data_dir=DATA_DIR, image_size=(224, 224))
+                trainer.dataset.load_from_shards(DATA_SHARD_DIR)
+                stage["items"] = len(trainer.dataset.image_paths)
+        else:
+            if DATA_CSV_PATH is not None or DATA_IMAGES_DIR is not None:
+                print("Using dataset paths from environment...")
+            trainer.load_dataset(
+                csv_path=DATA_CSV_PATH,
+                images_dir=DATA_IMAGES_DIR,
+                manifest_path=DATASET_MANIFEST
+            )
+        
+        # Step 1b: Drop corrupt and duplicate images
+        if INTEGRITY_SCAN:
+            trainer.check_integrity(INTEGRITY_MANIFEST)
+        
+        # Step 2: Split data
+        train_paths, train_labels, val_paths, val_labels, test_paths, test_labels = \
+            trainer.prepare_data_splits(train_ratio=0.7, val_ratio=0.15, test_ratio=0.15)
+        
+        # Step 3: Train/Load feature extractor
+        trainer.train_feature_extractor(train_paths, train_labels, val_paths, val_labels)
+        
+        # Step 4: Extract features
+        if HEAD_TYPE != "vit":
+            # Lightweight heads fit on in-memory feature arrays
+            print("\n📦 Extracting features for training set...")
+            train_features, train_labels = trainer.extract_features(train_paths, train_labels, batch_size=BATCH_SIZE)
+        
+            print("\n📦 Extracting features for validation set...")
+            val_features, val_labels = trainer.extract_features(val_paths, val_labels, batch_size=BATCH_SIZE)
+        
+            print("\n📦 Extracting features for test set...")
+            test_features, test_labels = trainer.extract_features(test_paths, test_labels, batch_size=BATCH_SIZE)
+        
+            # Step 5: Train the selected head
+            history = trainer.train_head(
+                HEAD_TYPE,
+                train_features, train_labels,
+                val_features, val_labels,
+                epochs=VIT_EPOCHS,
+                batch_size=BATCH_SIZE
+            )
+        elif STREAM_FEATURES:
+            print("\n📦 Caching features for training set...")
+            train_view_keys = None
+            if AUGMENT_VIEWS > 0:
+                train_keys, train_labels, train_view_keys = trainer.cache_training_views(
+                    train_paths, train_labels, AUGMENT_VIEWS, batch_size=BATCH_SIZE
+                )
+            else:
+                train_keys, train_labels = trainer.cache_features(train_paths, train_labels, batch_size=BATCH_SIZE)
+        
+            print("\n📦 Caching features for validation set...")
+            val_keys, val_labels = trainer.cache_features(val_paths, val_labels, batch_size=BATCH_SIZE)
+        
+            print("\n📦 Caching features for test set...")
+            test_keys, test_labels = trainer.cache_features(test_paths, test_labels, batch_size=BATCH_SIZE)
+        
+            # Step 5: Train ViT classifier from memory-mapped features
+            history = trainer.train_vit_classifier_streaming(
+                train_keys, train_labels,
+                val_keys, val_labels,
+                epochs=VIT_EPOCHS,
+                batch_size=BATCH_SIZE,
+                learning_rate=LEARNING_RATE,
+                balanced_sampling=BALANCED_SAMPLING,
+                train_view_keys=train_view_keys
+            )
+            test_features = make_feature_dataset(
+                trainer.feature_cache, test_keys, test_labels, batch_size=BATCH_SIZE, shuffle=False
+            )
+        else:
+            print("\n📦 Extracting features for training set...")
+            train_features, train_labels = trainer.extract_features(train_paths, train_labels, batch_size=BATCH_SIZE)
+        
+            print("\n📦 Extracting features for validation set...")
+            val_features, val_labels = trainer.extract_features(val_paths, val_labels, batch_size=BATCH_SIZE)
+        
+            print("\n📦 Extracting features for test set...")
+            test_features, test_labels = trainer.extract_features(test_paths, test_labels, batch_size=BATCH_SIZE)
+        
+            # Step 5: Train ViT classifier
+            history = trainer.train_vit_classifier(
+                train_features, train_labels,
+                val_features, val_labels,
+                epochs=VIT_EPOCHS,
+                batch_size=BATCH_SIZE,
+                learning_rate=LEARNING_RATE
+            )
+        
+        # Step 6: Evaluate and publish to the model registry
+        report = trainer.evaluate(test_features, test_labels, record_metrics=RECORD_METRICS)
+        if PUBLISH_MODEL:
+            trainer.publish(report)
+        
+        # Step 7: Save training log
+        if history is not None:
+            trainer.save_training_log(history)
+    except BaseException:
+        trainer.telemetry.finish(status="failed", record_db=RECORD_METRICS)
+        raise
+    trainer.telemetry.finish(record_db=RECORD_METRICS)
     
     print("\n" + "=" * 70)
     print("🎉 Training Complete!")
     print("=" * 70)
     print(f"\n📁 Models saved in: {MODELS_DIR}/")
     print(f"   - feature_extractor.h5")
-    print(f"   - vit_classifier.weights.h5")
-    print(f"   - vit_best_weights.h5 (best validation accuracy)")
+    print(f"   - {trainer.head.weights_file} (+ head.json)")
+    if HEAD_TYPE == "vit":
+        print(f"   - vit_best_weights.h5 (best validation accuracy)")
     print("\n✅ Models are ready for deployment!")
 
 
@@ -12,6 +12,7 @@ sys.path.append(str(Path(__file__).parent))
 
 from training.dataset_loader import RetinalDataset
 from training.feature_extractor import HybridCNNFeatureExtractor
+from training.feature_cache import FeatureCache
 from training.vit_classifier import VisionTransformerClassifier
 
 print("=" * 70)
@@ -28,7 +29,8 @@ VIT_EPOCHS = 10   # Reduced from 20
 # Load dataset
 print("\nLoading dataset...")
 dataset = RetinalDataset(data_dir="./data", image_size=(224, 224))
-dataset.load_from_csv()
+dataset.load_from_manifest(os.getenv("DATASET_MANIFEST", "./models_saved/dataset_manifest.sqlite"))
+dataset.apply_integrity_manifest(dataset.manifest.integrity_frame())
 
 # Split dataset
 train_paths, train_labels, val_paths, val_labels, test_paths, test_labels = \
@@ -50,20 +52,24 @@ feature_extractor = HybridCNNFeatureExtractor()
 feature_extractor.save("./models_saved/feature_extractor.h5")
 print("Saved feature extractor")
 
+feature_cache = FeatureCache(
+    cache_dir=os.getenv("FEATURE_CACHE_DIR", "./feature_cache"),
+    fingerprint=feature_extractor.fingerprint()
+)
+
 # Extract features with progress
 print("\nExtracting features...")
 
 def extract_batch_features(paths, labels_list, batch_size=16):
-    """Extract features in batches with progress"""
-    all_features = []
-    for i in range(0, len(paths), batch_size):
-        batch_paths = paths[i:i+batch_size]
-        images = dataset.load_images_to_memory(batch_paths)
-        features = feature_extractor.extract_features(images)
-        all_features.append(features)
-        print(f"   {i+len(batch_paths)}/{len(paths)} images processed")
+    """Extract features in batches, skipping images already in the feature cache"""
+    def compute(batch_paths):
+        images, loaded = dataset.load_images_to_memory(batch_paths, return_mask=True)
+        if len(images) == 0:
+            return np.empty((0, 0), dtype=np.float32), loaded
+        return feature_extractor.extract_features(images), loaded
     
-    return np.concatenate(all_features, axis=0), np.array(labels_list)
+    features, valid = feature_cache.get_or_compute(paths, compute, batch_size=batch_size)
+    return features, np.asarray(labels_list)[valid]
 
 print("Train set...")
 train_features, train_labels = extract_batch_features(train_paths, train_labels, BATCH_SIZE)
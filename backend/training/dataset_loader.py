@@ -12,6 +12,9 @@ from typing import Tuple, List, Dict
 from sklearn.model_selection import train_test_split
 import tensorflow as tf
 
+from .image_shards import ImageShardStore
+from .manifest import DatasetManifest
+
 class RetinalDataset:
     """Dataset loader for Kaggle Retinal Disease Classification"""
     
@@ -38,6 +41,8 @@ class RetinalDataset:
         "proliferative_dr": 4,
         "pdr": 4,
     }
+
+    IMAGE_EXTENSIONS = ['.png', '.jpg', '.jpeg', '.PNG', '.JPG', '.JPEG']
     
     def __init__(self, data_dir: str = "./data", image_size: Tuple[int, int] = (224, 224)):
         """
@@ -52,6 +57,11 @@ class RetinalDataset:
         self.images = []
         self.labels = []
         self.image_paths = []
+        self.missing_images = []
+        self.csv_path = None
+        self.images_dir = None
+        self.shard_store = None
+        self.manifest = None
         
     def load_from_csv(self, csv_path: str = None, images_dir: str = None):
         """
@@ -61,12 +71,17 @@ class RetinalDataset:
             csv_path: Path to CSV file (if None, auto-detect)
             images_dir: Path to images directory (if None, auto-detect)
         """
+        # Walk the data directory once; the listing is reused for CSV and image lookups.
+        tree = None
+        if csv_path is None or images_dir is None:
+            tree = self._scan_tree(self.data_dir)
+        
         # Auto-detect CSV file
         if csv_path is None:
-            csv_files = list(self.data_dir.rglob('*.csv'))
+            csv_files = [rel for rel in tree["files"] if rel.endswith('.csv')]
             if not csv_files:
                 raise FileNotFoundError(f"No CSV file found in {self.data_dir}")
-            csv_path = csv_files[0]
+            csv_path = self.data_dir / csv_files[0]
         
         # Load CSV
         df = pd.read_csv(csv_path)
@@ -77,10 +92,9 @@ class RetinalDataset:
         if images_dir is None:
             # Common directory names - search recursively
             for dir_name in ['Training', 'images', 'train', 'data']:
-                test_dirs = list(self.data_dir.rglob(dir_name))
-                for test_dir in test_dirs:
-                    if test_dir.is_dir() and (any(test_dir.glob('*.png')) or any(test_dir.glob('*.jpg'))):
-                        images_dir = test_dir
+                for rel_dir in tree["dirs"]:
+                    if rel_dir.rsplit('/', 1)[-1] == dir_name and rel_dir in tree["image_dirs"]:
+                        images_dir = self.data_dir / rel_dir
                         break
                 if images_dir:
                     break
@@ -88,6 +102,8 @@ class RetinalDataset:
             images_dir = Path(images_dir)
         
         print(f"   Images directory: {images_dir}")
+        self.csv_path = str(csv_path)
+        self.images_dir = str(images_dir) if images_dir else None
 
         image_col = self._detect_image_column(df)
         label_col = self._detect_label_column(df)
@@ -100,37 +116,26 @@ class RetinalDataset:
         print(f"   Using image column: {image_col}")
         print(f"   Using label column: {label_col}")
         
-        # Process each row
-        skipped = 0
-        for idx, row in df.iterrows():
-            image_name = str(row[image_col]).strip()
-            label = row[label_col]
-
-            # Handle common ID-only naming conventions.
-            if Path(image_name).suffix == "":
-                image_name = f"{image_name}.png"
-
-            parsed_label = self._parse_label(label)
-            if parsed_label is None:
-                skipped += 1
-                continue
-            
-            # Find image file
-            image_path = images_dir / image_name if images_dir else self.data_dir / image_name
-            
-            # Try with different extensions if not found
-            if not image_path.exists():
-                for ext in ['.png', '.jpg', '.jpeg', '.PNG', '.JPG', '.JPEG']:
-                    test_path = image_path.with_suffix(ext)
-                    if test_path.exists():
-                        image_path = test_path
-                        break
-            
-            if image_path.exists():
-                self.image_paths.append(str(image_path))
-                self.labels.append(parsed_label)
-            else:
-                skipped += 1
+        # Parse labels column-wise
+        parsed_labels = self._parse_label_column(df[label_col])
+        valid_labels = parsed_labels.notna()
+        skipped = int((~valid_labels).sum())
+        
+        # Resolve image files against a single directory listing
+        base_dir = images_dir if images_dir else self.data_dir
+        image_names = df.loc[valid_labels, image_col].astype(str).str.strip()
+        resolved = self._resolve_image_paths(image_names, base_dir, tree)
+        found = resolved.notna()
+        
+        self.missing_images = image_names[~found].tolist()
+        if self.missing_images:
+            skipped += len(self.missing_images)
+            preview = ", ".join(self.missing_images[:5])
+            print(f"⚠️  {len(self.missing_images)} images listed in the CSV were not found "
+                  f"in {base_dir} (e.g. {preview})")
+        
+        self.image_paths.extend(resolved[found].tolist())
+        self.labels.extend(parsed_labels[valid_labels][found].astype(int).tolist())
 
         if skipped:
             print(f"⚠️  Skipped {skipped} rows due to invalid labels or missing images")
@@ -206,6 +211,122 @@ class RetinalDataset:
 
         return None
     
+    def _scan_tree(self, root: Path) -> Dict:
+        """
+        List a directory tree with a single os.scandir pass
+        
+        Directories are returned in the order Path.rglob visits them, and files
+        in the order Path.rglob('*') yields them, as root-relative POSIX paths.
+        """
+        tree = {"root": Path(root), "dirs": [], "files": [], "image_dirs": set()}
+        stack = [""]
+        while stack:
+            rel_dir = stack.pop()
+            subdirs = []
+            try:
+                with os.scandir(Path(root) / rel_dir) as entries:
+                    for entry in entries:
+                        rel = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                        try:
+                            if entry.is_dir():
+                                tree["dirs"].append(rel)
+                                if not entry.is_symlink():
+                                    subdirs.append(rel)
+                            elif entry.is_file():
+                                tree["files"].append(rel)
+                                if entry.name.endswith(('.png', '.jpg')):
+                                    tree["image_dirs"].add(rel_dir)
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+            stack.extend(reversed(subdirs))
+        return tree
+
+    def _resolve_image_paths(self, image_names: pd.Series, base_dir: Path,
+                             tree: Dict | None = None) -> pd.Series:
+        """
+        Resolve CSV image names to file paths with vectorised lookups
+        
+        Mirrors the per-row rule: names without a suffix get `.png`; if that file
+        does not exist, the suffix is swapped for each of IMAGE_EXTENSIONS in order.
+        
+        Returns:
+            Series of path strings aligned with image_names (NaN where missing)
+        """
+        base_dir = Path(base_dir)
+        if tree is not None and base_dir != tree["root"]:
+            try:
+                prefix = base_dir.relative_to(tree["root"]).as_posix()
+            except ValueError:
+                prefix = None
+            # The listing does not descend into symlinked directories, so reuse it only
+            # when no component between the scan root and base_dir is a symlink.
+            if prefix is None or base_dir.resolve() != tree["root"].resolve() / prefix:
+                tree = None
+            else:
+                prefix = prefix + "/"
+                tree = {
+                    "root": base_dir,
+                    "files": [rel[len(prefix):] for rel in tree["files"] if rel.startswith(prefix)],
+                }
+        if tree is None:
+            tree = self._scan_tree(base_dir)
+        
+        existing = pd.Index(pd.Series(tree["files"], dtype=object).map(os.path.normcase))
+        
+        def split_name(name: str):
+            candidate = Path(name)
+            if candidate.suffix == "":
+                candidate = Path(f"{name}.png")
+            if candidate.is_absolute() or ".." in candidate.parts:
+                return None, None
+            rel = candidate.as_posix()
+            suffix = candidate.suffix
+            return rel, rel[:-len(suffix)] if suffix else rel
+        
+        split = image_names.map(split_name)
+        rel_names = split.str[0]
+        rel_stems = split.str[1]
+        resolved = pd.Series(np.nan, index=image_names.index, dtype=object)
+        
+        simple = rel_names.notna()
+        hit = simple & rel_names.map(os.path.normcase, na_action="ignore").isin(existing)
+        resolved[hit] = rel_names[hit]
+        for ext in self.IMAGE_EXTENSIONS:
+            pending = simple & resolved.isna()
+            if not pending.any():
+                break
+            probes = rel_stems[pending] + ext
+            hit = probes.map(os.path.normcase).isin(existing)
+            resolved[probes.index[hit]] = probes[hit]
+        resolved = resolved.map(lambda rel: str(base_dir / rel), na_action="ignore")
+        
+        # Absolute or parent-relative names fall outside the listing; probe them directly.
+        for idx in image_names.index[~simple]:
+            resolved[idx] = self._probe_image_path(base_dir, image_names[idx])
+        
+        return resolved
+
+    def _probe_image_path(self, base_dir: Path, image_name: str) -> str | None:
+        """Resolve a single image name with filesystem checks"""
+        if Path(image_name).suffix == "":
+            image_name = f"{image_name}.png"
+        image_path = base_dir / image_name
+        if not image_path.exists():
+            for ext in self.IMAGE_EXTENSIONS:
+                test_path = image_path.with_suffix(ext)
+                if test_path.exists():
+                    image_path = test_path
+                    break
+        return str(image_path) if image_path.exists() else None
+
+    def _parse_label_column(self, labels: pd.Series) -> pd.Series:
+        """Column-wise _parse_label; each distinct value is parsed once. Invalid rows are NaN."""
+        unique_values = pd.unique(labels)
+        mapping = {value: self._parse_label(value) for value in unique_values}
+        return labels.map(mapping).astype("float64")
+    
     def load_from_directory(self, split_by_folder: bool = True):
         """
         Load dataset from directory structure
@@ -243,6 +364,90 @@ class RetinalDataset:
         
         return self
     
+    def load_from_shards(self, shard_dir: str):
+        """
+        Load dataset from preprocessed uint8 shards (see build_image_shards.py)
+        
+        Args:
+            shard_dir: Directory containing images_*.npy shards and index.csv
+        """
+        self.shard_store = ImageShardStore(shard_dir)
+        if tuple(self.shard_store.image_size) != tuple(self.image_size):
+            raise ValueError(
+                f"Shards were written at {self.shard_store.image_size}, "
+                f"but dataset expects {self.image_size}"
+            )
+        self.image_paths = self.shard_store.image_paths
+        self.labels = self.shard_store.labels
+        
+        print(f"✅ Loaded {len(self.image_paths)} images from shards in {shard_dir}")
+        print(f"   Label distribution: {dict(pd.Series(self.labels).value_counts().sort_index())}")
+        
+        return self
+    
+    def load_from_manifest(self, manifest_path: str, csv_path: str = None, images_dir: str = None,
+                           workers: int = None):
+        """
+        Load dataset through a persistent manifest
+        
+        CSV discovery and label parsing only run when the CSV or images directory
+        changed since the last run; otherwise paths and labels come straight from
+        the manifest. Images whose size or mtime changed are re-probed.
+        
+        Args:
+            manifest_path: SQLite manifest file
+            csv_path: Path to CSV file (if None, auto-detect)
+            images_dir: Path to images directory (if None, auto-detect)
+            workers: Processes used to probe new or changed images
+        """
+        self.manifest = DatasetManifest(manifest_path)
+        request = {
+            "data_dir": str(self.data_dir),
+            "csv_path": str(csv_path) if csv_path else None,
+            "images_dir": str(images_dir) if images_dir else None,
+        }
+        
+        if self.manifest.is_current(request):
+            self.image_paths, self.labels = self.manifest.labelled_images()
+            print(f"📋 Loaded {len(self.image_paths)} images from manifest {manifest_path}")
+        else:
+            print(f"📋 Dataset changed or manifest missing; rebuilding {manifest_path}")
+            self.load_from_csv(csv_path=csv_path, images_dir=images_dir)
+            self.manifest.sync_labels(self.image_paths, self.labels)
+            self.manifest.record_source(request, {
+                "csv_path": self.csv_path,
+                "images_dir": self.images_dir or str(self.data_dir),
+            })
+        
+        self.manifest.refresh(workers=workers)
+        print(f"   Label distribution: {dict(pd.Series(self.labels).value_counts().sort_index())}")
+        
+        return self
+    
+    def apply_integrity_manifest(self, manifest: pd.DataFrame, drop_duplicates: bool = True):
+        """
+        Drop corrupt (and optionally duplicate) images, keeping labels aligned
+        
+        Args:
+            manifest: Integrity manifest from training.integrity
+            drop_duplicates: Also drop images whose content duplicates an earlier image
+        """
+        records = manifest.drop_duplicates("path").set_index("path")
+        keep = records["ok"].astype(bool)
+        if drop_duplicates:
+            keep &= records["duplicate_of"] == ""
+        keep_paths = set(keep[keep].index)
+        
+        kept = [(path, label) for path, label in zip(self.image_paths, self.labels) if path in keep_paths]
+        removed = len(self.image_paths) - len(kept)
+        self.image_paths = [path for path, _ in kept]
+        self.labels = [label for _, label in kept]
+        
+        if removed:
+            print(f"⚠️  Dropped {removed} corrupt or duplicate images; {len(self.image_paths)} remain")
+        
+        return self
+    
     def split_dataset(self, train_ratio: float = 0.7, val_ratio: float = 0.15, 
                      test_ratio: float = 0.15, random_state: int = 42):
         """
@@ -251,6 +456,9 @@ class RetinalDataset:
         Returns:
             Tuple of (train_paths, train_labels, val_paths, val_labels, test_paths, test_labels)
         """
+        if self.manifest is not None:
+            return self._split_from_manifest(train_ratio, val_ratio, test_ratio, random_state)
+        
         # First split: train + val vs test
         train_val_paths, test_paths, train_val_labels, test_labels = train_test_split(
             self.image_paths, self.labels,
@@ -275,6 +483,30 @@ class RetinalDataset:
         
         return train_paths, train_labels, val_paths, val_labels, test_paths, test_labels
     
+    def _split_from_manifest(self, train_ratio: float, val_ratio: float,
+                             test_ratio: float, random_state: int):
+        """Read the stored split assignment, assigning only images that have none yet"""
+        assignment = self.manifest.splits(
+            self.image_paths, self.labels,
+            train_ratio, val_ratio, test_ratio, random_state
+        )
+        splits = {"train": ([], []), "val": ([], []), "test": ([], [])}
+        for path, label in zip(self.image_paths, self.labels):
+            paths, labels = splits[assignment[path]]
+            paths.append(path)
+            labels.append(label)
+        
+        train_paths, train_labels = splits["train"]
+        val_paths, val_labels = splits["val"]
+        test_paths, test_labels = splits["test"]
+        
+        print(f"\n📊 Dataset split (from manifest):")
+        print(f"   Train: {len(train_paths)} images")
+        print(f"   Val:   {len(val_paths)} images")
+        print(f"   Test:  {len(test_paths)} images")
+        
+        return train_paths, train_labels, val_paths, val_labels, test_paths, test_labels
+    
     def create_tf_dataset(self, image_paths: List[str], labels: List[int], 
                          batch_size: int = 32, shuffle: bool = True,
                          augment: bool = False) -> tf.data.Dataset:
@@ -283,7 +515,7 @@ class RetinalDataset:
         
         Args:
             image_paths: List of image file paths
-            labels: List of labels
+            labels: List of labels (or an array of per-sample target vectors)
             batch_size: Batch size
             shuffle: Whether to shuffle
             augment: Whether to apply data augmentation
@@ -291,6 +523,13 @@ class RetinalDataset:
         Returns:
             tf.data.Dataset
         """
+        def augment_image(image):
+            image = tf.image.random_flip_left_right(image)
+            image = tf.image.random_flip_up_down(image)
+            image = tf.image.random_brightness(image, 0.2)
+            image = tf.image.random_contrast(image, 0.8, 1.2)
+            return image
+        
         def load_and_preprocess(path, label):
             # Read image
             image = tf.io.read_file(path)
@@ -305,13 +544,42 @@ class RetinalDataset:
             
             # Data augmentation (if enabled)
             if augment:
-                image = tf.image.random_flip_left_right(image)
-                image = tf.image.random_flip_up_down(image)
-                image = tf.image.random_brightness(image, 0.2)
-                image = tf.image.random_contrast(image, 0.8, 1.2)
+                image = augment_image(image)
             
             return image, label
         
+        def normalize_shard_image(image, label):
+            # Shards hold resized uint8 pixels; normalise lazily per element.
+            image = tf.cast(image, tf.float32) / 255.0
+            if augment:
+                image = augment_image(image)
+            return image, label
+        
+        if self.shard_store is not None and all(p in self.shard_store for p in image_paths):
+            # Targets come from the caller (they may be soft labels), not the shard index.
+            targets = np.asarray(labels)
+            positions = np.asarray(self.shard_store.positions(image_paths))
+            height, width = self.image_size
+            
+            def rows():
+                # Called once per epoch, so every epoch gets a fresh global order.
+                order = np.random.permutation(len(positions)) if shuffle else np.arange(len(positions))
+                for (image, _), target in zip(self.shard_store.iter_rows(positions[order]), targets[order]):
+                    yield image, target
+            
+            dataset = tf.data.Dataset.from_generator(
+                rows,
+                output_signature=(
+                    tf.TensorSpec(shape=(height, width, 3), dtype=tf.uint8),
+                    tf.TensorSpec(shape=targets.shape[1:], dtype=tf.as_dtype(targets.dtype)),
+                )
+            )
+            if shuffle:
+                dataset = dataset.shuffle(buffer_size=min(len(positions), 4096))
+            dataset = dataset.map(normalize_shard_image, num_parallel_calls=tf.data.AUTOTUNE)
+            dataset = dataset.batch(batch_size)
+            return dataset.prefetch(tf.data.AUTOTUNE)
+        
         # Create dataset
         dataset = tf.data.Dataset.from_tensor_slices((image_paths, labels))
         
@@ -324,27 +592,42 @@ class RetinalDataset:
         
         return dataset
     
-    def load_images_to_memory(self, image_paths: List[str]) -> np.ndarray:
+    def load_images_to_memory(self, image_paths: List[str], return_mask: bool = False):
         """
         Load images into memory as numpy array
         
+        Unreadable images are left out of the array. Pass return_mask=True to get
+        a boolean mask over image_paths so labels can be kept aligned.
+        
         Args:
             image_paths: List of image file paths
+            return_mask: Also return the mask of images that were loaded
             
         Returns:
-            numpy array of shape (N, height, width, 3)
+            numpy array of shape (N, height, width, 3), plus the mask if requested
         """
-        images = []
-        for path in image_paths:
+        height, width = self.image_size
+        images = np.empty((len(image_paths), height, width, 3), dtype=np.float32)
+        
+        # Images already in preprocessed shards skip decoding entirely.
+        loaded = np.zeros(len(image_paths), dtype=bool)
+        if self.shard_store is not None and all(p in self.shard_store for p in image_paths):
+            self.shard_store.read(self.shard_store.positions(image_paths), out=images)
+            loaded[:] = True
+            return (images, loaded) if return_mask else images
+        
+        count = 0
+        for i, path in enumerate(image_paths):
             img = cv2.imread(path)
             if img is not None:
                 img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
                 img = cv2.resize(img, self.image_size)
-                img = img.astype(np.float32) / 255.0
-                images.append(img)
+                np.divide(img, 255.0, out=images[count], dtype=np.float32)
+                loaded[i] = True
+                count += 1
         
-        return np.array(images)
-
+        images = images[:count]
+        return (images, loaded) if return_mask else images
 
 if __name__ == "__main__":
     # Test dataset loader
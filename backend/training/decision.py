@@ -0,0 +1,66 @@
+"""
+Served decision logic
+Calibration and uncertainty gating applied to classifier probabilities, shared by
+PredictionService and offline evaluation so both score the same decisions
+"""
+
+import os
+from typing import Dict, Tuple
+
+import numpy as np
+
+UNCERTAIN_CLASS = -1
+
+# Slightly downweight severe classes; upweight early classes to reduce false severe calls.
+CALIBRATION_WEIGHTS = np.array([1.06, 1.08, 1.00, 0.93, 0.87], dtype=np.float32)
+
+
+def calibrate_probabilities(probabilities: np.ndarray) -> np.ndarray:
+    """Apply lightweight class-wise calibration and renormalize probabilities."""
+    calibrated = probabilities * CALIBRATION_WEIGHTS
+    denom = np.sum(calibrated, axis=1, keepdims=True)
+    denom = np.where(denom == 0, 1.0, denom)
+    return calibrated / denom
+
+
+def decision_thresholds() -> Dict[str, float]:
+    """Gating thresholds from the environment"""
+    return {
+        "confidence": float(os.getenv("PREDICTION_CONFIDENCE_THRESHOLD", "0.62")),
+        "margin": float(os.getenv("PREDICTION_MARGIN_THRESHOLD", "0.08")),
+        "severe_confidence": float(os.getenv("SEVERE_CLASS_CONFIDENCE_THRESHOLD", "0.72")),
+    }
+
+
+def decide_batch(probabilities: np.ndarray, thresholds: Dict[str, float] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Served decisions for a batch of calibrated probabilities
+
+    Args:
+        probabilities: Array of shape (N, num_classes)
+        thresholds: Gating thresholds (default: decision_thresholds())
+
+    Returns:
+        Tuple of (classes with UNCERTAIN_CLASS where gated, top-class confidences)
+    """
+    thresholds = thresholds or decision_thresholds()
+    rows = np.arange(len(probabilities))
+    order = np.argsort(probabilities, axis=1)[:, ::-1]
+    predicted = order[:, 0]
+    confidence = probabilities[rows, predicted]
+    margin = confidence - probabilities[rows, order[:, 1]]
+
+    uncertain = (confidence < thresholds["confidence"]) | (margin < thresholds["margin"])
+    # Guardrail: only return severe/proliferative when evidence is clearly strong.
+    moderate_support = probabilities[:, 1] + probabilities[:, 2]
+    weak_severe = np.isin(predicted, (3, 4)) & (
+        (confidence < thresholds["severe_confidence"]) | (moderate_support > confidence)
+    )
+    classes = np.where(uncertain | weak_severe, UNCERTAIN_CLASS, predicted)
+    return classes.astype(np.int64), confidence.astype(np.float32)
+
+
+def decide(probabilities: np.ndarray, thresholds: Dict[str, float] = None) -> Tuple[int, float]:
+    """Served decision for one calibrated probability vector"""
+    classes, confidences = decide_batch(np.asarray(probabilities)[None, :], thresholds)
+    return int(classes[0]), float(confidences[0])
@@ -0,0 +1,190 @@
+"""
+Knowledge distillation of the hybrid CNN + ViT ensemble into a compact student
+The teacher (HybridCNNFeatureExtractor + VisionTransformerClassifier) labels every
+training image once; its probabilities are cached next to the CNN features and a
+small single-backbone CNN is trained end to end on them.
+"""
+
+import hashlib
+import time
+from typing import Dict, Sequence, Tuple
+
+import numpy as np
+import tensorflow as tf
+from tensorflow import keras
+from tensorflow.keras import layers
+
+from .feature_cache import FeatureCache
+
+
+def teacher_fingerprint(feature_fingerprint: str, head_weights_path: str) -> str:
+    """Cache namespace for teacher outputs: extractor fingerprint + head weights hash"""
+    digest = hashlib.sha1()
+    with open(head_weights_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return f"teacher-{feature_fingerprint}-{digest.hexdigest()[:12]}"
+
+
+def teacher_probabilities(feature_cache: FeatureCache, head, image_paths: Sequence[str],
+                          head_weights_path: str, batch_size: int = 256) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Teacher class probabilities for image_paths, computed once and cached
+
+    CNN features must already be in feature_cache; images without cached features
+    are treated as unreadable.
+
+    Returns:
+        Tuple of (probabilities for the valid images, boolean mask over image_paths)
+    """
+    teacher_cache = FeatureCache(
+        cache_dir=str(feature_cache.root.parent),
+        fingerprint=teacher_fingerprint(feature_cache.fingerprint, head_weights_path),
+        key_mode=feature_cache.key_mode
+    )
+
+    def compute(batch_paths):
+        keys = feature_cache.keys_for(batch_paths)
+        loaded = np.array([key in feature_cache for key in keys], dtype=bool)
+        if not loaded.any():
+            return np.empty((0, 0), dtype=np.float32), loaded
+        features = feature_cache.get([key for key, ok in zip(keys, loaded) if ok])
+        return head.predict(features), loaded
+
+    return teacher_cache.get_or_compute(image_paths, compute, batch_size=batch_size)
+
+
+def build_student(input_shape=(224, 224, 3), num_classes: int = 5, width: int = 32) -> keras.Model:
+    """
+    Compact depthwise-separable CNN that outputs logits
+
+    Args:
+        input_shape: Image shape, pixels in [0, 1]
+        num_classes: Number of DR classes
+        width: Filters in the stem; each stage doubles it
+    """
+    inputs = layers.Input(shape=input_shape)
+    x = layers.Conv2D(width, 3, strides=2, padding="same", use_bias=False)(inputs)
+    x = layers.BatchNormalization()(x)
+    x = layers.ReLU()(x)
+    for stage in range(4):
+        filters = width * 2 ** (stage + 1)
+        for _ in range(2):
+            x = layers.SeparableConv2D(filters, 3, padding="same", use_bias=False)(x)
+            x = layers.BatchNormalization()(x)
+            x = layers.ReLU()(x)
+        x = layers.MaxPooling2D()(x)
+    x = layers.GlobalAveragePooling2D()(x)
+    x = layers.Dropout(0.2)(x)
+    outputs = layers.Dense(num_classes, name="logits")(x)
+    return keras.Model(inputs=inputs, outputs=outputs, name="dr_student")
+
+
+def distillation_loss(num_classes: int = 5, temperature: float = 4.0, alpha: float = 0.7):
+    """
+    Loss over targets packed as [teacher probabilities, one-hot label]
+
+    alpha weights the softened teacher term (scaled by temperature^2, as in
+    Hinton et al.); the rest goes to cross-entropy on the hard label.
+    """
+    def loss(y_true, logits):
+        teacher, hard = y_true[:, :num_classes], y_true[:, num_classes:]
+        # Soften probabilities as softmax(log(p) / T), the same as dividing the teacher logits.
+        soft_teacher = tf.nn.softmax(tf.math.log(teacher + 1e-7) / temperature)
+        soft_student = tf.nn.softmax(logits / temperature)
+        kd = tf.keras.losses.kl_divergence(soft_teacher, soft_student) * temperature ** 2
+        ce = tf.keras.losses.categorical_crossentropy(hard, logits, from_logits=True)
+        return alpha * kd + (1.0 - alpha) * ce
+    return loss
+
+
+def label_accuracy(num_classes: int = 5):
+    """Accuracy against the hard labels packed after the teacher probabilities"""
+    def label_accuracy(y_true, logits):
+        hard = tf.argmax(y_true[:, num_classes:], axis=1)
+        return tf.cast(tf.equal(hard, tf.argmax(logits, axis=1)), tf.float32)
+    return label_accuracy
+
+
+def pack_targets(teacher_probs: np.ndarray, labels: Sequence[int], num_classes: int = 5) -> np.ndarray:
+    """Concatenate teacher probabilities and one-hot labels for distillation_loss"""
+    one_hot = np.eye(num_classes, dtype=np.float32)[np.asarray(labels, dtype=np.int64)]
+    return np.concatenate([np.asarray(teacher_probs, dtype=np.float32), one_hot], axis=1)
+
+
+class StudentClassifier:
+    """Distilled single-CNN classifier; a PredictionService engine (PREDICTION_ENGINE=student)"""
+
+    def __init__(self, model: keras.Model = None, num_classes: int = 5, width: int = 32):
+        self.model = model if model is not None else build_student(num_classes=num_classes, width=width)
+
+    @classmethod
+    def from_file(cls, filepath: str) -> "StudentClassifier":
+        """Load a saved student without building a fresh one first"""
+        return cls(model=keras.models.load_model(filepath, compile=False))
+
+    def predict(self, images: np.ndarray) -> np.ndarray:
+        """Class probabilities for a batch of preprocessed images"""
+        if len(images.shape) == 3:
+            images = np.expand_dims(images, axis=0)
+        return tf.nn.softmax(self.model(images, training=False)).numpy()
+
+    def predict_dataset(self, dataset: tf.data.Dataset) -> np.ndarray:
+        """Class probabilities for a tf.data.Dataset of (image, target) batches"""
+        logits = self.model.predict(dataset.map(lambda images, targets: images), verbose=0)
+        return tf.nn.softmax(logits).numpy()
+
+    def save(self, filepath: str):
+        """Save the student model"""
+        self.model.save(filepath)
+
+    def load(self, filepath: str):
+        """Load the student model"""
+        self.model = keras.models.load_model(filepath, compile=False)
+        return self
+
+
+def _time_per_image(predict_fn, images: np.ndarray) -> float:
+    """Median seconds per single-image call, after one warm-up call"""
+    predict_fn(images[:1])
+    timings = []
+    for image in images:
+        started = time.perf_counter()
+        predict_fn(image[None])
+        timings.append(time.perf_counter() - started)
+    return float(np.median(timings))
+
+
+def distillation_report(student: StudentClassifier, teacher_predict, student_probs: np.ndarray,
+                        teacher_probs: np.ndarray, labels: Sequence[int],
+                        timing_images: np.ndarray) -> Dict:
+    """
+    Compare student and teacher on a held-out split
+
+    Args:
+        student: Trained student
+        teacher_predict: Maps a batch of images to teacher probabilities (for timing)
+        student_probs: Student probabilities for the split
+        teacher_probs: Cached teacher probabilities for the split
+        labels: True labels for the split
+        timing_images: A few preprocessed images used to time single-image inference
+
+    Returns:
+        Dictionary with agreement, accuracies, latencies and speed-up
+    """
+    labels = np.asarray(labels)
+    student_pred = np.argmax(student_probs, axis=1)
+    teacher_pred = np.argmax(teacher_probs, axis=1)
+
+    teacher_latency = _time_per_image(teacher_predict, timing_images)
+    student_latency = _time_per_image(student.predict, timing_images)
+    return {
+        "samples": int(len(labels)),
+        "agreement": float(np.mean(student_pred == teacher_pred)),
+        "teacher_accuracy": float(np.mean(teacher_pred == labels)),
+        "student_accuracy": float(np.mean(student_pred == labels)),
+        "teacher_latency_ms": round(teacher_latency * 1000, 2),
+        "student_latency_ms": round(student_latency * 1000, 2),
+        "speedup": round(teacher_latency / student_latency, 2) if student_latency > 0 else None,
+        "student_params": int(student.model.count_params()),
+    }
@@ -0,0 +1,171 @@
+"""
+Single-pass model evaluation
+Runs one batched prediction over the test set and derives every metric from it:
+accuracy, macro precision/recall/F1, confusion matrix, per-class statistics,
+expected calibration error, and the same metrics for the served decision
+(calibration + uncertainty gating)
+"""
+
+import hashlib
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+from sklearn.metrics import confusion_matrix, precision_recall_fscore_support
+
+from .decision import UNCERTAIN_CLASS, calibrate_probabilities, decide_batch, decision_thresholds
+
+CLASS_NAMES = ["No_DR", "Mild", "Moderate", "Severe", "Proliferative_DR"]
+
+
+def model_version(extractor_fingerprint: str, head_weights_path: str) -> str:
+    """Short version tag: extractor fingerprint + hash of the head weights"""
+    digest = hashlib.sha1()
+    with open(head_weights_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return f"{extractor_fingerprint[:8]}-{digest.hexdigest()[:8]}"
+
+
+def collect_probabilities(model, data, labels: Sequence[int] = None,
+                          batch_size: int = 256) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Predict class probabilities in one pass
+
+    Args:
+        model: Classifier head (training.heads) or anything with predict(features) -> probabilities
+        data: Feature array, or a tf.data.Dataset of (features, labels) batches
+        labels: Labels for a feature array (ignored for datasets)
+        batch_size: Batch size for feature arrays
+
+    Returns:
+        Tuple of (probabilities, labels) in matching order
+    """
+    probs: List[np.ndarray] = []
+    if isinstance(data, np.ndarray):
+        for start in range(0, len(data), batch_size):
+            probs.append(np.asarray(model.predict(data[start:start + batch_size])))
+        return np.concatenate(probs), np.asarray(labels)
+
+    # Streaming datasets may reorder rows, so labels are taken from the same batches.
+    collected: List[np.ndarray] = []
+    for features, batch_labels in data:
+        probs.append(np.asarray(model.predict(np.asarray(features))))
+        collected.append(np.asarray(batch_labels))
+    return np.concatenate(probs), np.concatenate(collected)
+
+
+def expected_calibration_error(labels: np.ndarray, probabilities: np.ndarray, n_bins: int = 15) -> float:
+    """Top-label ECE with equal-width confidence bins"""
+    confidence = probabilities.max(axis=1)
+    correct = probabilities.argmax(axis=1) == labels
+    bins = np.minimum((confidence * n_bins).astype(np.int64), n_bins - 1)
+    ece = 0.0
+    for b in range(n_bins):
+        in_bin = bins == b
+        if in_bin.any():
+            ece += in_bin.mean() * abs(correct[in_bin].mean() - confidence[in_bin].mean())
+    return float(ece)
+
+
+def _classification_metrics(labels: np.ndarray, predicted: np.ndarray, num_classes: int) -> Dict:
+    classes = list(range(num_classes))
+    precision, recall, f1, support = precision_recall_fscore_support(
+        labels, predicted, labels=classes, zero_division=0
+    )
+    return {
+        "accuracy": float(np.mean(predicted == labels)) if len(labels) else 0.0,
+        "precision": float(np.mean(precision)),
+        "recall": float(np.mean(recall)),
+        "f1_score": float(np.mean(f1)),
+        "per_class": {
+            CLASS_NAMES[c] if c < len(CLASS_NAMES) else str(c): {
+                "precision": float(precision[c]),
+                "recall": float(recall[c]),
+                "f1_score": float(f1[c]),
+                "support": int(support[c]),
+            }
+            for c in classes
+        },
+    }
+
+
+def evaluate_predictions(labels: Sequence[int], probabilities: np.ndarray,
+                         thresholds: Dict[str, float] = None, n_bins: int = 15) -> Dict:
+    """
+    Compute every evaluation metric from one probability matrix
+
+    Args:
+        labels: True labels
+        probabilities: Raw classifier probabilities, shape (N, num_classes)
+        thresholds: Gating thresholds for the served decision (default: from env)
+        n_bins: Confidence bins for calibration error
+
+    Returns:
+        Report with raw argmax metrics at the top level and the served decision under "served"
+    """
+    labels = np.asarray(labels, dtype=np.int64)
+    probabilities = np.asarray(probabilities, dtype=np.float64)
+    thresholds = thresholds or decision_thresholds()
+    num_classes = probabilities.shape[1]
+
+    predicted = probabilities.argmax(axis=1)
+    report = _classification_metrics(labels, predicted, num_classes)
+    report.update(
+        samples=int(len(labels)),
+        confusion_matrix=confusion_matrix(labels, predicted, labels=list(range(num_classes))).tolist(),
+        ece=expected_calibration_error(labels, probabilities, n_bins),
+        nll=float(-np.mean(np.log(probabilities[np.arange(len(labels)), labels] + 1e-12))),
+    )
+
+    # Served decision: calibrated probabilities, then uncertainty gating.
+    calibrated = calibrate_probabilities(probabilities)
+    served_classes, _ = decide_batch(calibrated, thresholds)
+    answered = served_classes != UNCERTAIN_CLASS
+    served = _classification_metrics(labels[answered], served_classes[answered], num_classes)
+    # Rows are true classes; the last column counts images answered "uncertain".
+    served_cm = np.zeros((num_classes, num_classes + 1), dtype=np.int64)
+    np.add.at(served_cm, (labels, np.where(answered, served_classes, num_classes)), 1)
+    served.update(
+        coverage=float(answered.mean()) if len(labels) else 0.0,
+        # Accuracy over all images, counting "uncertain" as not correct.
+        overall_accuracy=float(np.mean(served_classes == labels)) if len(labels) else 0.0,
+        uncertain_rate_per_class={
+            CLASS_NAMES[c] if c < len(CLASS_NAMES) else str(c):
+                float(np.mean(~answered[labels == c])) if (labels == c).any() else 0.0
+            for c in range(num_classes)
+        },
+        confusion_matrix=served_cm.tolist(),
+        ece=expected_calibration_error(labels, calibrated, n_bins),
+        thresholds=thresholds,
+    )
+    report["served"] = served
+    return report
+
+
+def format_report(report: Dict) -> str:
+    """Human-readable summary of an evaluation report"""
+    served = report["served"]
+    lines = [
+        f"Samples: {report['samples']}",
+        f"Accuracy: {report['accuracy']:.4f}   Macro P/R/F1: "
+        f"{report['precision']:.4f} / {report['recall']:.4f} / {report['f1_score']:.4f}",
+        f"ECE: {report['ece']:.4f}   NLL: {report['nll']:.4f}",
+        "",
+        f"{'Class':18s} {'Prec':>6s} {'Rec':>6s} {'F1':>6s} {'Support':>8s} {'Uncertain':>10s}",
+    ]
+    for name, stats in report["per_class"].items():
+        lines.append(
+            f"{name:18s} {stats['precision']:6.3f} {stats['recall']:6.3f} {stats['f1_score']:6.3f} "
+            f"{stats['support']:8d} {served['uncertain_rate_per_class'][name]:10.1%}"
+        )
+    lines += [
+        "",
+        "Confusion matrix (rows = true, columns = predicted):",
+        *[" ".join(f"{v:5d}" for v in row) for row in report["confusion_matrix"]],
+        "",
+        f"Served decision: coverage {served['coverage']:.1%}, accuracy when answered "
+        f"{served['accuracy']:.4f}, overall {served['overall_accuracy']:.4f}, macro F1 {served['f1_score']:.4f}",
+        "Served confusion matrix (last column = uncertain):",
+        *[" ".join(f"{v:5d}" for v in row) for row in served["confusion_matrix"]],
+    ]
+    return "\n".join(lines)
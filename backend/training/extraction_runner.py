@@ -0,0 +1,325 @@
+"""
+Sharded multi-process feature extraction with checkpoint/resume
+Splits an image list into fixed work units, runs them on N worker processes
+(each pinned to its own cores with its own TensorFlow thread budget) and writes
+every finished unit atomically into the feature cache. Claim files in the shared
+cache directory let several machines work on the same plan.
+"""
+
+import hashlib
+import json
+import multiprocessing as mp
+import os
+import socket
+import time
+from pathlib import Path
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+from .feature_cache import FeatureCache
+
+
+def _split_cores(num_workers: int) -> List[List[int]]:
+    """Divide the cores this process may use into one disjoint set per worker"""
+    if hasattr(os, "sched_getaffinity"):
+        cores = sorted(os.sched_getaffinity(0))
+    else:
+        cores = list(range(os.cpu_count() or 1))
+    num_workers = max(1, min(num_workers, len(cores)))
+    return [cores[i::num_workers] for i in range(num_workers)]
+
+
+def _unit_shard_name(plan_id: str, unit: Dict) -> str:
+    return f"{FeatureCache.SHARD_PREFIX}{plan_id}-{unit['unit']:05d}"
+
+
+def _unit_done(cache: FeatureCache, plan_id: str, unit: Dict) -> bool:
+    """A unit is done once its shard is committed (even if some images were unreadable)"""
+    shard_name = _unit_shard_name(plan_id, unit)
+    return (cache.root / f"{shard_name}.keys.json").exists() or not cache.missing(unit["keys"])
+
+
+def _write_json_atomic(path: Path, payload: Dict):
+    tmp_path = path.with_name(f"{path.name}.tmp-{os.getpid()}")
+    with open(tmp_path, "w") as f:
+        json.dump(payload, f)
+    os.replace(tmp_path, path)
+
+
+class ShardedExtractionRunner:
+    """Coordinates resumable feature extraction over a shared feature cache"""
+
+    def __init__(self, extractor_path: str, cache_dir: str = "./feature_cache",
+                 fingerprint: str = None, unit_size: int = 512, batch_size: int = 32,
+                 num_workers: int = None, threads_per_worker: int = None,
+                 claim_timeout: float = 3600.0, key_mode: str = "stat",
+                 image_size=(224, 224), shard_dir: str = None):
+        """
+        Initialize extraction runner
+
+        Args:
+            extractor_path: Saved feature extractor (feature_extractor.h5) loaded by each worker
+            cache_dir: Feature cache root, shared by all machines taking part
+            fingerprint: Extractor fingerprint; computed from extractor_path when None
+            unit_size: Images per work unit (one cache shard per unit)
+            batch_size: Images per forward pass inside a worker
+            num_workers: Worker processes on this machine (default: one per 4 cores)
+            threads_per_worker: TensorFlow intra-op threads per worker (default: its core count)
+            claim_timeout: Seconds after which an unfinished claim from a dead worker is taken over
+            key_mode: Feature cache key mode
+            image_size: Input image size (height, width)
+            shard_dir: Image shards to read instead of the original files (see build_image_shards.py)
+        """
+        self.extractor_path = str(extractor_path)
+        self.cache_dir = cache_dir
+        self.fingerprint = fingerprint
+        self.unit_size = unit_size
+        self.batch_size = batch_size
+        self.num_workers = num_workers or max(1, (os.cpu_count() or 1) // 4)
+        self.threads_per_worker = threads_per_worker
+        self.claim_timeout = claim_timeout
+        self.key_mode = key_mode
+        self.image_size = tuple(image_size)
+        self.shard_dir = str(shard_dir) if shard_dir is not None else None
+        self._identities = None
+
+    def _cache(self) -> FeatureCache:
+        cache = FeatureCache(cache_dir=self.cache_dir, fingerprint=self.fingerprint, key_mode=self.key_mode)
+        if self.shard_dir is not None:
+            if self._identities is None:
+                from .image_shards import ImageShardStore
+                self._identities = ImageShardStore(self.shard_dir).file_identities()
+            cache.use_identities(self._identities)
+        return cache
+
+    def plan(self, image_paths: Sequence[str]) -> Path:
+        """
+        Write (or reuse) the work plan for image_paths
+
+        The plan id depends only on the extractor and the requested images, so every
+        machine running the same job resolves to the same plan directory.
+        """
+        if self.fingerprint is None:
+            from .feature_extractor import HybridCNNFeatureExtractor
+            extractor = HybridCNNFeatureExtractor()
+            extractor.load(self.extractor_path)
+            self.fingerprint = extractor.fingerprint()
+
+        cache = self._cache()
+        keys = cache.keys_for(image_paths)
+        plan_id = hashlib.sha1(
+            (self.fingerprint + "\n" + "\n".join(keys)).encode("utf-8")
+        ).hexdigest()[:16]
+        plan_dir = cache.root / "runs" / plan_id
+        (plan_dir / "claims").mkdir(parents=True, exist_ok=True)
+
+        plan_path = plan_dir / "plan.json"
+        if not plan_path.exists():
+            units = [
+                {
+                    "unit": n,
+                    "paths": [str(p) for p in image_paths[start:start + self.unit_size]],
+                    "keys": keys[start:start + self.unit_size],
+                }
+                for n, start in enumerate(range(0, len(image_paths), self.unit_size))
+            ]
+            _write_json_atomic(plan_path, {
+                "plan_id": plan_id,
+                "fingerprint": self.fingerprint,
+                "created_by": socket.gethostname(),
+                "units": units,
+            })
+        return plan_dir
+
+    def run(self, image_paths: Sequence[str], wait: bool = True, poll_interval: float = 30.0) -> int:
+        """
+        Extract features for every image not yet in the cache
+
+        Args:
+            image_paths: List of image file paths
+            wait: Block until units claimed by other machines finish too
+            poll_interval: Seconds between checks while waiting
+
+        Returns:
+            Number of work units completed by this machine
+        """
+        plan_dir = self.plan(image_paths)
+        with open(plan_dir / "plan.json", "r") as f:
+            units = json.load(f)["units"]
+
+        cache = self._cache()
+        pending = [u for u in units if not _unit_done(cache, plan_dir.name, u)]
+        print(f"🧩 Extraction plan {plan_dir.name}: {len(units) - len(pending)}/{len(units)} units already done")
+        if not pending:
+            return 0
+
+        core_sets = _split_cores(min(self.num_workers, len(pending)))
+        print(f"   Starting {len(core_sets)} workers on {socket.gethostname()}")
+        ctx = mp.get_context("spawn")
+        results = ctx.Queue()
+        workers = [
+            ctx.Process(
+                target=_worker_main,
+                args=(self._worker_config(plan_dir, cores, worker_id), results),
+                name=f"extract-{worker_id}",
+            )
+            for worker_id, cores in enumerate(core_sets)
+        ]
+        for worker in workers:
+            worker.start()
+
+        for worker in workers:
+            worker.join()
+        completed = 0
+        while not results.empty():
+            completed += results.get()
+
+        failed = [w.name for w in workers if w.exitcode != 0]
+        if failed:
+            raise RuntimeError(f"Extraction workers failed: {', '.join(failed)}; rerun to resume")
+
+        cache = self._cache()
+        remaining = [u for u in units if not _unit_done(cache, plan_dir.name, u)]
+        print(f"✅ Completed {completed} units on this machine; {len(remaining)} units still pending elsewhere")
+        if remaining and wait:
+            # Other machines hold the remaining claims; rerunning takes over any that go stale.
+            time.sleep(poll_interval)
+            completed += self.run(image_paths, wait=wait, poll_interval=poll_interval)
+        return completed
+
+    def _worker_config(self, plan_dir: Path, cores: List[int], worker_id: int) -> Dict:
+        return {
+            "plan_dir": str(plan_dir),
+            "cores": cores,
+            "threads": self.threads_per_worker or len(cores),
+            "worker_id": f"{socket.gethostname()}:{os.getpid()}:{worker_id}",
+            "extractor_path": self.extractor_path,
+            "cache_dir": self.cache_dir,
+            "fingerprint": self.fingerprint,
+            "key_mode": self.key_mode,
+            "batch_size": self.batch_size,
+            "claim_timeout": self.claim_timeout,
+            "image_size": self.image_size,
+            "shard_dir": self.shard_dir,
+        }
+
+
+def _claim_owner_dead(claim_path: Path) -> bool:
+    """True when the claim was written by a process on this host that no longer exists"""
+    try:
+        owner = claim_path.read_text().split("\n", 1)[0]
+        host, pid = owner.rsplit(":", 1)
+        pid = int(pid)
+    except (OSError, ValueError):
+        return False  # gone, still being written, or an older claim format
+    if host != socket.gethostname() or os.name == "nt":
+        # Other hosts cannot be checked; on Windows os.kill would terminate the process.
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    except OSError:
+        return False
+    return False
+
+
+def _try_claim(claim_path: Path, worker_id: str, claim_timeout: float) -> bool:
+    """
+    Create the claim file exclusively, taking over claims older than claim_timeout
+    and claims whose process on this host has exited
+
+    The claim holds "<host>:<pid>" of the claiming process, then the worker id.
+    """
+    try:
+        fd = os.open(claim_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        try:
+            age = time.time() - claim_path.stat().st_mtime
+        except FileNotFoundError:
+            return _try_claim(claim_path, worker_id, claim_timeout)
+        if age < claim_timeout and not _claim_owner_dead(claim_path):
+            return False
+        # Stale claim from a crashed worker: move it aside so only one taker wins.
+        stale_path = claim_path.with_name(f"{claim_path.name}.stale-{worker_id.replace(':', '_')}")
+        try:
+            os.replace(claim_path, stale_path)
+        except FileNotFoundError:
+            return False
+        os.remove(stale_path)
+        return _try_claim(claim_path, worker_id, claim_timeout)
+    with os.fdopen(fd, "w") as f:
+        f.write(f"{socket.gethostname()}:{os.getpid()}\n{worker_id}")
+    return True
+
+
+def _worker_main(config: Dict, results):
+    """Entry point of a worker process"""
+    # Pin to the assigned cores and cap thread pools before TensorFlow loads.
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, config["cores"])
+    threads = str(config["threads"])
+    os.environ["OMP_NUM_THREADS"] = threads
+    os.environ["TF_NUM_INTRAOP_THREADS"] = threads
+    os.environ["TF_NUM_INTEROP_THREADS"] = "1"
+
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(config["threads"])
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+    from .dataset_loader import RetinalDataset
+    from .feature_extractor import HybridCNNFeatureExtractor
+
+    plan_dir = Path(config["plan_dir"])
+    with open(plan_dir / "plan.json", "r") as f:
+        plan = json.load(f)
+
+    cache = FeatureCache(cache_dir=config["cache_dir"], fingerprint=config["fingerprint"],
+                         key_mode=config["key_mode"])
+    dataset = RetinalDataset(image_size=tuple(config["image_size"]))
+    if config.get("shard_dir"):
+        dataset.load_from_shards(config["shard_dir"])
+    extractor = None
+    completed = 0
+
+    try:
+        for unit in plan["units"]:
+            if _unit_done(cache, plan["plan_id"], unit):
+                continue
+            claim_path = plan_dir / "claims" / f"unit-{unit['unit']:05d}.claim"
+            if not _try_claim(claim_path, config["worker_id"], config["claim_timeout"]):
+                continue
+            # Another worker may have finished the unit and dropped its claim since the check above.
+            if _unit_done(cache, plan["plan_id"], unit):
+                os.remove(claim_path)
+                continue
+
+            try:
+                if extractor is None:
+                    extractor = HybridCNNFeatureExtractor()
+                    extractor.load(config["extractor_path"])
+                    if extractor.fingerprint() != config["fingerprint"]:
+                        raise RuntimeError("Extractor on disk does not match the plan fingerprint")
+
+                keys, features = [], []
+                for start in range(0, len(unit["paths"]), config["batch_size"]):
+                    batch_paths = unit["paths"][start:start + config["batch_size"]]
+                    batch_keys = unit["keys"][start:start + config["batch_size"]]
+                    images, loaded = dataset.load_images_to_memory(batch_paths, return_mask=True)
+                    if len(images):
+                        features.append(extractor.extract_features(images))
+                        keys.extend(key for key, ok in zip(batch_keys, loaded) if ok)
+                    os.utime(claim_path)  # heartbeat
+
+                features = np.concatenate(features, axis=0) if features else np.empty((0, 0), dtype=np.float32)
+                cache.put(keys, features, shard_name=_unit_shard_name(plan["plan_id"], unit))
+                os.remove(claim_path)
+            except BaseException:
+                # Free the unit for an immediate retry instead of waiting out claim_timeout.
+                claim_path.unlink(missing_ok=True)
+                raise
+            completed += 1
+            print(f"   [{config['worker_id']}] unit {unit['unit'] + 1}/{len(plan['units'])} done")
+    finally:
+        results.put(completed)
@@ -0,0 +1,249 @@
+"""
+Persistent on-disk cache for CNN features
+Stores extracted features as memory-mappable .npy shards keyed by image identity
+and the fingerprint of the feature extractor that produced them
+"""
+
+import hashlib
+import json
+import os
+import uuid
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+class FeatureCache:
+    """Sharded feature store shared by training runs"""
+
+    SHARD_PREFIX = "shard-"
+    KEY_MODES = ("stat", "content")
+
+    def __init__(self, cache_dir: str = "./feature_cache", fingerprint: str = "default",
+                 key_mode: str = "stat", shard_size: int = 4096):
+        """
+        Initialize feature cache
+
+        Args:
+            cache_dir: Root directory of the cache
+            fingerprint: Extractor fingerprint; each fingerprint gets its own namespace
+            key_mode: "stat" keys images by path+size+mtime, "content" by a hash of the bytes
+            shard_size: Number of feature rows buffered before a shard is written
+        """
+        if key_mode not in self.KEY_MODES:
+            raise ValueError(f"key_mode must be one of {self.KEY_MODES}, got {key_mode!r}")
+
+        self.root = Path(cache_dir) / fingerprint
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.fingerprint = fingerprint
+        self.key_mode = key_mode
+        self.shard_size = shard_size
+        self._index: Dict[str, Tuple[str, int]] = {}
+        self._shards: Dict[str, np.ndarray] = {}
+        self._identities: Dict[str, Dict] = {}
+        self.refresh()
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._index
+
+    def refresh(self):
+        """Rebuild the in-memory index from committed shards on disk"""
+        self._index = {}
+        self._shards = {}
+        for keys_file in sorted(self.root.glob(f"{self.SHARD_PREFIX}*.keys.json")):
+            shard_name = keys_file.name[:-len(".keys.json")]
+            if not (self.root / f"{shard_name}.npy").exists():
+                continue
+            with open(keys_file, "r") as f:
+                keys = json.load(f)
+            for row, key in enumerate(keys):
+                self._index[key] = (shard_name, row)
+        return self
+
+    def use_identities(self, identities: Dict[str, Dict]):
+        """
+        Key these images by recorded file identities instead of reading the files
+
+        Args:
+            identities: path -> {"size", "mtime_ns", "sha1"}, as recorded in an
+                image shard index; keys match those built from the files themselves
+        """
+        self._identities = dict(identities)
+        return self
+
+    @staticmethod
+    def image_key(image_path: str, key_mode: str = "stat", variant: str = "",
+                  recorded: Optional[Dict] = None) -> str:
+        """Build the cache key for an image file (from its recorded identity if given)"""
+        if key_mode == "content":
+            if recorded is not None and recorded.get("sha1"):
+                sha1 = recorded["sha1"]
+            else:
+                digest = hashlib.sha1()
+                with open(image_path, "rb") as f:
+                    for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                        digest.update(chunk)
+                sha1 = digest.hexdigest()
+            identity = f"sha1:{sha1}"
+        else:
+            if recorded is not None:
+                size, mtime_ns = recorded["size"], recorded["mtime_ns"]
+            else:
+                stat = os.stat(image_path)
+                size, mtime_ns = stat.st_size, stat.st_mtime_ns
+            identity = f"{os.path.abspath(image_path)}|{size}|{mtime_ns}"
+
+        if variant:
+            identity = f"{identity}#{variant}"
+        return hashlib.sha1(identity.encode("utf-8")).hexdigest()
+
+    def keys_for(self, image_paths: Sequence[str], variant: str = "") -> List[str]:
+        """Cache keys for a list of image paths"""
+        return [
+            self.image_key(path, self.key_mode, variant, self._identities.get(path))
+            for path in image_paths
+        ]
+
+    def missing(self, keys: Sequence[str]) -> List[int]:
+        """Indices of keys that are not cached yet"""
+        return [i for i, key in enumerate(keys) if key not in self._index]
+
+    def open_shard(self, shard_name: str) -> np.ndarray:
+        """Read-only memory map of a committed shard"""
+        if shard_name not in self._shards:
+            self._shards[shard_name] = np.load(self.root / f"{shard_name}.npy", mmap_mode="r")
+        return self._shards[shard_name]
+
+    def locate(self, keys: Sequence[str]) -> List[Tuple[str, int]]:
+        """Shard name and row for each key"""
+        return [self._index[key] for key in keys]
+
+    def get(self, keys: Sequence[str]) -> np.ndarray:
+        """
+        Gather cached features for the given keys
+
+        Returns:
+            numpy array of shape (N, feature_dim)
+        """
+        locations = self.locate(keys)
+        if not locations:
+            return np.empty((0, 0), dtype=np.float32)
+
+        first = self.open_shard(locations[0][0])
+        out = np.empty((len(keys), first.shape[1]), dtype=first.dtype)
+
+        # Group rows by shard so each memory map is read with one fancy index.
+        by_shard: Dict[str, List[Tuple[int, int]]] = {}
+        for i, (shard_name, row) in enumerate(locations):
+            by_shard.setdefault(shard_name, []).append((i, row))
+        for shard_name, pairs in by_shard.items():
+            positions = np.fromiter((p for p, _ in pairs), dtype=np.int64, count=len(pairs))
+            rows = np.fromiter((r for _, r in pairs), dtype=np.int64, count=len(pairs))
+            out[positions] = self.open_shard(shard_name)[rows]
+        return out
+
+    def put(self, keys: Sequence[str], features: np.ndarray, shard_name: str = None) -> str:
+        """
+        Atomically write a new shard
+
+        The .npy file is written first and the key list last, so a shard only
+        becomes visible once both files are complete.
+        """
+        features = np.asarray(features, dtype=np.float32)
+        if len(keys) != len(features):
+            raise ValueError(f"Got {len(features)} feature rows for {len(keys)} keys")
+
+        shard_name = shard_name or f"{self.SHARD_PREFIX}{uuid.uuid4().hex}"
+        tmp_tag = f".tmp-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+        data_path = self.root / f"{shard_name}.npy"
+        tmp_data_path = self.root / f"{shard_name}{tmp_tag}.npy"
+        np.save(tmp_data_path, features)
+        os.replace(tmp_data_path, data_path)
+
+        keys_path = self.root / f"{shard_name}.keys.json"
+        tmp_keys_path = self.root / f"{shard_name}{tmp_tag}.keys.json"
+        with open(tmp_keys_path, "w") as f:
+            json.dump(list(keys), f)
+        os.replace(tmp_keys_path, keys_path)
+
+        self._shards.pop(shard_name, None)
+        for row, key in enumerate(keys):
+            self._index[key] = (shard_name, row)
+        return shard_name
+
+    def get_or_compute(self, image_paths: Sequence[str], compute_fn: Callable,
+                       batch_size: int = 32, variant: str = "") -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return features for image_paths, computing only images missing from the cache
+
+        Same arguments as ensure().
+
+        Returns:
+            Tuple of (features for the valid images, boolean mask over image_paths)
+        """
+        keys, valid = self.ensure(image_paths, compute_fn, batch_size=batch_size, variant=variant)
+        return self.get(keys), valid
+
+    def ensure(self, image_paths: Sequence[str], compute_fn: Callable,
+               batch_size: int = 32, variant: str = "") -> Tuple[List[str], np.ndarray]:
+        """
+        Make sure features for image_paths are cached, computing only missing images
+
+        Args:
+            image_paths: List of image file paths
+            compute_fn: Maps a batch of paths to (features, loaded_mask), where features
+                has one row per True entry of loaded_mask; may also return just the
+                features array when every image in the batch loads
+            batch_size: Number of images passed to compute_fn at a time
+            variant: Optional tag for alternative views of the same image
+
+        Returns:
+            Tuple of (cache keys of the valid images, boolean mask over image_paths)
+        """
+        keys = self.keys_for(image_paths, variant)
+        missing = self.missing(keys)
+        print(f"   Feature cache: {len(keys) - len(missing)} cached, {len(missing)} to compute")
+
+        valid = np.ones(len(keys), dtype=bool)
+        pending_keys: List[str] = []
+        pending_features: List[np.ndarray] = []
+        pending_rows = 0
+        for n, start in enumerate(range(0, len(missing), batch_size)):
+            batch_idx = missing[start:start + batch_size]
+            batch_paths = [image_paths[i] for i in batch_idx]
+            result = compute_fn(batch_paths)
+            if isinstance(result, tuple):
+                features, loaded = result
+                loaded = np.asarray(loaded, dtype=bool)
+            else:
+                features, loaded = result, np.ones(len(batch_paths), dtype=bool)
+            if len(features) != int(loaded.sum()):
+                raise ValueError(
+                    f"Feature extractor returned {len(features)} rows for {int(loaded.sum())} loaded images"
+                )
+            valid[[i for i, ok in zip(batch_idx, loaded) if not ok]] = False
+            if len(features):
+                pending_keys.extend(keys[i] for i, ok in zip(batch_idx, loaded) if ok)
+                pending_features.append(features)
+                pending_rows += len(features)
+
+            # Flush regularly so an interrupted run keeps the work already done.
+            if pending_rows >= self.shard_size:
+                self.put(pending_keys, np.concatenate(pending_features, axis=0))
+                pending_keys, pending_features, pending_rows = [], [], 0
+
+            if (n + 1) % 5 == 0:
+                print(f"   Processed {start + len(batch_paths)}/{len(missing)} uncached images...")
+
+        if pending_keys:
+            self.put(pending_keys, np.concatenate(pending_features, axis=0))
+
+        if not valid.all():
+            print(f"⚠️  {int((~valid).sum())} images could not be loaded and were skipped")
+
+        return [key for key, ok in zip(keys, valid) if ok], valid
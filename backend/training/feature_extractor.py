@@ -1,4 +1,5 @@
 """Feature extraction using hybrid CNN"""
+import hashlib
 import tensorflow as tf
 from tensorflow import keras
 from tensorflow.keras.applications import VGG16, MobileNet, DenseNet121
@@ -46,6 +47,18 @@ class HybridCNNFeatureExtractor:
             image = np.expand_dims(image, axis=0)
         return self.model.predict(image, verbose=0)
     
+    def fingerprint(self) -> str:
+        """Stable hash of the architecture and weights, used to key cached features"""
+        digest = hashlib.sha1()
+        digest.update(str(self.model.input_shape).encode("utf-8"))
+        for weight in self.model.weights:
+            value = np.asarray(weight.numpy()).ravel()
+            digest.update(str(weight.shape).encode("utf-8"))
+            # A strided sample of each tensor is enough to tell weight sets apart.
+            step = max(1, value.size // 1024)
+            digest.update(np.ascontiguousarray(value[::step]).tobytes())
+        return digest.hexdigest()[:16]
+    
     def save(self, filepath: str):
         """Save the model"""
         self.model.save(filepath)
@@ -0,0 +1,143 @@
+"""
+Streaming tf.data pipelines over cached features
+Reads feature rows from the memory-mapped feature cache shards in chunks, so
+head training never holds the full feature matrix in memory
+"""
+
+from typing import List, Sequence, Tuple
+
+import numpy as np
+import tensorflow as tf
+
+from .feature_cache import FeatureCache
+
+
+def _locate_views(cache: FeatureCache, views: Sequence[Sequence[str]]) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """
+    Shard ids and rows of every view of every sample
+
+    Returns:
+        Tuple of (shard names, shard ids of shape (views, N), rows of shape (views, N))
+    """
+    shard_names: List[str] = []
+    shard_ids = {}
+    ids = np.empty((len(views), len(views[0])), dtype=np.int32)
+    rows = np.empty((len(views), len(views[0])), dtype=np.int64)
+    for v, keys in enumerate(views):
+        for i, (shard_name, row) in enumerate(cache.locate(keys)):
+            if shard_name not in shard_ids:
+                shard_ids[shard_name] = len(shard_names)
+                shard_names.append(shard_name)
+            ids[v, i] = shard_ids[shard_name]
+            rows[v, i] = row
+    return shard_names, ids, rows
+
+
+def _chunk_generator(cache: FeatureCache, views: Sequence[Sequence[str]], labels: np.ndarray,
+                     shuffle: bool, chunk_size: int, seed: int | None, repeat: bool):
+    """
+    Yield (features, labels) chunks, reshuffling shard and row order on every pass
+
+    With several views, each pass draws one view per sample at random.
+    """
+    shard_names, ids, rows = _locate_views(cache, views)
+    rng = np.random.default_rng(seed)
+    samples = np.arange(ids.shape[1])
+    while True:
+        if len(views) > 1:
+            view = rng.integers(len(views), size=len(samples))
+        else:
+            view = np.zeros(len(samples), dtype=np.int64)
+        pass_ids, pass_rows = ids[view, samples], rows[view, samples]
+
+        shard_order = np.unique(pass_ids)
+        if shuffle:
+            rng.shuffle(shard_order)
+        for shard_id in shard_order:
+            members = np.flatnonzero(pass_ids == shard_id)
+            if shuffle:
+                members = rng.permutation(members)
+            shard = cache.open_shard(shard_names[shard_id])
+            for start in range(0, len(members), chunk_size):
+                chunk = members[start:start + chunk_size]
+                # Sorted reads keep page-cache access mostly sequential.
+                chunk = chunk[np.argsort(pass_rows[chunk], kind="stable")]
+                yield np.asarray(shard[pass_rows[chunk]], dtype=np.float32), labels[chunk]
+        if not repeat:
+            return
+
+
+def feature_dim(cache: FeatureCache, keys: Sequence[str]) -> int:
+    shard_name, _ = cache.locate(keys[:1])[0]
+    return int(cache.open_shard(shard_name).shape[1])
+
+
+def _row_dataset(cache: FeatureCache, views: Sequence[Sequence[str]], labels: Sequence[int],
+                 shuffle: bool, shuffle_buffer: int, chunk_size: int,
+                 repeat: bool, seed: int | None) -> tf.data.Dataset:
+    """Unbatched dataset of (feature row, label) pairs"""
+    labels = np.asarray(labels, dtype=np.int32)
+    dim = feature_dim(cache, views[0])
+    dataset = tf.data.Dataset.from_generator(
+        lambda: _chunk_generator(cache, views, labels, shuffle, chunk_size, seed, repeat),
+        output_signature=(
+            tf.TensorSpec(shape=(None, dim), dtype=tf.float32),
+            tf.TensorSpec(shape=(None,), dtype=tf.int32),
+        )
+    ).unbatch()
+    if shuffle:
+        dataset = dataset.shuffle(buffer_size=shuffle_buffer, seed=seed)
+    return dataset
+
+
+def make_feature_dataset(cache: FeatureCache, keys: Sequence[str], labels: Sequence[int],
+                         batch_size: int = 32, shuffle: bool = True,
+                         shuffle_buffer: int = 4096, chunk_size: int = 256,
+                         repeat: bool = False, seed: int = None,
+                         view_keys: Sequence[Sequence[str]] = None) -> tf.data.Dataset:
+    """
+    Stream cached features and labels as a batched tf.data.Dataset
+
+    Args:
+        cache: Feature cache holding every key
+        keys: Cache keys of the samples
+        labels: Labels aligned with keys
+        batch_size: Batch size
+        shuffle: Shuffle shard order, row order and through a shuffle buffer
+        shuffle_buffer: Number of rows held in the shuffle buffer
+        chunk_size: Rows read from a shard per memmap access
+        repeat: Repeat forever (use with steps_per_epoch)
+        seed: Random seed
+        view_keys: Optional augmented views, each a key list aligned with keys;
+            every pass picks one of keys/view_keys per sample
+
+    Returns:
+        tf.data.Dataset of (features, labels) batches
+    """
+    views = [list(keys)] + [list(v) for v in (view_keys or [])]
+    dataset = _row_dataset(cache, views, labels, shuffle, shuffle_buffer, chunk_size, repeat, seed)
+    return dataset.batch(batch_size).prefetch(tf.data.AUTOTUNE)
+
+
+def make_balanced_feature_dataset(cache: FeatureCache, keys: Sequence[str], labels: Sequence[int],
+                                  batch_size: int = 32, shuffle_buffer: int = 1024,
+                                  chunk_size: int = 64, seed: int = None,
+                                  view_keys: Sequence[Sequence[str]] = None) -> tf.data.Dataset:
+    """
+    Infinite stream that draws every class with equal probability
+
+    Replaces class-weighted loss for imbalanced data; pair with steps_per_epoch.
+    """
+    labels = np.asarray(labels)
+    views = [np.asarray(keys)] + [np.asarray(v) for v in (view_keys or [])]
+    per_class = []
+    for cls in np.unique(labels):
+        members = labels == cls
+        per_class.append(_row_dataset(
+            cache, [list(v[members]) for v in views], labels[members],
+            shuffle=True, shuffle_buffer=min(shuffle_buffer, int(members.sum())),
+            chunk_size=chunk_size, repeat=True, seed=seed
+        ))
+    weights = [1.0 / len(per_class)] * len(per_class)
+    dataset = tf.data.Dataset.sample_from_datasets(per_class, weights=weights, seed=seed)
+    return dataset.batch(batch_size).prefetch(tf.data.AUTOTUNE)
@@ -0,0 +1,369 @@
+"""
+Interchangeable classifier heads over the cached CNN features
+Every head maps a feature batch to class probabilities and is saved as its own
+weights file plus a head.json descriptor (type, file, config), so the prediction
+service and training scripts load whichever head was trained last.
+"""
+
+import json
+import os
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+HEAD_CONFIG = "head.json"
+
+
+def _vit_sidecar(weights_file: str) -> str:
+    """Architecture sidecar of ViT weights (VisionTransformerClassifier.config_path)"""
+    return Path(weights_file).with_suffix(".json").name
+
+
+def _balanced_class_weight(labels: np.ndarray) -> Dict[int, float]:
+    from sklearn.utils.class_weight import compute_class_weight
+
+    classes = np.unique(labels)
+    weights = compute_class_weight(class_weight="balanced", classes=classes, y=labels)
+    return {int(c): float(w) for c, w in zip(classes, weights)}
+
+
+class ClassifierHead(ABC):
+    """Common interface: fit, predict probabilities, save/load weights"""
+
+    head_type = None
+    weights_file = None
+
+    def __init__(self, feature_dim: int = 2560, num_classes: int = 5):
+        self.feature_dim = feature_dim
+        self.num_classes = num_classes
+
+    def get_config(self) -> Dict:
+        return {"feature_dim": self.feature_dim, "num_classes": self.num_classes}
+
+    @abstractmethod
+    def fit(self, features: np.ndarray, labels: np.ndarray,
+            val_features: np.ndarray, val_labels: np.ndarray, **kwargs) -> Dict:
+        """Train on feature arrays; returns a dict of training facts"""
+
+    @abstractmethod
+    def predict(self, features: np.ndarray) -> np.ndarray:
+        """Class probabilities, shape (N, num_classes)"""
+
+    @abstractmethod
+    def save_weights(self, filepath: str):
+        ...
+
+    @abstractmethod
+    def load_weights(self, filepath: str):
+        ...
+
+    def artifacts(self) -> List[str]:
+        """Files (besides head.json) that make up a saved head"""
+        return [self.weights_file]
+
+
+class KerasHead(ClassifierHead):
+    """Head backed by a Keras model on feature vectors"""
+
+    def __init__(self, feature_dim: int = 2560, num_classes: int = 5, learning_rate: float = 1e-3):
+        super().__init__(feature_dim, num_classes)
+        self.learning_rate = learning_rate
+        self.model = self._build_model()
+
+    @abstractmethod
+    def _build_model(self):
+        """Uncompiled Keras model from feature vectors to class probabilities"""
+
+    def get_config(self) -> Dict:
+        return {**super().get_config(), "learning_rate": self.learning_rate}
+
+    def fit(self, features, labels, val_features, val_labels, epochs: int = 50,
+            batch_size: int = 32, patience: int = 8, verbose: int = 0, callbacks=None) -> Dict:
+        import tensorflow as tf
+
+        self.model.compile(
+            optimizer=tf.keras.optimizers.Adam(learning_rate=self.learning_rate),
+            loss="sparse_categorical_crossentropy",
+            metrics=["accuracy"]
+        )
+        history = self.model.fit(
+            features, labels,
+            validation_data=(val_features, val_labels),
+            epochs=epochs,
+            batch_size=batch_size,
+            class_weight=_balanced_class_weight(labels),
+            callbacks=[tf.keras.callbacks.EarlyStopping(
+                monitor="val_loss", patience=patience, restore_best_weights=True
+            )] + list(callbacks or []),
+            verbose=verbose
+        )
+        return {"epochs": len(history.history["loss"]), "history": history}
+
+    def predict(self, features, batch_size: int = 256):
+        # Direct calls avoid the per-call overhead of model.predict for small batches.
+        return np.concatenate([
+            np.asarray(self.model(features[start:start + batch_size], training=False))
+            for start in range(0, len(features), batch_size)
+        ]) if len(features) else np.empty((0, self.num_classes), dtype=np.float32)
+
+    def save_weights(self, filepath):
+        self.model.save_weights(filepath)
+
+    def load_weights(self, filepath):
+        self.model.load_weights(filepath)
+
+
+class ViTHead(KerasHead):
+    """The Vision Transformer head (VisionTransformerClassifier)"""
+
+    head_type = "vit"
+    weights_file = "vit_classifier.weights.h5"
+
+    def __init__(self, feature_dim: int = 2560, num_classes: int = 5, learning_rate: float = 1e-4,
+                 classifier=None, **vit_config):
+        """
+        Args:
+            classifier: Existing VisionTransformerClassifier to wrap (otherwise built from vit_config)
+            vit_config: num_transformer_blocks, num_heads, ff_dim, dropout_rate
+        """
+        from .vit_classifier import VisionTransformerClassifier
+
+        self.classifier = classifier or VisionTransformerClassifier(
+            feature_dim=feature_dim, num_classes=num_classes, **vit_config
+        )
+        ClassifierHead.__init__(self, self.classifier.feature_dim, self.classifier.num_classes)
+        self.learning_rate = learning_rate
+        self.model = self._build_model()
+
+    def _build_model(self):
+        return self.classifier.model
+
+    def get_config(self) -> Dict:
+        return {**self.classifier.get_config(), "learning_rate": self.learning_rate}
+
+    def save_weights(self, filepath):
+        # Also writes the architecture sidecar older loaders read.
+        self.classifier.save(filepath)
+
+    def artifacts(self) -> List[str]:
+        return [self.weights_file, _vit_sidecar(self.weights_file)]
+
+
+class LinearHead(KerasHead):
+    """Softmax regression with L2 weight decay"""
+
+    head_type = "linear"
+    weights_file = "linear_head.weights.h5"
+
+    def __init__(self, feature_dim: int = 2560, num_classes: int = 5, learning_rate: float = 1e-3,
+                 l2: float = 1e-4):
+        self.l2 = l2
+        super().__init__(feature_dim, num_classes, learning_rate)
+
+    def _build_model(self):
+        from tensorflow import keras
+        from tensorflow.keras import layers
+
+        inputs = layers.Input(shape=(self.feature_dim,))
+        x = layers.LayerNormalization()(inputs)
+        outputs = layers.Dense(self.num_classes, activation="softmax",
+                               kernel_regularizer=keras.regularizers.l2(self.l2))(x)
+        return keras.Model(inputs=inputs, outputs=outputs)
+
+    def get_config(self) -> Dict:
+        return {**super().get_config(), "l2": self.l2}
+
+
+class SklearnHead(ClassifierHead):
+    """Head backed by a scikit-learn pipeline, saved with joblib"""
+
+    def __init__(self, feature_dim: int = 2560, num_classes: int = 5):
+        super().__init__(feature_dim, num_classes)
+        self.pipeline = None
+
+    @abstractmethod
+    def _build_pipeline(self):
+        """Unfitted scikit-learn pipeline ending in a classifier with predict_proba"""
+
+    def fit(self, features, labels, val_features=None, val_labels=None, **kwargs) -> Dict:
+        from sklearn.utils.class_weight import compute_sample_weight
+
+        self.pipeline = self._build_pipeline()
+        final_step = self.pipeline.steps[-1][0]
+        self.pipeline.fit(features, labels, **{
+            f"{final_step}__sample_weight": compute_sample_weight("balanced", labels)
+        })
+        return {}
+
+    def predict(self, features):
+        probabilities = self.pipeline.predict_proba(features)
+        # Classes missing from the training labels still get a (zero) column.
+        full = np.zeros((len(features), self.num_classes), dtype=np.float32)
+        full[:, self.pipeline.classes_.astype(np.int64)] = probabilities
+        return full
+
+    def save_weights(self, filepath):
+        import joblib
+
+        joblib.dump(self.pipeline, filepath)
+
+    def load_weights(self, filepath):
+        import joblib
+
+        self.pipeline = joblib.load(filepath)
+
+
+class LogisticRegressionHead(SklearnHead):
+    """Standardised multinomial logistic regression"""
+
+    head_type = "logreg"
+    weights_file = "logreg_head.joblib"
+
+    def __init__(self, feature_dim: int = 2560, num_classes: int = 5, C: float = 0.1, max_iter: int = 1000):
+        super().__init__(feature_dim, num_classes)
+        self.C = C
+        self.max_iter = max_iter
+
+    def _build_pipeline(self):
+        from sklearn.linear_model import LogisticRegression
+        from sklearn.pipeline import Pipeline
+        from sklearn.preprocessing import StandardScaler
+
+        return Pipeline([
+            ("scale", StandardScaler()),
+            ("classifier", LogisticRegression(C=self.C, max_iter=self.max_iter)),
+        ])
+
+    def get_config(self) -> Dict:
+        return {**super().get_config(), "C": self.C, "max_iter": self.max_iter}
+
+
+class GradientBoostingHead(SklearnHead):
+    """Histogram gradient boosting over a PCA projection of the features"""
+
+    head_type = "gbt"
+    weights_file = "gbt_head.joblib"
+
+    def __init__(self, feature_dim: int = 2560, num_classes: int = 5, pca_components: int = 64,
+                 max_iter: int = 200, learning_rate: float = 0.1, max_leaf_nodes: int = 15):
+        super().__init__(feature_dim, num_classes)
+        self.pca_components = pca_components
+        self.max_iter = max_iter
+        self.learning_rate = learning_rate
+        self.max_leaf_nodes = max_leaf_nodes
+
+    def _build_pipeline(self):
+        from sklearn.decomposition import PCA
+        from sklearn.ensemble import HistGradientBoostingClassifier
+        from sklearn.pipeline import Pipeline
+
+        return Pipeline([
+            ("pca", PCA(n_components=self.pca_components, random_state=42)),
+            ("classifier", HistGradientBoostingClassifier(
+                max_iter=self.max_iter, learning_rate=self.learning_rate,
+                max_leaf_nodes=self.max_leaf_nodes, early_stopping=True, random_state=42
+            )),
+        ])
+
+    def get_config(self) -> Dict:
+        return {**super().get_config(), "pca_components": self.pca_components, "max_iter": self.max_iter,
+                "learning_rate": self.learning_rate, "max_leaf_nodes": self.max_leaf_nodes}
+
+
+HEAD_TYPES = {
+    head.head_type: head
+    for head in (ViTHead, LinearHead, LogisticRegressionHead, GradientBoostingHead)
+}
+
+
+def create_head(head_type: str, **config) -> ClassifierHead:
+    """Build an untrained head of the given type ("vit", "linear", "logreg", "gbt")"""
+    if head_type not in HEAD_TYPES:
+        raise ValueError(f"Unknown head type {head_type!r}; choose from {sorted(HEAD_TYPES)}")
+    return HEAD_TYPES[head_type](**config)
+
+
+def save_head(head: ClassifierHead, directory) -> Path:
+    """
+    Save a head's weights and point head.json at them
+
+    Returns:
+        Path of the weights file
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    weights_path = directory / head.weights_file
+    head.save_weights(str(weights_path))
+    descriptor = {"head_type": head.head_type, "weights_file": head.weights_file, "config": head.get_config()}
+    tmp = directory / f".{HEAD_CONFIG}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(descriptor, f, indent=2)
+    os.replace(tmp, directory / HEAD_CONFIG)
+    return weights_path
+
+
+def _read_descriptor(directory) -> Dict:
+    """head.json, or the ViT head for directories saved before heads were pluggable"""
+    path = Path(directory) / HEAD_CONFIG
+    if path.exists():
+        with open(path) as f:
+            return json.load(f)
+    # config None: read the ViT architecture sidecar at load time.
+    return {"head_type": "vit", "weights_file": ViTHead.weights_file, "config": None}
+
+
+def head_artifacts(directory) -> List[str]:
+    """File names of the saved head in directory, including head.json when present"""
+    descriptor = _read_descriptor(directory)
+    names = [descriptor["weights_file"]]
+    if descriptor["head_type"] == "vit":
+        names.append(_vit_sidecar(descriptor["weights_file"]))
+    if (Path(directory) / HEAD_CONFIG).exists():
+        names.insert(0, HEAD_CONFIG)
+    return names
+
+
+def has_head(directory) -> bool:
+    descriptor = _read_descriptor(directory)
+    return (Path(directory) / descriptor["weights_file"]).exists()
+
+
+def load_head(directory) -> ClassifierHead:
+    """Load the head saved in directory"""
+    descriptor = _read_descriptor(directory)
+    weights_path = Path(directory) / descriptor["weights_file"]
+    config = descriptor["config"]
+    if config is None:
+        from .vit_classifier import VisionTransformerClassifier
+
+        config = {"feature_dim": 2560, "num_classes": 5, **VisionTransformerClassifier.load_config(weights_path)}
+    head = create_head(descriptor["head_type"], **config)
+    head.load_weights(str(weights_path))
+    return head
+
+
+def batch_latency(head: ClassifierHead, features: np.ndarray, batch_size: int = 32,
+                  repeats: int = 50) -> Dict[str, float]:
+    """
+    Per-batch inference latency of a head, after one warm-up call
+
+    Returns:
+        Dictionary with p50/p95 wall milliseconds and mean CPU milliseconds per batch
+    """
+    batch = np.ascontiguousarray(features[:batch_size])
+    head.predict(batch)
+    wall, cpu = [], []
+    for _ in range(repeats):
+        started, cpu_started = time.perf_counter(), time.process_time()
+        head.predict(batch)
+        wall.append(time.perf_counter() - started)
+        cpu.append(time.process_time() - cpu_started)
+    return {
+        "batch_size": int(len(batch)),
+        "latency_ms_p50": round(float(np.percentile(wall, 50)) * 1000, 3),
+        "latency_ms_p95": round(float(np.percentile(wall, 95)) * 1000, 3),
+        "cpu_ms_per_batch": round(float(np.mean(cpu)) * 1000, 3),
+    }
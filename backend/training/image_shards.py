@@ -0,0 +1,234 @@
+"""
+Preprocessed uint8 image shards
+Stores a dataset as fixed-size memory-mapped (N, height, width, 3) uint8 arrays with a
+CSV sidecar that maps each image to its label, shard and row. The sidecar also records
+each source file's size, mtime and SHA-1, so feature cache keys and the integrity
+manifest can be derived without the original images.
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+
+import cv2
+import numpy as np
+import pandas as pd
+
+INDEX_FILE = "index.csv"
+META_FILE = "meta.json"
+
+
+INDEX_COLUMNS = ["index", "path", "label", "shard", "row",
+                 "file_size", "mtime_ns", "sha1", "width", "height"]
+
+
+def decode_image_uint8(image_path: str, image_size: Tuple[int, int] = (224, 224)) -> np.ndarray | None:
+    """Read an image as resized RGB uint8, or None if it cannot be decoded"""
+    img, _ = read_image_uint8(image_path, image_size)
+    return img
+
+
+def read_image_uint8(image_path: str, image_size: Tuple[int, int] = (224, 224)) -> Tuple[np.ndarray | None, Dict]:
+    """
+    Read an image once for both its pixels and its file identity
+
+    Returns:
+        Tuple of (resized RGB uint8 image or None, dict with file_size, mtime_ns,
+        sha1, width and height of the original)
+    """
+    stat = os.stat(image_path)
+    with open(image_path, "rb") as f:
+        data = f.read()
+    info = {"file_size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+            "sha1": hashlib.sha1(data).hexdigest(), "width": 0, "height": 0}
+    img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        return None, info
+    info["height"], info["width"] = img.shape[:2]
+    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    return cv2.resize(img, image_size), info
+
+
+def write_image_shards(image_paths: Sequence[str], labels: Sequence[int], output_dir: str,
+                       image_size: Tuple[int, int] = (224, 224),
+                       shard_size: int = 1024) -> pd.DataFrame:
+    """
+    Decode, resize and write a dataset as uint8 shards
+
+    Args:
+        image_paths: List of image file paths
+        labels: List of labels aligned with image_paths
+        output_dir: Directory for shards and the index sidecar
+        image_size: Target image size (height, width)
+        shard_size: Maximum number of images per shard
+
+    Returns:
+        The index DataFrame written to index.csv
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    records = []
+    skipped = []
+    for shard_id, start in enumerate(range(0, len(image_paths), shard_size)):
+        batch_paths = image_paths[start:start + shard_size]
+        batch_labels = labels[start:start + shard_size]
+        shard_name = f"images_{shard_id:05d}.npy"
+        tmp_path = output_dir / f"{shard_name}.tmp"
+
+        shard = np.lib.format.open_memmap(
+            tmp_path, mode="w+", dtype=np.uint8,
+            shape=(len(batch_paths), image_size[0], image_size[1], 3)
+        )
+        row = 0
+        for path, label in zip(batch_paths, batch_labels):
+            try:
+                img, info = read_image_uint8(path, image_size)
+            except OSError:
+                img = None
+            if img is None:
+                skipped.append(path)
+                continue
+            shard[row] = img
+            records.append({
+                "index": len(records),
+                "path": str(path),
+                "label": int(label),
+                "shard": shard_name,
+                "row": row,
+                **info,
+            })
+            row += 1
+        shard.flush()
+        del shard
+
+        if row < len(batch_paths):
+            # Compact the shard so it holds only the images that decoded.
+            data = np.load(tmp_path, mmap_mode="r")[:row].copy()
+            np.save(tmp_path, data)
+            os.replace(f"{tmp_path}.npy", tmp_path)
+        os.replace(tmp_path, output_dir / shard_name)
+        print(f"   Wrote {shard_name} ({row} images)")
+
+    index = pd.DataFrame(records, columns=INDEX_COLUMNS)
+    index.to_csv(output_dir / INDEX_FILE, index=False)
+    with open(output_dir / META_FILE, "w") as f:
+        json.dump({
+            "image_size": list(image_size),
+            "num_images": len(index),
+            "shard_size": shard_size,
+            "dtype": "uint8",
+        }, f, indent=2)
+
+    if skipped:
+        print(f"⚠️  Skipped {len(skipped)} unreadable images")
+    return index
+
+
+class ImageShardStore:
+    """Read-only view over a directory of uint8 image shards"""
+
+    def __init__(self, shard_dir: str):
+        self.shard_dir = Path(shard_dir)
+        with open(self.shard_dir / META_FILE, "r") as f:
+            self.meta = json.load(f)
+        self.image_size = tuple(self.meta["image_size"])
+        self.index = pd.read_csv(self.shard_dir / INDEX_FILE, keep_default_na=False,
+                                 dtype={"path": str, "sha1": str})
+        self._positions: Dict[str, int] = {
+            path: i for i, path in enumerate(self.index["path"].tolist())
+        }
+        self._shard_names = self.index["shard"].to_numpy()
+        self._rows = self.index["row"].to_numpy()
+        self._shards: Dict[str, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __contains__(self, image_path: str) -> bool:
+        return image_path in self._positions
+
+    @property
+    def image_paths(self) -> List[str]:
+        return self.index["path"].tolist()
+
+    @property
+    def labels(self) -> List[int]:
+        return self.index["label"].astype(int).tolist()
+
+    def file_identities(self) -> Dict[str, Dict]:
+        """
+        Recorded identity of each source file, for FeatureCache.use_identities()
+
+        Returns:
+            path -> {"size", "mtime_ns", "sha1"}; empty for shards built before
+            identities were recorded
+        """
+        if "mtime_ns" not in self.index.columns:
+            return {}
+        return {
+            path: {"size": int(size), "mtime_ns": int(mtime_ns), "sha1": sha1}
+            for path, size, mtime_ns, sha1 in zip(
+                self.index["path"], self.index["file_size"], self.index["mtime_ns"], self.index["sha1"]
+            )
+        }
+
+    def integrity_frame(self) -> pd.DataFrame:
+        """
+        Integrity manifest (training.integrity format) from the index, without decoding
+
+        Every image in the shards decoded when they were built; duplicates are found
+        from the recorded SHA-1 (not available for shards built before it was recorded).
+        """
+        from . import integrity
+
+        frame = pd.DataFrame({"path": self.index["path"].astype(str), "ok": True, "error": ""})
+        for column, default in (("width", 0), ("height", 0), ("file_size", 0), ("sha1", "")):
+            frame[column] = self.index[column] if column in self.index.columns else default
+        return integrity.mark_duplicates(frame)
+
+    def _shard(self, shard_name: str) -> np.ndarray:
+        if shard_name not in self._shards:
+            self._shards[shard_name] = np.load(self.shard_dir / shard_name, mmap_mode="r")
+        return self._shards[shard_name]
+
+    def positions(self, image_paths: Sequence[str]) -> List[int]:
+        """Index positions for image paths stored in the shards"""
+        return [self._positions[path] for path in image_paths]
+
+    def read(self, positions: Sequence[int], out: np.ndarray = None) -> np.ndarray:
+        """
+        Read images by index position
+
+        Args:
+            positions: Index positions to read
+            out: Optional preallocated output; float outputs are normalised to [0, 1]
+
+        Returns:
+            uint8 array of shape (N, height, width, 3), or `out` when given
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        if out is None:
+            out = np.empty((len(positions), self.image_size[0], self.image_size[1], 3), dtype=np.uint8)
+
+        shard_names = self._shard_names[positions]
+        rows = self._rows[positions]
+        for shard_name in pd.unique(shard_names):
+            mask = shard_names == shard_name
+            block = self._shard(shard_name)[rows[mask]]
+            if out.dtype == np.uint8:
+                out[mask] = block
+            else:
+                out[mask] = block.astype(out.dtype) / 255.0
+        return out
+
+    def iter_rows(self, positions: Sequence[int]):
+        """Yield (uint8 image, label) pairs without materialising the whole split"""
+        labels = self.index["label"].to_numpy()
+        for position in positions:
+            yield (
+                self._shard(self._shard_names[position])[self._rows[position]],
+                int(labels[position]),
+            )
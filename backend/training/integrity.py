@@ -0,0 +1,172 @@
+"""
+Parallel integrity scan for training images
+Decodes every image once across all cores and records dimensions, corruption
+and duplicate content in a manifest that loaders use to skip bad entries
+"""
+
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Sequence
+
+import cv2
+import numpy as np
+import pandas as pd
+
+MANIFEST_COLUMNS = ["path", "ok", "width", "height", "file_size", "sha1", "error", "duplicate_of"]
+
+
+def _init_worker():
+    """Keep OpenCV single-threaded; parallelism comes from the process pool"""
+    cv2.setNumThreads(1)
+
+
+def probe_image(image_path: str) -> Dict:
+    """
+    Read, hash and decode a single image
+
+    Returns:
+        Manifest record for the image
+    """
+    record = {
+        "path": image_path, "ok": False, "width": 0, "height": 0,
+        "file_size": 0, "sha1": "", "error": "",
+    }
+    try:
+        with open(image_path, "rb") as f:
+            data = f.read()
+    except OSError as e:
+        record["error"] = f"unreadable: {e.strerror or e}"
+        return record
+
+    record["file_size"] = len(data)
+    record["sha1"] = hashlib.sha1(data).hexdigest()
+    if not data:
+        record["error"] = "empty file"
+        return record
+
+    img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        record["error"] = "decode failed"
+        return record
+
+    record["height"], record["width"] = img.shape[:2]
+    record["ok"] = True
+    return record
+
+
+def scan_images(image_paths: Sequence[str], workers: int = None) -> pd.DataFrame:
+    """
+    Probe images in parallel worker processes
+
+    Args:
+        image_paths: List of image file paths
+        workers: Number of processes (default: all cores)
+
+    Returns:
+        Manifest DataFrame with one row per path, in input order
+    """
+    image_paths = [str(p) for p in image_paths]
+    workers = workers or os.cpu_count() or 1
+    if not image_paths:
+        return pd.DataFrame(columns=MANIFEST_COLUMNS)
+
+    print(f"🔎 Scanning {len(image_paths)} images on {workers} processes...")
+    if workers == 1:
+        _init_worker()
+        records = [probe_image(path) for path in image_paths]
+    else:
+        # Large chunks amortise IPC; several per worker keep the load balanced.
+        chunksize = max(1, min(256, len(image_paths) // (workers * 8)))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+            records = list(executor.map(probe_image, image_paths, chunksize=chunksize))
+
+    manifest = pd.DataFrame.from_records(records)
+    return mark_duplicates(manifest)
+
+
+def mark_duplicates(manifest: pd.DataFrame) -> pd.DataFrame:
+    """Set duplicate_of to the first path with identical content"""
+    manifest = manifest.copy()
+    readable = manifest["ok"].astype(bool) & (manifest["sha1"] != "")
+    first_path = manifest[readable].groupby("sha1")["path"].transform("first")
+    manifest["duplicate_of"] = ""
+    is_duplicate = first_path != manifest.loc[readable, "path"]
+    manifest.loc[is_duplicate[is_duplicate].index, "duplicate_of"] = first_path[is_duplicate]
+    extra = [column for column in manifest.columns if column not in MANIFEST_COLUMNS]
+    return manifest[MANIFEST_COLUMNS + extra]
+
+
+def summarize(manifest: pd.DataFrame):
+    """Print a short report of scan results"""
+    corrupt = manifest[~manifest["ok"].astype(bool)]
+    duplicates = manifest[manifest["duplicate_of"] != ""]
+    print(f"✅ Integrity scan: {len(manifest) - len(corrupt)}/{len(manifest)} images readable")
+    if len(corrupt):
+        print(f"⚠️  {len(corrupt)} corrupt or unreadable images:")
+        for _, row in corrupt.head(5).iterrows():
+            print(f"   {row['path']}: {row['error']}")
+    if len(duplicates):
+        print(f"⚠️  {len(duplicates)} duplicate images (identical content)")
+
+
+def stat_signature(path) -> List[int] | None:
+    """[size, mtime_ns] of path, or None when it cannot be stat'ed"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def load_or_scan(image_paths: Sequence[str], manifest_path: str, workers: int = None) -> pd.DataFrame:
+    """
+    Load an existing manifest and scan only paths that are new or changed
+
+    Cached records are keyed on each file's (size, mtime), like
+    DatasetManifest.refresh, so a replaced or truncated image is probed again.
+
+    Args:
+        image_paths: List of image file paths
+        manifest_path: CSV file holding the manifest
+        workers: Number of processes for the scan
+
+    Returns:
+        Manifest DataFrame covering image_paths
+    """
+    image_paths = [str(p) for p in image_paths]
+    manifest_file = Path(manifest_path)
+    known = pd.DataFrame(columns=MANIFEST_COLUMNS)
+    if manifest_file.exists():
+        known = pd.read_csv(manifest_file, keep_default_na=False, dtype={"path": str, "sha1": str})
+        known["ok"] = known["ok"].astype(str).str.lower() == "true"
+    if "mtime_ns" not in known.columns:
+        # Manifests written before mtimes were recorded are re-probed once.
+        known["mtime_ns"] = -1
+
+    recorded = {
+        path: [int(size), int(mtime_ns)]
+        for path, size, mtime_ns in zip(known["path"], known["file_size"], known["mtime_ns"])
+    }
+    stale = []
+    for path in dict.fromkeys(image_paths):
+        signature = stat_signature(path)
+        if signature is None or recorded.get(path) != signature:
+            stale.append((path, signature))
+    if stale:
+        stale_paths = [path for path, _ in stale]
+        scanned = scan_images(stale_paths, workers=workers)
+        scanned["mtime_ns"] = [signature[1] if signature else -1 for _, signature in stale]
+        known = known[~known["path"].isin(set(stale_paths))]
+        frames = [frame for frame in (known, scanned) if len(frame)]
+        known = mark_duplicates(pd.concat(frames, ignore_index=True))
+        manifest_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = manifest_file.with_suffix(manifest_file.suffix + ".tmp")
+        known.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, manifest_file)
+    else:
+        print(f"✅ Integrity manifest {manifest_file} covers all {len(image_paths)} images")
+
+    manifest = known.set_index("path").loc[image_paths].reset_index()
+    return manifest[MANIFEST_COLUMNS]
@@ -0,0 +1,233 @@
+"""
+Persistent dataset manifest
+SQLite table of every labelled image with its size, mtime, content hash,
+dimensions, parsed label and split, so training runs can skip dataset
+discovery and only re-probe files that changed
+"""
+
+import hashlib
+import json
+import sqlite3
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+
+import pandas as pd
+from sklearn.model_selection import train_test_split
+
+from . import integrity
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    path TEXT PRIMARY KEY,
+    label INTEGER NOT NULL,
+    size INTEGER,
+    mtime_ns INTEGER,
+    sha1 TEXT,
+    width INTEGER,
+    height INTEGER,
+    ok INTEGER,
+    error TEXT,
+    duplicate_of TEXT,
+    split TEXT,
+    position INTEGER
+);
+CREATE INDEX IF NOT EXISTS ix_images_sha1 ON images (sha1);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+class DatasetManifest:
+    """SQLite-backed record of a labelled image dataset"""
+
+    def __init__(self, db_path: str = "./models_saved/dataset_manifest.sqlite"):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.db_path))
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def get_meta(self, key: str):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set_meta(self, key: str, value):
+        self.conn.execute(
+            "INSERT INTO meta (key, value) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, json.dumps(value))
+        )
+
+    def source_signature(self, source: Dict) -> Dict:
+        """Attach size/mtime of the CSV and images directory to a source description"""
+        signature = dict(source)
+        signature["csv_stat"] = integrity.stat_signature(source["csv_path"]) if source.get("csv_path") else None
+        signature["images_dir_stat"] = (
+            integrity.stat_signature(source["images_dir"]) if source.get("images_dir") else None
+        )
+        return signature
+
+    def is_current(self, request: Dict) -> bool:
+        """True if the stored source matches the request and its files are unchanged"""
+        stored = self.get_meta("source")
+        if stored is None or stored["request"] != request:
+            return False
+        return self.source_signature(stored["resolved"]) == stored["signature"]
+
+    def record_source(self, request: Dict, resolved: Dict):
+        self.set_meta("source", {
+            "request": request,
+            "resolved": resolved,
+            "signature": self.source_signature(resolved),
+        })
+        self.conn.commit()
+
+    def sync_labels(self, image_paths: Sequence[str], labels: Sequence[int]):
+        """Make the manifest hold exactly these images and labels, keeping probe data"""
+        self.conn.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS incoming "
+            "(path TEXT PRIMARY KEY, label INTEGER, position INTEGER)"
+        )
+        self.conn.execute("DELETE FROM incoming")
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO incoming (path, label, position) VALUES (?, ?, ?)",
+            ((str(p), int(l), i) for i, (p, l) in enumerate(zip(image_paths, labels)))
+        )
+        self.conn.execute("DELETE FROM images WHERE path NOT IN (SELECT path FROM incoming)")
+        self.conn.execute(
+            "INSERT INTO images (path, label, position) SELECT path, label, position FROM incoming WHERE true "
+            "ON CONFLICT(path) DO UPDATE SET "
+            "split = CASE WHEN images.label = excluded.label THEN images.split END, "
+            "label = excluded.label, position = excluded.position"
+        )
+        self.conn.execute("DELETE FROM incoming")
+        self.conn.commit()
+
+    def labelled_images(self) -> Tuple[List[str], List[int]]:
+        """Image paths and labels in their original CSV order"""
+        rows = self.conn.execute("SELECT path, label FROM images ORDER BY position").fetchall()
+        return [r[0] for r in rows], [int(r[1]) for r in rows]
+
+    def refresh(self, workers: int = None) -> int:
+        """
+        Re-probe images whose size or mtime changed since the last run
+
+        Returns:
+            Number of images probed
+        """
+        rows = self.conn.execute("SELECT path, size, mtime_ns, sha1 FROM images").fetchall()
+        stale = []
+        for path, size, mtime_ns, sha1 in rows:
+            signature = integrity.stat_signature(path)
+            if sha1 is None or signature is None or signature != [size, mtime_ns]:
+                stale.append((path, signature))
+
+        if not stale:
+            print(f"✅ Dataset manifest up to date ({len(rows)} images)")
+            return 0
+
+        print(f"🔄 Dataset manifest: {len(stale)}/{len(rows)} images new or changed")
+        probed = integrity.scan_images([path for path, _ in stale], workers=workers)
+        updates = []
+        for (path, signature), record in zip(stale, probed.to_dict("records")):
+            size, mtime_ns = signature if signature else (None, None)
+            updates.append((
+                size, mtime_ns, record["sha1"], int(record["width"]), int(record["height"]),
+                int(bool(record["ok"])), record["error"], path
+            ))
+        self.conn.executemany(
+            "UPDATE images SET size = ?, mtime_ns = ?, sha1 = ?, width = ?, height = ?, "
+            "ok = ?, error = ? WHERE path = ?",
+            updates
+        )
+        self._mark_duplicates()
+        self.conn.commit()
+        return len(stale)
+
+    def _mark_duplicates(self):
+        """Point every duplicate at the lexicographically first path with the same content"""
+        self.conn.execute("UPDATE images SET duplicate_of = ''")
+        self.conn.execute(
+            "UPDATE images SET duplicate_of = ("
+            "  SELECT MIN(other.path) FROM images AS other"
+            "  WHERE other.sha1 = images.sha1 AND other.ok = 1"
+            ") WHERE ok = 1 AND sha1 != '' AND path != ("
+            "  SELECT MIN(other.path) FROM images AS other"
+            "  WHERE other.sha1 = images.sha1 AND other.ok = 1"
+            ")"
+        )
+
+    def integrity_frame(self) -> pd.DataFrame:
+        """Manifest rows in the format of training.integrity manifests"""
+        frame = pd.read_sql_query(
+            "SELECT path, ok, width, height, size AS file_size, sha1, error, duplicate_of "
+            "FROM images ORDER BY position",
+            self.conn
+        )
+        frame["ok"] = frame["ok"].fillna(0).astype(bool)
+        frame["error"] = frame["error"].fillna("")
+        frame["duplicate_of"] = frame["duplicate_of"].fillna("")
+        return frame[integrity.MANIFEST_COLUMNS]
+
+    def splits(self, image_paths: Sequence[str], labels: Sequence[int],
+               train_ratio: float, val_ratio: float, test_ratio: float,
+               random_state: int) -> Dict[str, str]:
+        """
+        Stable split assignment for the given images
+
+        The first call (or a call with different ratios) computes a stratified split
+        and stores it. Images added later are assigned by a hash of their content,
+        so existing assignments never move.
+        """
+        params = [train_ratio, val_ratio, test_ratio, random_state]
+        if self.get_meta("split_params") != params:
+            self.conn.execute("UPDATE images SET split = NULL")
+            self.set_meta("split_params", params)
+
+        stored = dict(self.conn.execute("SELECT path, split FROM images WHERE split IS NOT NULL").fetchall())
+        unassigned = [(p, l) for p, l in zip(image_paths, labels) if p not in stored]
+
+        if unassigned and not stored:
+            paths = [p for p, _ in unassigned]
+            split_labels = [l for _, l in unassigned]
+            train_val_paths, test_paths, train_val_labels, _ = train_test_split(
+                paths, split_labels, test_size=test_ratio,
+                stratify=split_labels, random_state=random_state
+            )
+            val_size = val_ratio / (train_ratio + val_ratio)
+            train_paths, val_paths = train_test_split(
+                train_val_paths, test_size=val_size,
+                stratify=train_val_labels, random_state=random_state
+            )
+            assigned = {p: "train" for p in train_paths}
+            assigned.update({p: "val" for p in val_paths})
+            assigned.update({p: "test" for p in test_paths})
+        else:
+            hashes = dict(self.conn.execute("SELECT path, sha1 FROM images").fetchall())
+            assigned = {
+                p: self._hash_split(hashes.get(p) or p, train_ratio, val_ratio, random_state)
+                for p, _ in unassigned
+            }
+
+        if assigned:
+            self.conn.executemany(
+                "UPDATE images SET split = ? WHERE path = ?",
+                ((split, path) for path, split in assigned.items())
+            )
+            self.conn.commit()
+            stored.update(assigned)
+        return stored
+
+    @staticmethod
+    def _hash_split(key: str, train_ratio: float, val_ratio: float, random_state: int) -> str:
+        digest = hashlib.sha1(f"{random_state}:{key}".encode("utf-8")).hexdigest()
+        bucket = int(digest[:8], 16) / 0xFFFFFFFF
+        if bucket < train_ratio:
+            return "train"
+        if bucket < train_ratio + val_ratio:
+            return "val"
+        return "test"
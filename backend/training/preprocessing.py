@@ -1,19 +1,34 @@
 """Preprocessing utilities for retinal images"""
+import zlib
+
 import cv2
 import numpy as np
 
-def is_retinal_image(image_path: str) -> tuple[bool, str]:
+def load_image(image_path: str) -> np.ndarray:
+    """
+    Decode an image file once (BGR, as cv2 reads it).
+    
+    Raises:
+        ValueError: If the file cannot be decoded
+    """
+    img = cv2.imread(image_path)
+    if img is None:
+        raise ValueError(f"Could not read image from {image_path}")
+    return img
+
+def is_retinal_image(image_path: str, image: np.ndarray = None) -> tuple[bool, str]:
     """
     Check if an image appears to be a retinal fundus image.
     
     Args:
         image_path: Path to the image file
+        image: Already decoded BGR image (skips reading image_path)
     
     Returns:
         Tuple of (is_valid, error_message)
     """
     # Read image
-    img = cv2.imread(image_path)
+    img = image if image is not None else cv2.imread(image_path)
     if img is None:
         return False, "Could not read image file"
     
@@ -66,7 +81,8 @@ def is_retinal_image(image_path: str) -> tuple[bool, str]:
     
     return True, ""
 
-def preprocess_image(image_path: str, target_size: tuple = (224, 224), validate: bool = True) -> np.ndarray:
+def preprocess_image(image_path: str, target_size: tuple = (224, 224), validate: bool = True,
+                     image: np.ndarray = None) -> np.ndarray:
     """
     Preprocess retinal image for model input.
     
@@ -74,6 +90,7 @@ def preprocess_image(image_path: str, target_size: tuple = (224, 224), validate:
         image_path: Path to the image file
         target_size: Target size for the image (height, width)
         validate: Whether to validate if image is a retinal image
+        image: Already decoded BGR image from load_image (skips reading image_path)
     
     Returns:
         Preprocessed image array
@@ -81,17 +98,15 @@ def preprocess_image(image_path: str, target_size: tuple = (224, 224), validate:
     Raises:
         ValueError: If image validation fails
     """
+    # Read image once; validation and preprocessing share the decode
+    img = image if image is not None else load_image(image_path)
+    
     # Validate if it's a retinal image
     if validate:
-        is_valid, error_msg = is_retinal_image(image_path)
+        is_valid, error_msg = is_retinal_image(image_path, image=img)
         if not is_valid:
             raise ValueError(f"Invalid retinal image: {error_msg}")
     
-    # Read image
-    img = cv2.imread(image_path)
-    if img is None:
-        raise ValueError(f"Could not read image from {image_path}")
-    
     # Convert BGR to RGB
     img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
     
@@ -115,3 +130,28 @@ def preprocess_for_cnn(image: np.ndarray) -> np.ndarray:
     """
     # Add batch dimension
     return np.expand_dims(image, axis=0)
+
+def augmentation_seed(image_path: str, view: int) -> int:
+    """Stable seed for one augmented view of an image, so recomputed views match cached ones"""
+    return zlib.crc32(f"{image_path}#aug{view}".encode("utf-8"))
+
+def augment_image(image: np.ndarray, seed: int) -> np.ndarray:
+    """
+    Random flips, brightness and contrast (the create_tf_dataset augmentations) in numpy.
+    
+    Args:
+        image: Preprocessed image array in [0, 1]
+        seed: Random seed for this view
+    
+    Returns:
+        Augmented image array
+    """
+    rng = np.random.default_rng(seed)
+    if rng.random() < 0.5:
+        image = image[:, ::-1]
+    if rng.random() < 0.5:
+        image = image[::-1]
+    image = image + rng.uniform(-0.2, 0.2)
+    mean = image.mean(axis=(0, 1), keepdims=True)
+    image = (image - mean) * rng.uniform(0.8, 1.2) + mean
+    return np.clip(image, 0.0, 1.0).astype(np.float32)
@@ -0,0 +1,172 @@
+"""
+Versioned model registry
+Each published model is an immutable directory models_saved/registry/<version>/
+with a manifest of file digests. A CURRENT file names the version to serve; both
+the version directory and CURRENT are switched with atomic renames, so a reader
+never sees a half-written model.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from .heads import has_head, head_artifacts
+
+# Artifacts a training script leaves in models_dir that make up a servable model.
+MODEL_FILES = [
+    "feature_extractor.h5",
+    "vit_classifier.weights.h5",
+    "vit_classifier.weights.json",
+    "student_model.h5",
+]
+
+
+def file_digest(path) -> str:
+    """SHA-256 of a file, read in 1 MB chunks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _write_atomic(path: Path, text: str):
+    tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    with open(tmp, "w") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class ModelRegistry:
+    """Publishes and resolves immutable model versions"""
+
+    def __init__(self, root: str = None, models_dir: str = "./models_saved"):
+        """
+        Args:
+            root: Registry directory (default: MODEL_REGISTRY_DIR or models_dir/registry)
+            models_dir: Used for the default root
+        """
+        self.root = Path(root or os.getenv("MODEL_REGISTRY_DIR", os.path.join(models_dir, "registry")))
+        self.pointer = self.root / "CURRENT"
+
+    def version_dir(self, version: str) -> Path:
+        return self.root / version
+
+    def current_version(self) -> Optional[str]:
+        """Version named by CURRENT, or None before the first publish"""
+        try:
+            version = self.pointer.read_text().strip()
+        except FileNotFoundError:
+            return None
+        return version or None
+
+    def manifest(self, version: str) -> Dict:
+        with open(self.version_dir(version) / "manifest.json") as f:
+            return json.load(f)
+
+    def versions(self) -> List[Dict]:
+        """Manifests of every published version, newest first"""
+        manifests = []
+        if self.root.exists():
+            for entry in self.root.iterdir():
+                if entry.is_dir() and (entry / "manifest.json").exists():
+                    manifests.append(self.manifest(entry.name))
+        return sorted(manifests, key=lambda m: m["published_at"], reverse=True)
+
+    def _existing_file(self, digest: str) -> Optional[Path]:
+        """A file with this digest in the current version, to hard-link instead of copying"""
+        current = self.current_version()
+        if current is None:
+            return None
+        try:
+            files = self.manifest(current)["files"]
+        except (FileNotFoundError, KeyError, json.JSONDecodeError):
+            return None
+        for name, other in files.items():
+            if other == digest:
+                return self.version_dir(current) / name
+        return None
+
+    def publish(self, files: Dict[str, str], version: str = None, metadata: Dict = None,
+                activate: bool = True) -> str:
+        """
+        Copy model files into a new immutable version
+
+        Args:
+            files: Registry file name -> source path
+            version: Version name (default: timestamp + digest of the files)
+            metadata: Extra facts stored in the manifest (metrics, source script, ...)
+            activate: Point CURRENT at the new version
+
+        Returns:
+            The published version
+        """
+        digests = {name: file_digest(path) for name, path in files.items()}
+        if version is None:
+            combined = hashlib.sha256("".join(f"{n}:{d}" for n, d in sorted(digests.items())).encode())
+            version = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}-{combined.hexdigest()[:8]}"
+
+        target = self.version_dir(version)
+        if target.exists():
+            # Versions are immutable; publishing the same version again only re-activates it.
+            if self.manifest(version)["files"] != digests:
+                raise ValueError(f"Model version {version} already exists with different files")
+        else:
+            self.root.mkdir(parents=True, exist_ok=True)
+            staging = self.root / f".staging-{uuid.uuid4().hex}"
+            staging.mkdir()
+            try:
+                for name, path in files.items():
+                    # Unchanged artifacts (usually the CNN extractor) are hard-linked, not copied.
+                    existing = self._existing_file(digests[name])
+                    if existing is not None:
+                        try:
+                            os.link(existing, staging / name)
+                            continue
+                        except OSError:
+                            pass
+                    shutil.copy2(path, staging / name)
+                manifest = {
+                    "version": version,
+                    "published_at": datetime.now().isoformat(),
+                    "files": digests,
+                    **(metadata or {}),
+                }
+                _write_atomic(staging / "manifest.json", json.dumps(manifest, indent=2, default=str))
+                os.rename(staging, target)
+            except BaseException:
+                shutil.rmtree(staging, ignore_errors=True)
+                raise
+
+        if activate:
+            self.activate(version)
+        return version
+
+    def publish_directory(self, models_dir: str, version: str = None, metadata: Dict = None,
+                          activate: bool = True) -> str:
+        """Publish the MODEL_FILES and the saved classifier head present in models_dir"""
+        names = list(MODEL_FILES)
+        if has_head(models_dir):
+            names += [name for name in head_artifacts(models_dir) if name not in names]
+        files = {
+            name: os.path.join(models_dir, name)
+            for name in names
+            if os.path.exists(os.path.join(models_dir, name))
+        }
+        if not has_head(models_dir) and "student_model.h5" not in files:
+            raise FileNotFoundError(f"No trained classifier found in {models_dir}")
+        return self.publish(files, version=version, metadata=metadata, activate=activate)
+
+    def activate(self, version: str):
+        """Atomically point CURRENT at an existing version"""
+        if not (self.version_dir(version) / "manifest.json").exists():
+            raise FileNotFoundError(f"Model version {version} is not in the registry")
+        self.root.mkdir(parents=True, exist_ok=True)
+        _write_atomic(self.pointer, version + "\n")
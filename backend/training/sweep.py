@@ -0,0 +1,313 @@
+"""
+Parallel hyperparameter sweeps for the ViT head
+Trains many head configurations (optionally over stratified k-fold splits) in
+worker processes that all stream features from the same read-only feature cache.
+Results go to a leaderboard and the best configuration is exported for train.py.
+"""
+
+import hashlib
+import itertools
+import json
+import multiprocessing as mp
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Sequence
+
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import StratifiedKFold
+
+# Keys a sweep may tune; everything except the optimiser settings is passed to
+# VisionTransformerClassifier.
+ARCHITECTURE_KEYS = ("num_transformer_blocks", "num_heads", "ff_dim", "dropout_rate")
+TRAINING_KEYS = ("learning_rate", "batch_size")
+CONFIG_KEYS = ARCHITECTURE_KEYS + TRAINING_KEYS
+
+DEFAULT_SEARCH_SPACE = {
+    "num_transformer_blocks": [2, 4, 6],
+    "num_heads": [4, 8],
+    "ff_dim": [256, 512],
+    "dropout_rate": [0.1, 0.2],
+    "learning_rate": [1e-4, 3e-4],
+}
+
+
+def load_search_space(path: str = None) -> Dict:
+    """
+    Load a search space from JSON
+
+    Each key maps to a list of values, or for random search to
+    {"uniform": [low, high]} / {"log_uniform": [low, high]}.
+    """
+    if not path:
+        return dict(DEFAULT_SEARCH_SPACE)
+    with open(path, "r") as f:
+        space = json.load(f)
+    unknown = set(space) - set(CONFIG_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown search space keys: {sorted(unknown)}")
+    return space
+
+
+def grid_configs(space: Dict) -> List[Dict]:
+    """Every combination of the listed values"""
+    for key, values in space.items():
+        if not isinstance(values, list):
+            raise ValueError(f"Grid search needs a list of values for {key!r}")
+    keys = sorted(space)
+    return [dict(zip(keys, values)) for values in itertools.product(*(space[k] for k in keys))]
+
+
+def random_configs(space: Dict, num_trials: int, seed: int = 42) -> List[Dict]:
+    """num_trials configurations sampled independently from the space"""
+    rng = np.random.default_rng(seed)
+    configs = []
+    for _ in range(num_trials):
+        config = {}
+        for key in sorted(space):
+            values = space[key]
+            if isinstance(values, list):
+                config[key] = values[rng.integers(len(values))]
+            elif "uniform" in values:
+                config[key] = float(rng.uniform(*values["uniform"]))
+            elif "log_uniform" in values:
+                low, high = np.log(values["log_uniform"])
+                config[key] = float(np.exp(rng.uniform(low, high)))
+            else:
+                raise ValueError(f"Unsupported distribution for {key!r}: {values}")
+        configs.append(config)
+    return configs
+
+
+def config_id(config: Dict) -> str:
+    return hashlib.sha1(json.dumps(config, sort_keys=True).encode("utf-8")).hexdigest()[:10]
+
+
+def load_best_config(path: str) -> Dict:
+    """Tuned head config exported by a sweep ({} if there is none)"""
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        exported = json.load(f)
+    return {key: value for key, value in exported["config"].items() if key in CONFIG_KEYS}
+
+
+# Per-process state set up once by _init_worker
+_WORKER: Dict = {}
+
+
+def _init_worker(threads: int, cache_dir: str, fingerprint: str, keys: List[str],
+                 labels: np.ndarray, folds: List[tuple]):
+    """Cap thread pools before TensorFlow loads, then open the shared cache read-only"""
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    os.environ["TF_NUM_INTRAOP_THREADS"] = str(threads)
+    os.environ["TF_NUM_INTEROP_THREADS"] = "1"
+    os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+    from .feature_cache import FeatureCache
+    _WORKER.update(
+        cache=FeatureCache(cache_dir=cache_dir, fingerprint=fingerprint),
+        keys=np.asarray(keys),
+        labels=np.asarray(labels),
+        folds=folds,
+    )
+
+
+def _run_trial(trial: Dict) -> Dict:
+    """Train one config on one fold and report its validation scores"""
+    import tensorflow as tf
+    from sklearn.metrics import f1_score
+    from sklearn.utils.class_weight import compute_class_weight
+
+    from .feature_pipeline import feature_dim, make_feature_dataset
+    from .vit_classifier import VisionTransformerClassifier
+
+    started = time.time()
+    result = {"config_id": trial["config_id"], "fold": trial["fold"], **trial["config"]}
+    try:
+        cache, keys, labels = _WORKER["cache"], _WORKER["keys"], _WORKER["labels"]
+        train_idx, val_idx = _WORKER["folds"][trial["fold"]]
+        config = trial["config"]
+        batch_size = int(config.get("batch_size", trial["batch_size"]))
+        tf.keras.utils.set_random_seed(trial["seed"])
+
+        vit = VisionTransformerClassifier(
+            feature_dim=feature_dim(cache, keys[:1]),
+            num_classes=5,
+            **{key: config[key] for key in ARCHITECTURE_KEYS if key in config}
+        )
+        vit.model.compile(
+            optimizer=tf.keras.optimizers.Adam(learning_rate=float(config.get("learning_rate", 1e-4))),
+            loss="sparse_categorical_crossentropy",
+            metrics=["accuracy"]
+        )
+
+        train_labels, val_labels = labels[train_idx], labels[val_idx]
+        classes = np.unique(train_labels)
+        weights = compute_class_weight(class_weight="balanced", classes=classes, y=train_labels)
+        history = vit.model.fit(
+            make_feature_dataset(cache, keys[train_idx], train_labels, batch_size=batch_size,
+                                 shuffle=True, seed=trial["seed"]),
+            validation_data=make_feature_dataset(cache, keys[val_idx], val_labels,
+                                                 batch_size=batch_size, shuffle=False),
+            epochs=trial["epochs"],
+            class_weight={int(c): float(w) for c, w in zip(classes, weights)},
+            callbacks=[tf.keras.callbacks.EarlyStopping(
+                monitor="val_loss", patience=trial["patience"], restore_best_weights=True
+            )],
+            verbose=0
+        )
+
+        val_ds = make_feature_dataset(cache, keys[val_idx], val_labels, batch_size=batch_size, shuffle=False)
+        predicted = np.argmax(vit.model.predict(val_ds.map(lambda x, y: x), verbose=0), axis=1)
+        result.update(
+            status="ok",
+            val_accuracy=float(np.mean(predicted == val_labels)),
+            val_macro_f1=float(f1_score(val_labels, predicted, average="macro")),
+            val_loss=float(min(history.history["val_loss"])),
+            epochs_run=len(history.history["val_loss"]),
+        )
+    except Exception as e:
+        result.update(status="failed", error=f"{type(e).__name__}: {e}")
+    result["seconds"] = round(time.time() - started, 1)
+    return result
+
+
+class SweepRunner:
+    """Runs head configurations in parallel over one shared feature cache"""
+
+    def __init__(self, cache_dir: str, fingerprint: str, keys: Sequence[str], labels: Sequence[int],
+                 val_keys: Sequence[str] = None, val_labels: Sequence[int] = None,
+                 folds: int = 1, num_workers: int = None, threads_per_worker: int = 2,
+                 epochs: int = 30, patience: int = 5, batch_size: int = 32,
+                 metric: str = "val_macro_f1", seed: int = 42,
+                 output_dir: str = "./models_saved/sweeps"):
+        """
+        Initialize sweep runner
+
+        Args:
+            cache_dir: Feature cache root (must already hold every key)
+            fingerprint: Feature extractor fingerprint of the cache namespace
+            keys: Cache keys of the training pool
+            labels: Labels aligned with keys
+            val_keys: Fixed validation keys, used when folds == 1
+            val_labels: Labels aligned with val_keys
+            folds: Number of stratified folds over keys (1 = use the fixed validation set)
+            num_workers: Trials trained at once (default: cores // threads_per_worker)
+            threads_per_worker: TensorFlow intra-op threads per worker
+            epochs: Maximum epochs per trial
+            patience: Early stopping patience (epochs)
+            batch_size: Batch size when the config does not set one
+            metric: Leaderboard column to rank by (higher is better)
+            seed: Random seed for folds and weight initialisation
+            output_dir: Parent directory of sweep result directories
+        """
+        self.cache_dir = cache_dir
+        self.fingerprint = fingerprint
+        self.threads_per_worker = max(1, threads_per_worker)
+        self.num_workers = num_workers or max(1, (os.cpu_count() or 1) // self.threads_per_worker)
+        self.epochs = epochs
+        self.patience = patience
+        self.batch_size = batch_size
+        self.metric = metric
+        self.seed = seed
+        self.output_dir = Path(output_dir)
+
+        labels = np.asarray(labels)
+        if folds > 1:
+            self.keys = list(keys)
+            self.labels = labels
+            splitter = StratifiedKFold(n_splits=folds, shuffle=True, random_state=seed)
+            self.folds = list(splitter.split(np.zeros(len(labels)), labels))
+        else:
+            if val_keys is None or val_labels is None:
+                raise ValueError("A validation set is required when folds == 1")
+            self.keys = list(keys) + list(val_keys)
+            self.labels = np.concatenate([labels, np.asarray(val_labels)])
+            self.folds = [(np.arange(len(keys)), np.arange(len(keys), len(self.keys)))]
+
+    def run(self, configs: List[Dict]) -> pd.DataFrame:
+        """
+        Train every config on every fold
+
+        Returns:
+            Leaderboard with one row per config, best first
+        """
+        run_dir = self.output_dir / datetime.now().strftime("%Y%m%d_%H%M%S")
+        run_dir.mkdir(parents=True, exist_ok=True)
+        trials = [
+            {
+                "config_id": config_id(config), "config": config, "fold": fold,
+                "epochs": self.epochs, "patience": self.patience,
+                "batch_size": self.batch_size, "seed": self.seed + fold,
+            }
+            for config in configs
+            for fold in range(len(self.folds))
+        ]
+        print(f"🧪 Sweep: {len(configs)} configs x {len(self.folds)} folds = {len(trials)} trials")
+        print(f"   {self.num_workers} workers x {self.threads_per_worker} threads, results in {run_dir}")
+
+        trials_path = run_dir / "trials.csv"
+        results = []
+        with ProcessPoolExecutor(
+            max_workers=min(self.num_workers, len(trials)),
+            mp_context=mp.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.threads_per_worker, self.cache_dir, self.fingerprint,
+                      self.keys, self.labels, self.folds),
+        ) as pool:
+            futures = [pool.submit(_run_trial, trial) for trial in trials]
+            for done, future in enumerate(as_completed(futures), start=1):
+                result = future.result()
+                results.append(result)
+                # Rewrite after every trial so an interrupted sweep keeps what finished.
+                pd.DataFrame(results).to_csv(trials_path, index=False)
+                score = f"{result[self.metric]:.4f}" if result["status"] == "ok" else result["error"]
+                print(f"   [{done}/{len(trials)}] {result['config_id']} fold {result['fold']}: {score}")
+
+        leaderboard = self.leaderboard(pd.DataFrame(results))
+        leaderboard.to_csv(run_dir / "leaderboard.csv", index=False)
+        self.run_dir = run_dir
+        return leaderboard
+
+    def leaderboard(self, trials: pd.DataFrame) -> pd.DataFrame:
+        """Average fold scores per config, best first"""
+        ok = trials[trials["status"] == "ok"]
+        if ok.empty:
+            raise RuntimeError("Every sweep trial failed; see trials.csv")
+        param_columns = [c for c in CONFIG_KEYS if c in ok.columns]
+        grouped = ok.groupby("config_id")
+        board = grouped[param_columns].first()
+        for column in ("val_macro_f1", "val_accuracy", "val_loss"):
+            board[f"{column}_mean"] = grouped[column].mean()
+            board[f"{column}_std"] = grouped[column].std().fillna(0.0)
+        board["folds"] = grouped.size()
+        board["seconds"] = grouped["seconds"].sum()
+        return board.sort_values(f"{self.metric}_mean", ascending=False).reset_index()
+
+    def export_best(self, leaderboard: pd.DataFrame, path: str) -> Dict:
+        """Write the top config where train.py picks it up (VIT_CONFIG_PATH)"""
+        best = leaderboard.iloc[0]
+        config = {
+            key: best[key].item() if hasattr(best[key], "item") else best[key]
+            for key in CONFIG_KEYS if key in leaderboard.columns and pd.notna(best[key])
+        }
+        exported = {
+            "config": config,
+            "metric": self.metric,
+            "score": float(best[f"{self.metric}_mean"]),
+            "folds": int(best["folds"]),
+            "sweep_dir": str(getattr(self, "run_dir", "")),
+            "created_at": datetime.now().isoformat(),
+        }
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(exported, f, indent=2)
+        return exported
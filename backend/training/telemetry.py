@@ -0,0 +1,149 @@
+"""
+Per-run training telemetry
+Records wall time, throughput and peak memory for each pipeline stage plus
+per-epoch timings, and writes them to a JSON file and the training_runs table
+"""
+
+import json
+import os
+import platform
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_rss_mb() -> float:
+    """Peak resident memory of this process and its finished children, in MB"""
+    if resource is None:
+        return 0.0
+    self_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children_kb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # ru_maxrss is KB on Linux and bytes on macOS.
+    scale = 1024 * 1024 if platform.system() == "Darwin" else 1024
+    return round(max(self_kb, children_kb) / scale, 1)
+
+
+class RunTelemetry:
+    """Collects stage timings for one training run"""
+
+    def __init__(self, script: str, models_dir: str = "./models_saved", config: Dict = None):
+        """
+        Start recording a run
+
+        Args:
+            script: Name of the entry point (train.py, retrain_model.py, ...)
+            models_dir: Run files are written to models_dir/runs/
+            config: Run configuration stored with the results
+        """
+        self.script = script
+        self.run_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+        self.runs_dir = Path(models_dir) / "runs"
+        self.config = dict(config or {})
+        self.started_at = datetime.now()
+        self._started = time.perf_counter()
+        self.stages: Dict[str, Dict] = {}
+        self.epochs: List[Dict] = []
+        self.info: Dict = {}
+
+    @contextmanager
+    def stage(self, name: str, items: int = None):
+        """
+        Time a pipeline stage
+
+        Yields a dict; set record["items"] inside the block when the item count is
+        only known afterwards (images decoded, samples trained, ...).
+        """
+        record = {"items": items}
+        started = time.perf_counter()
+        cpu_started = time.process_time()
+        try:
+            yield record
+        finally:
+            self.accumulate(
+                name, time.perf_counter() - started, record.get("items"),
+                cpu_seconds=time.process_time() - cpu_started
+            )
+            print(f"⏱️  {name}: {self.stages[name]['seconds']:.1f}s"
+                  + (f" ({self.stages[name]['items_per_sec']:.1f} items/s)"
+                     if self.stages[name]["items_per_sec"] else ""))
+
+    def accumulate(self, name: str, seconds: float, items: int = None, cpu_seconds: float = None):
+        """Add time (and optionally items) to a stage; repeated calls sum up"""
+        stage = self.stages.setdefault(name, {"seconds": 0.0, "items": 0, "cpu_seconds": 0.0, "calls": 0})
+        stage["seconds"] += seconds
+        stage["items"] += int(items or 0)
+        stage["cpu_seconds"] += cpu_seconds or 0.0
+        stage["calls"] += 1
+        stage["items_per_sec"] = round(stage["items"] / stage["seconds"], 2) if stage["items"] and stage["seconds"] > 0 else None
+        stage["peak_rss_mb"] = peak_rss_mb()
+
+    def set(self, **info):
+        """Attach extra facts to the run (dataset size, model version, ...)"""
+        self.info.update(info)
+
+    def epoch_callback(self, stage: str = "head_training"):
+        """Keras callback recording the duration and logs of every epoch"""
+        import tensorflow as tf
+
+        telemetry = self
+
+        class EpochTimer(tf.keras.callbacks.Callback):
+            def on_epoch_begin(self, epoch, logs=None):
+                self._epoch_started = time.perf_counter()
+
+            def on_epoch_end(self, epoch, logs=None):
+                telemetry.epochs.append({
+                    "stage": stage,
+                    "epoch": epoch + 1,
+                    "seconds": round(time.perf_counter() - self._epoch_started, 3),
+                    **{key: float(value) for key, value in (logs or {}).items()},
+                })
+
+        return EpochTimer()
+
+    def summary(self, status: str = "ok") -> Dict:
+        return {
+            "run_id": self.run_id,
+            "script": self.script,
+            "status": status,
+            "started_at": self.started_at.isoformat(),
+            "finished_at": datetime.now().isoformat(),
+            "total_seconds": round(time.perf_counter() - self._started, 2),
+            "peak_rss_mb": peak_rss_mb(),
+            "host": platform.node(),
+            "cpu_count": os.cpu_count(),
+            "config": self.config,
+            "info": self.info,
+            "stages": self.stages,
+            "epochs": self.epochs,
+        }
+
+    def finish(self, status: str = "ok", record_db: bool = True) -> Dict:
+        """
+        Write the run to models_dir/runs/run_<id>.json and the training_runs table
+
+        Returns:
+            The run summary
+        """
+        summary = self.summary(status)
+        self.runs_dir.mkdir(parents=True, exist_ok=True)
+        run_path = self.runs_dir / f"run_{self.run_id}.json"
+        with open(run_path, "w") as f:
+            json.dump(summary, f, indent=2, default=str)
+        print(f"\n📈 Run telemetry saved to {run_path}")
+
+        if record_db:
+            try:
+                from app.services.metrics import record_training_run
+                record_training_run(summary)
+            except Exception as e:
+                print(f"⚠️  Could not store run telemetry in the database: {e}")
+        return summary
@@ -1,4 +1,6 @@
 """Vision Transformer classifier"""
+import json
+from pathlib import Path
 import tensorflow as tf
 from tensorflow import keras
 from tensorflow.keras import layers
@@ -95,6 +97,9 @@ class TransformerBlock(layers.Layer):
 class VisionTransformerClassifier:
     """Vision Transformer classifier"""
     
+    # Constructor arguments that change the weight layout
+    CONFIG_KEYS = ("feature_dim", "num_classes", "num_transformer_blocks", "num_heads", "ff_dim", "dropout_rate")
+    
     def __init__(self, feature_dim=2560, num_classes=5, num_transformer_blocks=4, 
                  num_heads=8, ff_dim=512, dropout_rate=0.1):
         self.feature_dim = feature_dim
@@ -145,9 +150,30 @@ class VisionTransformerClassifier:
         confidences = np.max(probabilities, axis=1)
         return predicted_classes, confidences
     
+    def get_config(self) -> dict:
+        """Architecture settings needed to rebuild this classifier"""
+        return {key: getattr(self, key) for key in self.CONFIG_KEYS}
+    
+    @staticmethod
+    def config_path(filepath: str) -> Path:
+        """Sidecar JSON holding the architecture of a weights file"""
+        return Path(filepath).with_suffix(".json")
+    
+    @classmethod
+    def load_config(cls, filepath: str) -> dict:
+        """Architecture saved next to a weights file ({} for older weights without one)"""
+        config_path = cls.config_path(filepath)
+        if not config_path.exists():
+            return {}
+        with open(config_path, "r") as f:
+            config = json.load(f)
+        return {key: value for key, value in config.items() if key in cls.CONFIG_KEYS}
+    
     def save(self, filepath: str):
-        """Save model weights"""
+        """Save model weights and architecture"""
         self.model.save_weights(filepath)
+        with open(self.config_path(filepath), "w") as f:
+            json.dump(self.get_config(), f, indent=2)
     
     def load(self, filepath: str):
         """Load model weights"""